@@ -3,11 +3,44 @@ from transformers import BlipProcessor, BlipForConditionalGeneration
 from PIL import Image
 import torch
 import traceback
-from faster_whisper import WhisperModel
+import os
+import time
+import zlib
+import threading
+import functools
+import configparser
+import numpy as np
+from faster_whisper import WhisperModel, decode_audio
 from flask_cors import CORS
 from io import BytesIO
 from datetime import datetime
 
+from module_batcher import MicroBatcher
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+config = configparser.ConfigParser()
+config.read(os.path.join(BASE_DIR, 'config.ini'))
+
+# Requests arriving within whisper_batch_wait_ms of each other share one model call
+whisper_batch_size = config.getint('SERVER', 'whisper_batch_size', fallback=8)
+whisper_batch_wait_ms = config.getfloat('SERVER', 'whisper_batch_wait_ms', fallback=25)
+whisper_beam_size = config.getint('SERVER', 'whisper_beam_size', fallback=5)
+whisper_language = config.get('SERVER', 'whisper_language', fallback='').strip() or None  # None = auto-detect
+caption_batch_size = config.getint('SERVER', 'caption_batch_size', fallback=8)
+caption_batch_wait_ms = config.getfloat('SERVER', 'caption_batch_wait_ms', fallback=25)
+embedding_enabled = config.getboolean('SERVER', 'embedding_enabled', fallback=False)
+embedding_model_name = config.get('SERVER', 'embedding_model', fallback='sentence-transformers/all-MiniLM-L6-v2')
+emotion_enabled = config.getboolean('SERVER', 'emotion_enabled', fallback=False)
+emotion_model_name = config.get('SERVER', 'emotion_model', fallback='SamLowe/roberta-base-go_emotions')
+text_batch_size = config.getint('SERVER', 'text_batch_size', fallback=16)
+text_batch_wait_ms = config.getfloat('SERVER', 'text_batch_wait_ms', fallback=10)
+server_host = config.get('SERVER', 'host', fallback='0.0.0.0')
+server_port = config.getint('SERVER', 'port', fallback=5678)
+server_threads = config.getint('SERVER', 'threads', fallback=16)
+max_in_flight = config.getint('SERVER', 'max_in_flight', fallback=12)
+queue_timeout = config.getfloat('SERVER', 'queue_timeout', fallback=10.0)
+
 # Initialize Flask app and enable CORS
 app = Flask(__name__)
 CORS(app)
@@ -23,7 +56,39 @@ def initialize_blip_model():
     model.to(device)
     return processor, model
 
-blip_processor, blip_model = initialize_blip_model()
+blip_processor, blip_model = None, None  # loaded in the background by load_models()
+
+# Decode parameters a /caption request may choose (num_beams=1 is greedy decoding)
+CAPTION_DEFAULT_BEAMS = 3
+CAPTION_DEFAULT_TOKENS = 100
+CAPTION_MAX_BEAMS = 8
+CAPTION_MAX_TOKENS = 200
+
+def caption_batch(jobs):
+    """
+    MicroBatcher callback for (image, num_beams, max_new_tokens) jobs. Jobs with the
+    same decode parameters share one padded generate() call.
+    """
+    results = [None] * len(jobs)
+    groups = {}
+    for i, (_, num_beams, max_new_tokens) in enumerate(jobs):
+        groups.setdefault((num_beams, max_new_tokens), []).append(i)
+
+    for (num_beams, max_new_tokens), indices in groups.items():
+        try:
+            inputs = blip_processor(images=[jobs[i][0] for i in indices], return_tensors="pt").to(device)
+            with torch.inference_mode():
+                outputs = blip_model.generate(**inputs, max_new_tokens=max_new_tokens, num_beams=num_beams)
+            captions = blip_processor.batch_decode(outputs, skip_special_tokens=True)
+            for i, caption in zip(indices, captions):
+                results[i] = caption
+        except Exception as e:
+            print("Error occurred during caption generation:", traceback.format_exc())
+            for i in indices:
+                results[i] = e
+    return results
+
+caption_batcher = MicroBatcher(caption_batch, caption_batch_size, caption_batch_wait_ms, name="CaptionBatcher")
 
 # Initialize Whisper model for audio transcription
 """
@@ -67,34 +132,249 @@ def initialize_whisper_model(
         print("Error initializing Whisper model:", traceback.format_exc())
         raise e
 
-whisper_model = initialize_whisper_model(
-    model_size="tiny", 
-    device="cuda" if torch.cuda.is_available() else "cpu", 
-    compute_type="int8_float16" if torch.cuda.is_available() else "int8"
-)
+whisper_model = None  # loaded in the background by load_models()
+
+WHISPER_SAMPLE_RATE = 16000
+WHISPER_WINDOW_SECONDS = 30
+# Same defaults as whisper_model.transcribe, applied per window of the batched path
+WHISPER_NO_SPEECH_THRESHOLD = 0.6
+WHISPER_LOG_PROB_THRESHOLD = -1.0
+WHISPER_COMPRESSION_RATIO_THRESHOLD = 2.4
+
+def check_window(text, no_speech_prob, avg_logprob):
+    """
+    Judge one greedy/beam decode like faster-whisper does: "silence" if the model
+    thinks there is no speech and is not confident in the text, "retry" if the text
+    is repetitive or low-confidence (transcribe() would re-decode at a higher
+    temperature), otherwise "ok".
+    """
+    if no_speech_prob > WHISPER_NO_SPEECH_THRESHOLD and avg_logprob < WHISPER_LOG_PROB_THRESHOLD:
+        return "silence"
+    encoded = text.encode("utf-8")
+    if encoded and len(encoded) / len(zlib.compress(encoded)) > WHISPER_COMPRESSION_RATIO_THRESHOLD:
+        return "retry"
+    if avg_logprob < WHISPER_LOG_PROB_THRESHOLD:
+        return "retry"
+    return "ok"
+
+def transcribe_windows(clips):
+    """
+    Transcribe clips that each fit in one 30 s Whisper window with a single batched
+    encoder pass and a single batched beam search (no timestamps, one segment each).
+    Windows judged as silence return no segments; windows that need the temperature
+    fallback return None, for whisper_model.transcribe to decode on its own.
+    """
+    from faster_whisper.audio import pad_or_trim
+    from faster_whisper.tokenizer import Tokenizer
+
+    features = np.stack([pad_or_trim(whisper_model.feature_extractor(audio)) for audio in clips])
+    encoder_output = whisper_model.encode(features)
+
+    multilingual = whisper_model.model.is_multilingual
+    if whisper_language or not multilingual:
+        languages = [whisper_language or "en"] * len(clips)
+    else:
+        detected = whisper_model.model.detect_language(encoder_output)
+        languages = [candidates[0][0][2:-2] for candidates in detected]  # "<|en|>" -> "en"
+
+    tokenizers = [Tokenizer(whisper_model.hf_tokenizer, multilingual, task="transcribe", language=language) for language in languages]
+    prompts = [list(tokenizer.sot_sequence) + [tokenizer.no_timestamps] for tokenizer in tokenizers]
+    results = whisper_model.model.generate(
+        encoder_output,
+        prompts,
+        beam_size=whisper_beam_size,
+        max_length=whisper_model.max_length,
+        suppress_blank=True,
+        suppress_tokens=[-1],
+        return_scores=True,
+        return_no_speech_prob=True,
+    )
+
+    transcriptions = []
+    for audio, tokenizer, result in zip(clips, tokenizers, results):
+        text = tokenizer.decode([token for token in result.sequences_ids[0] if token < tokenizer.eot])
+        # With the default length penalty the score is the length-normalized log probability
+        verdict = check_window(text, result.no_speech_prob, result.scores[0])
+        if verdict == "retry":
+            transcriptions.append(None)
+            continue
+        end = round(audio.size / WHISPER_SAMPLE_RATE, 2)
+        transcriptions.append([{"text": text, "start": 0.0, "end": end}] if verdict == "ok" and text.strip() else [])
+    return transcriptions
+
+def transcribe_batch(clips):
+    """
+    MicroBatcher callback: one transcription (list of segments) per decoded clip.
+    Short clips are batched; long clips, single requests, windows the batched path
+    could not decode confidently and any failure of the batched path go through
+    whisper_model.transcribe one at a time.
+    """
+    results = [None] * len(clips)
+    short = [i for i, audio in enumerate(clips) if audio.size <= WHISPER_SAMPLE_RATE * WHISPER_WINDOW_SECONDS]
+    if len(short) > 1:
+        try:
+            for i, transcription in zip(short, transcribe_windows([clips[i] for i in short])):
+                results[i] = transcription
+        except Exception:
+            print("Batched transcription failed, falling back to one at a time:", traceback.format_exc())
+
+    for i, audio in enumerate(clips):
+        if results[i] is not None:
+            continue
+        try:
+            segments, _ = whisper_model.transcribe(audio, beam_size=whisper_beam_size, language=whisper_language)
+            results[i] = [{"text": segment.text, "start": segment.start, "end": segment.end} for segment in segments]
+        except Exception as e:
+            print("Error occurred during audio transcription:", traceback.format_exc())
+            results[i] = e
+    return results
+
+whisper_batcher = MicroBatcher(transcribe_batch, whisper_batch_size, whisper_batch_wait_ms, name="WhisperBatcher")
+
+# Embedding and emotion models for the Pi's memory (HyperDB) and emotion backends
+embedding_model = None  # loaded in the background by load_models()
+emotion_classifier = None
+MAX_TEXTS_PER_REQUEST = 64
+
+def run_text_batch(jobs, run):
+    """
+    MicroBatcher callback for jobs that are lists of texts: all texts of the batch go
+    through run() in one call, and the outputs are split back per job.
+    """
+    texts = [text for job in jobs for text in job]
+    outputs = run(texts)
+    results = []
+    offset = 0
+    for job in jobs:
+        results.append(outputs[offset:offset + len(job)])
+        offset += len(job)
+    return results
+
+def embed_texts(texts):
+    embeddings = embedding_model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+    return embeddings.astype(np.float32).tolist()
+
+def classify_emotions(texts):
+    return emotion_classifier(texts, batch_size=len(texts), truncation=True)
+
+embedding_batcher = MicroBatcher(lambda jobs: run_text_batch(jobs, embed_texts), text_batch_size, text_batch_wait_ms, name="EmbeddingBatcher")
+emotion_batcher = MicroBatcher(lambda jobs: run_text_batch(jobs, classify_emotions), text_batch_size, text_batch_wait_ms, name="EmotionBatcher")
+
+# Readiness: the server starts answering immediately, model routes return 503 until warmed up.
+# Only enabled models are loaded and counted; routes of disabled ones return 404.
+enabled_models = ["whisper", "blip"] + (["embedding"] if embedding_enabled else []) + (["emotion"] if emotion_enabled else [])
+models_ready = {name: threading.Event() for name in enabled_models}
+model_errors = {}
+
+def load_blip():
+    global blip_processor, blip_model
+    blip_processor, blip_model = initialize_blip_model()
+    caption_batcher.submit((Image.new("RGB", (384, 384)), 1, 5))
+
+def load_whisper():
+    global whisper_model
+    whisper_model = initialize_whisper_model(
+        model_size="tiny", 
+        device="cuda" if torch.cuda.is_available() else "cpu", 
+        compute_type="int8_float16" if torch.cuda.is_available() else "int8"
+    )
+    whisper_batcher.submit(np.zeros(WHISPER_SAMPLE_RATE, dtype=np.float32))
+
+def load_embedding():
+    global embedding_model
+    from sentence_transformers import SentenceTransformer
+    embedding_model = SentenceTransformer(embedding_model_name, device=str(device))
+    embedding_batcher.submit(["warm up"])
+
+def load_emotion():
+    global emotion_classifier
+    from transformers import pipeline
+    emotion_classifier = pipeline(task="text-classification", model=emotion_model_name, top_k=None, device=device)
+    emotion_batcher.submit(["warm up"])
+
+def load_models():
+    """
+    Load and warm up every enabled model (one dummy request each through its batcher,
+    so the first real request does not pay for lazy CUDA/kernel initialization).
+    Whisper goes first: speech is on the latency path of every conversation turn.
+    """
+    loaders = {"whisper": load_whisper, "blip": load_blip, "embedding": load_embedding, "emotion": load_emotion}
+    for name in enabled_models:
+        loader = loaders[name]
+        try:
+            loader()
+            models_ready[name].set()
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LOAD: {name} model ready")
+        except Exception as e:
+            model_errors[name] = str(e)
+            print(f"Error loading {name} model:", traceback.format_exc())
+
+threading.Thread(target=load_models, name="ModelLoader", daemon=True).start()
+
+# Backpressure: at most max_in_flight requests are worked on at once; others wait
+# up to queue_timeout seconds for a slot and are then turned away with 503
+in_flight_slots = threading.BoundedSemaphore(max_in_flight)
+in_flight_lock = threading.Lock()
+in_flight = 0
+rejected = 0
+
+def model_route(model_name):
+    """
+    Decorator for routes that need a model: 503 while it is loading, and bounded
+    concurrency with queueing and backpressure.
+    """
+    def decorator(route):
+        @functools.wraps(route)
+        def wrapper(*args, **kwargs):
+            global in_flight, rejected
+            if model_name not in models_ready:
+                return jsonify({"error": f"{model_name} model is disabled on this server"}), 404
+            if not models_ready[model_name].is_set():
+                status = "failed to load" if model_name in model_errors else "still loading"
+                return jsonify({"error": f"{model_name} model {status}"}), 503, {"Retry-After": "5"}
+            if not in_flight_slots.acquire(timeout=queue_timeout):
+                with in_flight_lock:
+                    rejected += 1
+                return jsonify({"error": "Server busy, try again"}), 503, {"Retry-After": "1"}
+            with in_flight_lock:
+                in_flight += 1
+            try:
+                return route(*args, **kwargs)
+            finally:
+                with in_flight_lock:
+                    in_flight -= 1
+                in_flight_slots.release()
+        return wrapper
+    return decorator
 
 # Routes
 @app.route('/caption', methods=['POST'])
+@model_route("blip")
 def caption_image():
     """
-    Endpoint to generate a caption for an uploaded image.
+    Endpoint to generate captions for one or more uploaded images (repeat the
+    'image' field). Optional form fields: num_beams (1 = greedy) and max_new_tokens.
+    Returns "caption" (first image) and "captions" (all images, in upload order).
     """
     try:
         # Validate the request
-        if 'image' not in request.files:
+        image_files = request.files.getlist('image')
+        if not image_files:
             return jsonify({"error": "No image file provided"}), 400
-        
-        # Read the uploaded image into a BytesIO object
-        image_file = request.files['image']
-        image_bytes = BytesIO(image_file.read())
-        image = Image.open(image_bytes)
-        
-        # Generate caption
-        inputs = blip_processor(image, return_tensors="pt").to(device)
-        outputs = blip_model.generate(**inputs, max_new_tokens=100, num_beams=3)
-        caption = blip_processor.decode(outputs[0], skip_special_tokens=True)
-        
-        return jsonify({"caption": caption})
+        try:
+            num_beams = int(request.form.get('num_beams', CAPTION_DEFAULT_BEAMS))
+            max_new_tokens = int(request.form.get('max_new_tokens', CAPTION_DEFAULT_TOKENS))
+        except ValueError:
+            return jsonify({"error": "num_beams and max_new_tokens must be integers"}), 400
+        if not 1 <= num_beams <= CAPTION_MAX_BEAMS or not 1 <= max_new_tokens <= CAPTION_MAX_TOKENS:
+            return jsonify({"error": f"num_beams must be 1-{CAPTION_MAX_BEAMS} and max_new_tokens 1-{CAPTION_MAX_TOKENS}"}), 400
+
+        # Decode the images on the request thread, then queue them for batched captioning
+        images = [Image.open(BytesIO(image_file.read())).convert("RGB") for image_file in image_files]
+        futures = [caption_batcher.submit_async((image, num_beams, max_new_tokens)) for image in images]
+        captions = [future.result() for future in futures]
+
+        return jsonify({"caption": captions[0], "captions": captions})
     except Exception as e:
         print("Error occurred during caption generation:", traceback.format_exc())
         return jsonify({"error": str(e)}), 500
@@ -102,11 +382,13 @@ def caption_image():
 
 
 @app.route('/save_audio', methods=['POST'])
+@model_route("whisper")
 def save_audio():
     """
     Endpoint to transcribe uploaded audio using Whisper.
     """
-    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]  Accessed")
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]  Accessed (whisper queue depth {whisper_batcher.depth})")
+    t_start = time.monotonic()
     try:
         # Validate the request
         if 'audio' not in request.files:
@@ -116,22 +398,129 @@ def save_audio():
         audio_blob = request.files['audio']
         audio_bytes = BytesIO(audio_blob.read())
 
-        # Transcribe the audio
-        segments, _ = whisper_model.transcribe(audio_bytes, beam_size=5)
-
-        # Extract and format transcription
-        transcription = [
-            {"text": segment.text, "start": segment.start, "end": segment.end}
-            for segment in segments
-        ]
+        # Decode (WAV, FLAC or Ogg/Opus) on the request thread, then queue for a batched transcription
+        audio = decode_audio(audio_bytes, sampling_rate=WHISPER_SAMPLE_RATE)
+        transcription = whisper_batcher.submit(audio)
 
-        return jsonify({"transcription": transcription})
+        # Lets the client separate its upload time from our processing time
+        process_ms = f"{(time.monotonic() - t_start) * 1000:.0f}"
+        return jsonify({"transcription": transcription}), 200, {"X-Process-Time-Ms": process_ms}
 
     except Exception as e:
         print("Error occurred during audio transcription:", traceback.format_exc())
         return jsonify({"error": str(e)}), 500
 
 
+def read_texts():
+    """
+    Validate a {"texts": [...]} JSON body. Returns (texts, None) or (None, error response).
+    """
+    payload = request.get_json(silent=True) or {}
+    texts = payload.get("texts")
+    if not isinstance(texts, list) or not texts or not all(isinstance(text, str) for text in texts):
+        return None, (jsonify({"error": "Expected JSON body {\"texts\": [\"...\"]}"}), 400)
+    if len(texts) > MAX_TEXTS_PER_REQUEST:
+        return None, (jsonify({"error": f"At most {MAX_TEXTS_PER_REQUEST} texts per request"}), 400)
+    return texts, None
+
+
+@app.route('/embed', methods=['POST'])
+@model_route("embedding")
+def embed():
+    """
+    Sentence embeddings for a list of texts (same model as the Pi's local HyperDB backend).
+    """
+    texts, error = read_texts()
+    if error:
+        return error
+    try:
+        return jsonify({"model": embedding_model_name, "embeddings": embedding_batcher.submit(texts)})
+    except Exception as e:
+        print("Error occurred during embedding:", traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/emotion', methods=['POST'])
+@model_route("emotion")
+def emotion():
+    """
+    Emotion scores (every label with its score) for a list of texts.
+    """
+    texts, error = read_texts()
+    if error:
+        return error
+    try:
+        return jsonify({"model": emotion_model_name, "emotions": emotion_batcher.submit(texts)})
+    except Exception as e:
+        print("Error occurred during emotion classification:", traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/capabilities', methods=['GET'])
+def capabilities():
+    """
+    Audio formats /save_audio can decode, for the client's upload format negotiation.
+    Without PyAV only WAV is offered.
+    """
+    formats = ["wav"]
+    try:
+        import av
+    except ImportError:
+        return jsonify({"upload_formats": formats})
+    for name, codecs in (("flac", {"flac"}), ("opus", {"opus", "libopus"})):
+        if codecs & set(av.codecs_available):
+            formats.append(name)
+    return jsonify({"upload_formats": formats})
+
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """
+    Queue depth and batching statistics of the model workers.
+    """
+    with in_flight_lock:
+        requests_state = {"in_flight": in_flight, "max_in_flight": max_in_flight, "rejected": rejected}
+    return jsonify({
+        "whisper": whisper_batcher.stats(),
+        "caption": caption_batcher.stats(),
+        "embedding": embedding_batcher.stats(),
+        "emotion": emotion_batcher.stats(),
+        "requests": requests_state,
+    })
+
+
+@app.route('/health', methods=['GET'])
+def health():
+    """
+    Readiness probe: 200 once every enabled model is loaded and warmed up, 503 before that.
+    """
+    ready = {name: event.is_set() for name, event in models_ready.items()}
+    if all(ready.values()):
+        status = "ready"
+    elif model_errors:
+        status = "error"
+    else:
+        status = "loading"
+    body = {"status": status, "models": ready, "errors": model_errors, "in_flight": in_flight, "max_in_flight": max_in_flight}
+    return jsonify(body), 200 if status == "ready" else 503
+
+
+def serve():
+    """
+    Serve with waitress (multi-threaded production WSGI server) if it is installed,
+    otherwise with Flask's threaded development server. Either way a single process
+    owns the models; request threads only decode input and wait on the batchers.
+    """
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LOAD: waitress not installed, using the Flask development server")
+        app.run(host=server_host, port=server_port, threaded=True)
+        return
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LOAD: Serving on {server_host}:{server_port} with waitress ({server_threads} threads)")
+    waitress_serve(app, host=server_host, port=server_port, threads=server_threads)
+
+
 # Main entry point
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5678)
+    serve()
@@ -14,6 +14,7 @@ from module_memory import *
 from module_engine import *
 from module_tts import *
 from module_imagesummary import *
+from module_ttscache import load_phrase_cache
 from module_config import load_config
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -34,7 +35,7 @@ def initial_msg():
     train_text_classifier()
 
     #Load Char card
-    measure_background_noise()
+    start_noise_tracking()
 
     # Load the configuration
     config = load_config()
@@ -46,16 +47,7 @@ def initial_msg():
                 'Content-Type': 'application/json'
             }
 
-            payload = {
-                "stream_chunk_size": 100,
-                "temperature": 0.7,
-                "speed": 1.1,
-                "length_penalty": 1.0,
-                "repetition_penalty": 1.2,
-                "top_p": 0.9,
-                "top_k": 40,
-                "enable_text_splitting": True
-            }
+            payload = XTTS_SETTINGS
             response = requests.post(url, headers=headers, json=payload)
             if response.status_code == 200:
                 print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LOAD: TTS Settings updated successfully.")
@@ -65,6 +57,10 @@ def initial_msg():
         except Exception as e:
             print(f"Error: {e}")
 
+    # Render fixed phrases once so wake acknowledgements play instantly
+    if config['charvoice']:
+        load_phrase_cache(tars_responses)
+
 #Trigger once
 initial_msg()
 
@@ -0,0 +1,413 @@
+"""
+Benchmarks for the audio and vision pipelines.
+
+    python bench.py resample [--seconds 10] [--play 5]
+    python bench.py stt FILE_OR_DIR [...] [--speed 1.0]
+    python bench.py vision FILE_OR_DIR [...] [--sizes 0,384,512] [--qualities 70,85,95] [--server URL]
+    python bench.py caption FILE_OR_DIR [...] [--backends torch-fp32,torch-int8,onnx-int8]
+    python bench.py websearch FILE_OR_DIR [...] [--repeats 5] [--no-browser]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+os.chdir(BASE_DIR)
+sys.path.insert(0, BASE_DIR)
+
+from module_audiodsp import PolyphaseResampler
+
+RESAMPLE_CASES = [
+    (22050, 48000),  # xtts / espeak output on a 48 kHz device
+    (22050, 44100),
+    (16000, 48000),  # capture-rate audio on a 48 kHz device
+    (48000, 16000),  # 48 kHz microphone into the 16 kHz capture ring
+]
+
+# On-device captioning backends: (module_models loader, precision)
+CAPTION_BACKENDS = {
+    "torch-fp32": ("load_blip", "fp32"),  # module_imagesummary before the model registry
+    "torch-int8": ("load_blip", "int8"),  # quantize_dynamic, the blip_backend = torch default on CPU
+    "onnx-fp32": ("load_blip_onnx", "fp32"),
+    "onnx-int8": ("load_blip_onnx", "int8"),
+}
+
+
+def _sine(rate, seconds, freq=1000.0, amplitude=10000):
+    t = np.arange(int(rate * seconds)) / rate
+    return (amplitude * np.sin(2 * np.pi * freq * t)).astype(np.int16)
+
+
+def _snr_db(y, out_rate, freq=1000.0, amplitude=10000):
+    """
+    SNR of a resampled sine against the ideal sine, after removing the filter delay
+    with a least-squares fit of the phase.
+    """
+    y = y[out_rate // 10:len(y) - out_rate // 10].astype(np.float64)
+    t = np.arange(y.size) / out_rate
+    basis = np.stack([np.sin(2 * np.pi * freq * t), np.cos(2 * np.pi * freq * t)], axis=1)
+    coef, *_ = np.linalg.lstsq(basis, y, rcond=None)
+    error = y - basis @ coef
+    return 10 * np.log10(np.mean((basis @ coef) ** 2) / np.mean(error ** 2))
+
+
+def bench_resampler(seconds, blocksize):
+    print(f"{'conversion':>16} {'L/M':>9} {'us/block':>9} {'x realtime':>11} {'SNR dB':>7}")
+    for in_rate, out_rate in RESAMPLE_CASES:
+        x = _sine(in_rate, seconds)
+        resampler = PolyphaseResampler(in_rate, out_rate)
+        out = []
+        t0 = time.perf_counter()
+        for i in range(0, x.size, blocksize):
+            out.append(resampler.process(x[i:i + blocksize]))
+        elapsed = time.perf_counter() - t0
+        out.append(resampler.flush())
+        y = np.concatenate(out)
+        blocks = -(-x.size // blocksize)
+        print(f"{in_rate:>7}->{out_rate:<7} {resampler.up:>4}/{resampler.down:<4} "
+              f"{elapsed / blocks * 1e6:>9.1f} {seconds / elapsed:>11.0f} {_snr_db(y, out_rate):>7.1f}")
+
+
+def _play_cpu(sd, samples, rate, device_rate, seconds):
+    """
+    Play samples at rate for seconds and return the process CPU time used. If
+    device_rate differs, samples are converted explicitly in the callback.
+    """
+    resampler = PolyphaseResampler(rate, device_rate) if device_rate != rate else None
+    pending = np.zeros(0, dtype=np.int16)
+    position = 0
+
+    def callback(outdata, frames, time_info, status):
+        nonlocal pending, position
+        while pending.size < frames:
+            chunk = samples[position:position + 512]
+            position = (position + 512) % (samples.size - 512)
+            pending = np.concatenate((pending, resampler.process(chunk) if resampler else chunk))
+        outdata[:, 0] = pending[:frames]
+        pending = pending[frames:]
+
+    with sd.OutputStream(samplerate=device_rate, channels=1, dtype='int16', blocksize=512, callback=callback):
+        c0 = time.process_time()
+        time.sleep(seconds)
+        return time.process_time() - c0
+
+
+def bench_playback(seconds):
+    """
+    Implicit path (device opened at the source rate, PortAudio/ALSA converts) versus
+    the explicit resampler feeding the device at its native rate.
+    """
+    try:
+        import sounddevice as sd
+        native = int(sd.query_devices(kind='output')['default_samplerate'])
+    except Exception as e:
+        print(f"Playback comparison skipped (no output device: {e})")
+        return
+
+    rate = 22050
+    noise = (np.random.default_rng(0).standard_normal(rate * 5) * 3000).astype(np.int16)
+    print(f"\nPlayback CPU over {seconds:.0f}s, {rate} Hz source, device native {native} Hz")
+    for label, device_rate in (("implicit", rate), ("explicit", native)):
+        try:
+            cpu = _play_cpu(sd, noise, rate, device_rate, seconds)
+        except Exception as e:
+            print(f"{label:>9}: failed ({e})")
+            continue
+        print(f"{label:>9}: {cpu / seconds * 100:5.1f}% of one core")
+    print("Note: conversion done by a sound server (PulseAudio/PipeWire) is not counted in this process.")
+
+
+def _speech_end(audio, samplerate, frame_ms=20, floor_db=-35.0):
+    """
+    Sample index just after the last frame within floor_db of the loudest frame.
+    """
+    frame = samplerate * frame_ms // 1000
+    frames = audio[:audio.size - audio.size % frame].reshape(-1, frame).astype(np.float64)
+    if frames.size == 0:
+        return audio.size
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    loud = np.nonzero(rms > rms.max() * 10 ** (floor_db / 20))[0]
+    return (loud[-1] + 1) * frame if loud.size else audio.size
+
+
+def bench_stt(paths, speed, model_path, wake_phrase, kws_threshold, tail_seconds):
+    """
+    Replay each WAV file through the capture ring and time the same decoding loops
+    the assistant uses: wake-detect lag (wall clock after the detecting audio was
+    captured), endpoint delay (result time after the speech ended) and
+    transcription time (result time after wake detection).
+    """
+    from vosk import Model, KaldiRecognizer
+    from module_capture import SAMPLE_RATE, ReplaySource, start_capture, stop_capture, open_reader, list_wav_files, load_wav
+    from module_sttworker import create_wake_decoder, wait_for_wake, transcribe_vosk
+
+    files = [f for path in paths for f in list_wav_files(path)]
+    model = Model(model_path)
+    decoder = create_wake_decoder(wake_phrase, kws_threshold)
+    max_samples = int((tail_seconds + 30) * SAMPLE_RATE)
+
+    rows = []
+    for path in files:
+        audio = load_wav(path, SAMPLE_RATE)
+        source = ReplaySource([path], SAMPLE_RATE, speed, gap_seconds=tail_seconds)
+        start_capture(SAMPLE_RATE, source)
+        try:
+            reader = open_reader(source.first_pos)
+            wake_pos = wait_for_wake(reader, decoder, wake_phrase, source.finished)
+            t_wake = time.monotonic()
+            command_pos = source.first_pos if wake_pos is None else wake_pos
+
+            recognizer = KaldiRecognizer(model, SAMPLE_RATE)
+            result = transcribe_vosk(open_reader(command_pos), recognizer, max_samples)
+            t_text = time.monotonic()
+            speech_end = source.first_pos + _speech_end(audio, SAMPLE_RATE)
+        finally:
+            stop_capture()
+
+        rows.append({
+            "file": os.path.basename(path),
+            "wake_at": None if wake_pos is None else (wake_pos - source.first_pos) / SAMPLE_RATE,
+            "wake_lag_ms": None if wake_pos is None else (t_wake - source.time_of(wake_pos)) * 1000,
+            "endpoint_ms": (t_text - source.time_of(speech_end)) * 1000 if result else None,
+            "transcribe_ms": (t_text - t_wake) * 1000 if result else None,
+            "text": json.loads(result).get("text", "") if result else "",
+        })
+
+    def fmt(value, spec):
+        return "-" if value is None else format(value, spec)
+
+    print(f"\n{'file':<28} {'wake@s':>7} {'wake lag ms':>11} {'endpoint ms':>11} {'transcribe ms':>13}  text")
+    for row in rows:
+        print(f"{row['file'][:28]:<28} {fmt(row['wake_at'], '7.2f')} {fmt(row['wake_lag_ms'], '11.0f')} "
+              f"{fmt(row['endpoint_ms'], '11.0f')} {fmt(row['transcribe_ms'], '13.0f')}  {row['text']}")
+    return rows
+
+
+def _image_files(paths):
+    from module_camera import IMAGE_EXTENSIONS
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            files.append(path)
+    return files
+
+
+def _memory_mb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def _caption_worker(backend, files, max_new_tokens, num_beams, repeats, results):
+    """
+    Runs in a fresh process so each backend's memory is measured on its own.
+    """
+    from PIL import Image
+    import module_models
+    from module_bliponnx import export_blip_onnx, is_exported
+
+    loader, precision = CAPTION_BACKENDS[backend]
+    if loader == "load_blip_onnx" and not is_exported(module_models.blip_onnx_dir, precision):
+        export_blip_onnx(module_models.blip_onnx_dir, quantize=precision == "int8")
+    images = [Image.open(path).convert("RGB") for path in files]
+
+    before = _memory_mb("VmRSS")
+    t0 = time.perf_counter()
+    loaded = getattr(module_models, loader)(precision)
+    load_seconds = time.perf_counter() - t0
+    model_mb = _memory_mb("VmRSS") - before
+    module_models.caption_with(loaded, images[0], max_new_tokens, num_beams)  # warm-up
+
+    latencies, captions = [], []
+    for image in images:
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            caption = module_models.caption_with(loaded, image, max_new_tokens, num_beams)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        captions.append(caption)
+    results.put({"backend": backend, "load_s": load_seconds, "model_mb": model_mb,
+                 "peak_mb": _memory_mb("VmHWM"), "median_ms": float(np.median(latencies)),
+                 "p90_ms": float(np.percentile(latencies, 90)), "captions": captions})
+
+
+def bench_caption(paths, backends, max_new_tokens, num_beams, repeats):
+    """
+    Caption latency and memory of each on-device BLIP backend on the same images.
+    The ONNX backends decode greedily, so compare with --beams 1.
+    """
+    files = _image_files(paths)
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    for backend in backends:
+        results = context.Queue()
+        worker = context.Process(target=_caption_worker, args=(backend, files, max_new_tokens, num_beams, repeats, results))
+        worker.start()
+        worker.join()
+        if worker.exitcode != 0:
+            print(f"{backend}: failed (exit code {worker.exitcode})")
+            continue
+        rows.append(results.get())
+
+    print(f"\n{'backend':<11} {'load s':>6} {'model MB':>8} {'peak MB':>7} {'median ms':>9} {'p90 ms':>7}  caption ({os.path.basename(files[0])})")
+    for row in rows:
+        print(f"{row['backend']:<11} {row['load_s']:>6.1f} {row['model_mb']:>8.0f} {row['peak_mb']:>7.0f} "
+              f"{row['median_ms']:>9.0f} {row['p90_ms']:>7.0f}  {row['captions'][0]}")
+    return rows
+
+
+def bench_vision(paths, sizes, qualities, server_url, repeats):
+    """
+    Upload size and encode time for each resize/quality setting over a set of images
+    and, with a server, the end-to-end caption latency and the caption itself so the
+    quality cost of smaller uploads can be judged.
+    """
+    from io import BytesIO
+    import module_vision
+
+    files = _image_files(paths)
+    if server_url:
+        module_vision.vision_base_url = server_url.rstrip("/")
+
+    print(f"{'file':<24} {'size':>5} {'q':>3} {'KB':>7} {'encode ms':>9} {'caption ms':>10}  caption")
+    for path in files:
+        with open(path, "rb") as f:
+            raw = f.read()
+        for size in sizes:
+            for quality in (qualities if size > 0 else [0]):
+                encode_ms, caption_ms = [], []
+                caption = ""
+                for _ in range(repeats):
+                    t0 = time.perf_counter()
+                    upload, stats = module_vision.prepare_upload(BytesIO(raw), size, quality)
+                    encode_ms.append(stats["encode_ms"])
+                    if server_url:
+                        caption = module_vision.send_image_to_server(upload)
+                        caption_ms.append((time.perf_counter() - t0) * 1000)
+                print(f"{os.path.basename(path)[:24]:<24} {size or 'orig':>5} {quality or '-':>3} "
+                      f"{stats['bytes'] / 1024:>7.1f} {np.median(encode_ms):>9.1f} "
+                      f"{np.median(caption_ms) if caption_ms else float('nan'):>10.0f}  {caption}")
+
+
+WEBSEARCH_SELECTORS = ['.wDYxhc', '.hgKElc', '.r025kc.lVm3ye', '.yDYNvb.lyLwlc', '.dURPMd',
+                       '[data-result="snippet"]', '.result__snippet']
+
+
+def bench_websearch(paths, repeats, use_browser):
+    """
+    Serve saved result pages (e.g. module_engine/debug.html, written by search_google)
+    from a local HTTP server and time both search backends on them: page load plus
+    every known result selector. Chars shows how much text each backend found.
+    """
+    import http.server
+    import threading
+    import module_websearch as ws
+
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith((".html", ".htm")))
+        else:
+            files.append(path)
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(f)) for f in files])
+
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=root, **kwargs)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def run_http(url):
+        doc = ws.fetch_page(url)
+        return sum(len(ws.select_text(doc, selector)) for selector in WEBSEARCH_SELECTORS)
+
+    def run_browser(url):
+        with ws.driver_pool.driver() as driver:
+            driver.get(url)
+            return sum(len(ws.get_from_selector(driver, selector)) for selector in WEBSEARCH_SELECTORS)
+
+    backends = [("http", run_http)] + ([("selenium", run_browser)] if use_browser else [])
+    if use_browser:
+        run_browser(f"http://127.0.0.1:{server.server_port}/")  # start the browser outside the timings
+
+    print(f"{'file':<28} {'backend':<9} {'median ms':>9} {'max ms':>7} {'chars':>6}")
+    try:
+        for path in files:
+            url = f"http://127.0.0.1:{server.server_port}/" + os.path.relpath(os.path.abspath(path), root).replace(os.sep, "/")
+            for name, run in backends:
+                timings = []
+                for _ in range(repeats):
+                    t0 = time.perf_counter()
+                    chars = run(url)
+                    timings.append((time.perf_counter() - t0) * 1000)
+                print(f"{os.path.basename(path)[:28]:<28} {name:<9} {np.median(timings):>9.1f} {max(timings):>7.1f} {chars:>6}")
+    finally:
+        server.shutdown()
+        ws.quit_driver()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TARS audio, vision and web search benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    resample = commands.add_parser("resample", help="polyphase resampler throughput/quality and playback CPU")
+    resample.add_argument("--seconds", type=float, default=10.0, help="length of the offline test signal")
+    resample.add_argument("--blocksize", type=int, default=512, help="input samples per block")
+    resample.add_argument("--play", type=float, default=5.0, help="seconds of playback per path (0 to skip)")
+
+    stt = commands.add_parser("stt", help="wake word and Vosk timing on recorded WAV files")
+    stt.add_argument("paths", nargs="+", help="WAV files or directories of WAV files")
+    stt.add_argument("--speed", type=float, default=1.0, help="replay speed (1.0 = real time)")
+    stt.add_argument("--model", default=os.path.join(BASE_DIR, "vosk-model-small-en-us-0.15"), help="Vosk model directory")
+    stt.add_argument("--wake", default="hey tar", help="wake phrase")
+    stt.add_argument("--kws-threshold", type=float, default=1e-20, help="Pocketsphinx keyphrase threshold")
+    stt.add_argument("--tail", type=float, default=2.0, help="seconds of silence replayed after each file")
+
+    vision = commands.add_parser("vision", help="image preprocessing size/time and server caption latency")
+    vision.add_argument("paths", nargs="+", help="image files or directories of images")
+    vision.add_argument("--sizes", default="0,384,512", help="comma-separated upload sizes (0 = original)")
+    vision.add_argument("--qualities", default="70,85,95", help="comma-separated JPEG qualities")
+    vision.add_argument("--server", default="", help="vision server URL; captions each setting when given")
+    vision.add_argument("--repeats", type=int, default=3, help="runs per setting (median reported)")
+
+    caption = commands.add_parser("caption", help="on-device BLIP caption latency and memory per backend")
+    caption.add_argument("paths", nargs="+", help="image files or directories of images")
+    caption.add_argument("--backends", default=",".join(CAPTION_BACKENDS), help="comma-separated backends: " + ", ".join(CAPTION_BACKENDS))
+    caption.add_argument("--tokens", type=int, default=50, help="max new tokens per caption")
+    caption.add_argument("--beams", type=int, default=1, help="beam size for the PyTorch backends")
+    caption.add_argument("--repeats", type=int, default=3, help="runs per image")
+
+    websearch = commands.add_parser("websearch", help="HTTP+lxml vs Selenium search backends on saved result pages")
+    websearch.add_argument("paths", nargs="+", help="saved HTML result pages or directories of them")
+    websearch.add_argument("--repeats", type=int, default=5, help="runs per page and backend")
+    websearch.add_argument("--no-browser", action="store_true", help="only time the HTTP backend")
+
+    args = parser.parse_args()
+    if args.command == "resample":
+        bench_resampler(args.seconds, args.blocksize)
+        if args.play > 0:
+            bench_playback(args.play)
+    elif args.command == "stt":
+        bench_stt(args.paths, args.speed, args.model, args.wake, args.kws_threshold, args.tail)
+    elif args.command == "vision":
+        bench_vision(args.paths, [int(s) for s in args.sizes.split(",")],
+                     [int(q) for q in args.qualities.split(",")], args.server, args.repeats)
+    elif args.command == "caption":
+        bench_caption(args.paths, args.backends.split(","), args.tokens, args.beams, args.repeats)
+    elif args.command == "websearch":
+        bench_websearch(args.paths, args.repeats, not args.no_browser)
+
+
+if __name__ == "__main__":
+    main()
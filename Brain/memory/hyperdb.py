@@ -8,10 +8,15 @@ from typing import List, Union
 import configparser
 
 from module_config import get_api_key
+from module_modelclient import embed_remote
 
 config = configparser.ConfigParser()
 config.read('config.ini')
 
+# local = SentenceTransformer on this device, server = app-server.py /embed
+embedding_backend = config.get('MEMORY', 'embedding_backend', fallback='local').strip().lower()
+embedding_server_url = config.get('MEMORY', 'server_url', fallback='')
+
 def get_embedding_new(documents):
     base_url = config.getboolean('LLM', 'base_url')  # Replace with your API base URL
     api_key = get_api_key(config['LLM']['backend'])
@@ -55,8 +60,15 @@ def get_embedding_new(documents):
         print("Error:", response.status_code, response.text)
         return None
 
-from sentence_transformers import SentenceTransformer
-EMBEDDING_MODEL = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2', device='cpu')
+EMBEDDING_MODEL = None
+
+def get_embedding_model():
+    """Load the local SentenceTransformer on first use (never, with the server backend)."""
+    global EMBEDDING_MODEL
+    if EMBEDDING_MODEL is None:
+        from sentence_transformers import SentenceTransformer
+        EMBEDDING_MODEL = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2', device='cpu')
+    return EMBEDDING_MODEL
 
 def get_embedding(documents, key=None):
     """Default embedding function that uses OpenAI Embeddings."""
@@ -79,7 +91,9 @@ def get_embedding(documents, key=None):
         elif isinstance(documents[0], str):
             texts = documents
 
-    embeddings = EMBEDDING_MODEL.encode(texts)
+    if embedding_backend == 'server':
+        return embed_remote(texts, embedding_server_url)
+    embeddings = get_embedding_model().encode(texts)
     return embeddings
 
 def get_norm_vector(vector):
@@ -0,0 +1,353 @@
+import os
+import math
+import time
+import configparser
+import numpy as np
+from collections import deque
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+config = configparser.ConfigParser()
+config.read(os.path.join(BASE_DIR, 'config.ini'))
+
+playback_gain = config.getfloat('AUDIO', 'gain', fallback=1.0)
+playback_normalize = config.getboolean('AUDIO', 'normalize', fallback=False)
+agc_target_dbfs = config.getfloat('AUDIO', 'agc_target_dbfs', fallback=-18.0)
+agc_attack_ms = config.getfloat('AUDIO', 'agc_attack_ms', fallback=50.0)
+agc_release_ms = config.getfloat('AUDIO', 'agc_release_ms', fallback=800.0)
+agc_max_gain_db = config.getfloat('AUDIO', 'agc_max_gain_db', fallback=12.0)
+limiter_ceiling_dbfs = config.getfloat('AUDIO', 'limiter_ceiling_dbfs', fallback=-1.0)
+limiter_lookahead_ms = config.getfloat('AUDIO', 'limiter_lookahead_ms', fallback=5.0)
+limiter_release_ms = config.getfloat('AUDIO', 'limiter_release_ms', fallback=80.0)
+echo_gate_enabled = config.getboolean('AUDIO', 'echo_gate', fallback=True)
+echo_delay_ms = config.getfloat('AUDIO', 'echo_delay_ms', fallback=150.0)
+echo_margin = config.getfloat('AUDIO', 'echo_margin', fallback=2.5)
+echo_spread_ms = config.getfloat('AUDIO', 'echo_spread_ms', fallback=100.0)
+resample_mode = config.get('AUDIO', 'resample', fallback='auto').strip().lower()
+resample_taps = config.getint('AUDIO', 'resample_taps', fallback=24)
+
+
+def _db_to_int16(dbfs):
+    return 32767.0 * 10 ** (dbfs / 20)
+
+
+class LoudnessStage:
+    """
+    Streaming gain stage for int16 playback blocks: a running AGC with attack/release
+    followed by a look-ahead peak limiter.
+
+    All working buffers are allocated up front (and only regrown if a larger block
+    than ever seen arrives), so steady-state processing does not allocate. Output is
+    delayed by the look-ahead; flush() returns the held-back tail. The AGC level is
+    kept across utterances so loudness stays stable from one reply to the next.
+    """
+
+    def __init__(self, gain=playback_gain, normalize=playback_normalize, target_dbfs=agc_target_dbfs,
+                 attack_ms=agc_attack_ms, release_ms=agc_release_ms, max_gain_db=agc_max_gain_db,
+                 gate_dbfs=-50.0, ceiling_dbfs=limiter_ceiling_dbfs, lookahead_ms=limiter_lookahead_ms,
+                 limiter_release_ms=limiter_release_ms, max_block=4096):
+        self.gain = float(gain)
+        self.normalize = normalize
+        self.target = _db_to_int16(target_dbfs)
+        self.attack_ms = attack_ms
+        self.release_ms = release_ms
+        self.max_gain = 10 ** (max_gain_db / 20)
+        self.min_gain = 1 / self.max_gain
+        self.gate = _db_to_int16(gate_dbfs)
+        self.ceiling = _db_to_int16(ceiling_dbfs)
+        self.lookahead_ms = lookahead_ms
+        self.limiter_release_ms = limiter_release_ms
+        self.max_block = max_block
+
+        self.samplerate = None
+        self.channels = None
+        self.level = self.target  # running AGC level estimate (int16 RMS units)
+        self.agc_gain = 1.0
+        self.limiter_gain = 1.0
+
+        # Per-block timing
+        self.blocks = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def _allocate(self, samplerate, channels, max_block):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.max_block = max_block
+        self.lookahead = int(samplerate * self.lookahead_ms / 1000) * channels
+        self.work = np.zeros(self.lookahead + max_block, dtype=np.float32)
+        self.scratch = np.zeros(self.lookahead + max_block, dtype=np.float32)
+        self.delay = np.zeros(self.lookahead, dtype=np.float32)
+        self.curve = np.zeros(max_block, dtype=np.float32)
+        self.index = np.arange(max_block, dtype=np.float32)
+        self.out = np.zeros(max_block, dtype=np.int16)
+        self.silence = np.zeros(self.lookahead, dtype=np.int16)
+
+    def reset(self, samplerate, channels=1):
+        """
+        Prepare for a new utterance. The AGC level is deliberately kept.
+        """
+        if samplerate != self.samplerate or channels != self.channels:
+            self._allocate(samplerate, channels, self.max_block)
+        self.delay.fill(0)
+        self.limiter_gain = 1.0
+
+    def _coef(self, n, ms):
+        # One-pole smoothing coefficient for a block of n samples
+        return math.exp(-n / (self.samplerate * self.channels * ms / 1000)) if ms > 0 else 0.0
+
+    def _ramp(self, curve, start, end, length):
+        np.multiply(self.index[:length], (end - start) / length, out=curve[:length])
+        curve[:length] += start
+
+    def process(self, block):
+        """
+        Process one int16 block and return the (delayed) output block. The returned
+        array is an internal buffer that is overwritten by the next call.
+        """
+        t0 = time.perf_counter_ns()
+        n = block.size
+        if n > self.max_block:
+            self._allocate(self.samplerate, self.channels, n)
+        L = self.lookahead
+        work = self.work
+        curve = self.curve[:n]
+
+        work[:L] = self.delay
+        x = work[L:L + n]
+        np.copyto(x, block, casting='unsafe')
+
+        # AGC: track block RMS with attack/release, then ramp towards the new gain
+        previous = self.agc_gain * self.gain
+        if self.normalize and n:
+            rms = math.sqrt(float(np.dot(x, x)) / n)
+            if rms > self.gate:
+                coef = self._coef(n, self.attack_ms if rms > self.level else self.release_ms)
+                self.level = coef * self.level + (1 - coef) * rms
+                self.agc_gain = min(self.max_gain, max(self.min_gain, self.target / self.level))
+        self._ramp(curve, previous, self.agc_gain * self.gain, n)
+        x *= curve
+
+        # Limiter: the gain reached by the end of this block must keep everything up to
+        # the end of the look-ahead window under the ceiling
+        window = self.scratch[:n + L]
+        np.abs(work[:n + L], out=window)
+        peak = float(window.max()) if n + L else 0.0
+        target = min(1.0, self.ceiling / peak) if peak > 0 else 1.0
+        start = self.limiter_gain
+        if target < start:
+            ramp_length = max(1, min(L, n))
+            self._ramp(curve, start, target, ramp_length)
+            curve[ramp_length:] = target
+            self.limiter_gain = target
+        else:
+            coef = self._coef(n, self.limiter_release_ms)
+            self.limiter_gain = target + (start - target) * coef
+            self._ramp(curve, start, self.limiter_gain, n)
+
+        y = work[:n]
+        y *= curve
+        np.clip(y, -32768, 32767, out=y)
+        out = self.out[:n]
+        np.copyto(out, y, casting='unsafe')
+        self.delay[:] = work[n:n + L]
+
+        elapsed = time.perf_counter_ns() - t0
+        self.blocks += 1
+        self.total_ns += elapsed
+        self.max_ns = max(self.max_ns, elapsed)
+        return out
+
+    def flush(self):
+        """
+        Return the samples still held in the look-ahead delay line.
+        """
+        if self.lookahead == 0:
+            return self.out[:0]
+        return self.process(self.silence)
+
+    def timing(self):
+        """
+        Average and worst-case processing time per block, in microseconds.
+        """
+        return {
+            "blocks": self.blocks,
+            "avg_us": self.total_ns / self.blocks / 1000 if self.blocks else 0.0,
+            "max_us": self.max_ns / 1000,
+        }
+
+
+class EchoGate:
+    """
+    Reference-based echo gate for the capture path.
+
+    The player reports the RMS of every block it hands to the device. A captured
+    block's echo comes from the playback of about delay_ms earlier, so it is compared
+    against the loudest reference block in [now - delay - spread, now - delay + spread].
+    If the mic level is explained by coupling * reference (times margin), the block
+    is TARS hearing itself and is muted; louder blocks are the user talking over it
+    and pass unchanged.
+
+    The coupling (speaker-to-mic gain of the room) is learned only from echo-dominated
+    blocks: reference active and the mic no more than learn_margin above the current
+    prediction. It is set to a high percentile of their mic/reference ratios over the
+    last window blocks, so it follows the peaks of the echo path rather than the
+    quiet gaps between syllables.
+    """
+
+    def __init__(self, delay_ms=echo_delay_ms, margin=echo_margin, coupling=0.5, spread_ms=echo_spread_ms,
+                 learn_margin=1.5, percentile=90, window=100, min_reference=100.0, history=256):
+        self.delay = delay_ms / 1000
+        self.spread = spread_ms / 1000
+        self.margin = margin
+        self.coupling = coupling
+        self.learn_margin = learn_margin
+        self.percentile = percentile
+        self.min_reference = min_reference
+        self.ratios = deque(maxlen=window)
+        self.times = np.full(history, -np.inf)
+        self.levels = np.zeros(history)
+        self.index = 0
+        self.gated_blocks = 0
+
+    def push_reference(self, block, now=None):
+        """
+        Record the level of an output block. Called from the player's audio callback.
+        """
+        rms = math.sqrt(float(np.dot(block, block.astype(np.float32))) / block.size) if block.size else 0.0
+        i = self.index % self.times.size
+        self.levels[i] = rms
+        self.times[i] = time.monotonic() if now is None else now
+        self.index += 1
+
+    def reference_level(self, now=None):
+        """
+        Loudest reference whose echo can be arriving now.
+        """
+        now = time.monotonic() if now is None else now
+        centre = now - self.delay
+        aligned = (self.times >= centre - self.spread) & (self.times <= centre + self.spread)
+        return float(self.levels[aligned].max()) if aligned.any() else 0.0
+
+    def process(self, block, now=None):
+        """
+        Return the captured int16 block, or silence if it only contains playback echo.
+        """
+        reference = self.reference_level(now)
+        if reference < self.min_reference or block.size == 0:
+            return block
+        mic = math.sqrt(float(np.dot(block, block.astype(np.float32))) / block.size)
+        predicted = self.coupling * reference
+        if mic <= predicted * self.learn_margin:
+            self.ratios.append(mic / reference)
+            if len(self.ratios) >= self.ratios.maxlen // 4:
+                self.coupling = min(max(float(np.percentile(self.ratios, self.percentile)), 1e-3), 4.0)
+        if mic < predicted * self.margin:
+            self.gated_blocks += 1
+            return np.zeros_like(block)
+        return block
+
+
+class PolyphaseResampler:
+    """
+    Streaming rational resampler for interleaved int16 blocks.
+
+    The rate ratio is reduced to L/M with the gcd, and a Kaiser-windowed low-pass
+    prototype of L * taps coefficients is split into L phases of taps each. Output
+    sample k uses phase (k * M) % L against the taps input samples ending at
+    (k * M) // L, so each block is one gather plus one multiply-accumulate over all
+    of its outputs. Absolute sample counters and the last taps - 1 input frames are
+    kept between calls, so block boundaries are seamless.
+    """
+
+    def __init__(self, in_rate, out_rate, channels=1, taps=resample_taps, beta=8.0, rolloff=0.9):
+        self.in_rate = int(in_rate)
+        self.out_rate = int(out_rate)
+        self.channels = channels
+        g = math.gcd(self.in_rate, self.out_rate)
+        self.up = self.out_rate // g
+        self.down = self.in_rate // g
+        self.taps = taps
+
+        length = self.up * taps
+        cutoff = 0.5 * rolloff / max(self.up, self.down)  # cycles per upsampled sample
+        t = np.arange(length) - (length - 1) / 2
+        prototype = 2 * cutoff * np.sinc(2 * cutoff * t) * np.kaiser(length, beta)
+        prototype *= self.up / prototype.sum()
+        # phases[p, j] = prototype[p + j * up]
+        self.phases = prototype.reshape(taps, self.up).T.astype(np.float32).copy()
+        self.offsets = np.arange(taps)
+        self.reset()
+
+    def reset(self):
+        self.history = np.zeros((self.taps - 1, self.channels), dtype=np.float32)
+        self.in_total = 0
+        self.out_total = 0
+
+    def process(self, block):
+        """
+        Resample one int16 block and return the int16 output produced so far.
+        """
+        x = np.asarray(block, dtype=np.int16).reshape(-1, self.channels)
+        buf = np.concatenate((self.history, x.astype(np.float32)))
+        base = self.in_total - (self.taps - 1)  # absolute index of buf[0]
+        self.in_total += x.shape[0]
+
+        # Every output whose newest input sample has arrived
+        end = (self.in_total * self.up - 1) // self.down + 1
+        k = np.arange(self.out_total, end, dtype=np.int64)
+        self.out_total = end
+        self.history = buf[buf.shape[0] - (self.taps - 1):]
+        if k.size == 0:
+            return np.zeros(0, dtype=np.int16)
+
+        position = k * self.down
+        newest = position // self.up - base
+        frames = buf[newest[:, None] - self.offsets]  # (outputs, taps, channels)
+        y = np.einsum('kt,ktc->kc', self.phases[position % self.up], frames)
+        np.clip(y, -32768, 32767, out=y)
+        return y.astype(np.int16).reshape(-1)
+
+    def flush(self):
+        """
+        Push the filter tail out with silence.
+        """
+        return self.process(np.zeros(self.taps // 2 * self.channels, dtype=np.int16))
+
+
+def choose_device_samplerate(source_rate, device_rate, is_supported, mode=resample_mode, override=0):
+    """
+    Pick the rate to open an audio device at for source_rate material.
+
+    'auto' converts explicitly (PolyphaseResampler) to the device's native rate, or
+    to override if set, whenever it differs from the source and the device accepts
+    it; 'off' opens the device at the source rate and leaves any conversion to
+    PortAudio/ALSA. Returns source_rate when no explicit resampling is needed.
+    """
+    if mode == 'off':
+        return source_rate
+    target = int(override or device_rate or 0)
+    if not target or target == source_rate:
+        return source_rate
+    return target if is_supported(target) else source_rate
+
+
+_default_stage = None
+
+def get_loudness_stage(gain=None, normalize=None):
+    """
+    Return the shared stage built from [AUDIO] settings, or a dedicated one when the
+    caller overrides gain/normalize. Returns None when the stage would be a no-op.
+    """
+    global _default_stage
+    if gain is None and normalize is None:
+        if not playback_normalize and playback_gain == 1.0:
+            return None
+        if _default_stage is None:
+            _default_stage = LoudnessStage()
+        return _default_stage
+    gain = playback_gain if gain is None else gain
+    normalize = playback_normalize if normalize is None else normalize
+    if not normalize and gain == 1.0:
+        return None
+    return LoudnessStage(gain=gain, normalize=normalize)
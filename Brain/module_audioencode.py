@@ -0,0 +1,62 @@
+import wave
+from io import BytesIO
+
+# Upload formats: (filename, mimetype, soundfile format, soundfile subtype)
+FORMATS = {
+    "wav": ("audio.wav", "audio/wav", None, None),
+    "flac": ("audio.flac", "audio/flac", "FLAC", "PCM_16"),
+    "opus": ("audio.ogg", "audio/ogg", "OGG", "OPUS"),
+}
+
+
+def local_formats():
+    """
+    Upload formats this machine can encode: always wav, plus flac/opus if the
+    installed soundfile/libsndfile supports them.
+    """
+    formats = ["wav"]
+    try:
+        import soundfile as sf
+    except ImportError:
+        return formats
+    for name, (_, _, container, subtype) in FORMATS.items():
+        if container and subtype in sf.available_subtypes(container):
+            formats.append(name)
+    return formats
+
+
+class UtteranceEncoder:
+    """
+    Encodes int16 mono audio block by block while it is being captured, so the
+    compressed upload is ready as soon as the user stops speaking.
+    """
+
+    def __init__(self, fmt="wav", samplerate=16000):
+        self.format = fmt
+        self.filename, self.mimetype, container, subtype = FORMATS[fmt]
+        self.samplerate = samplerate
+        self.buffer = BytesIO()
+        self.raw_bytes = 0
+        if container is None:
+            self.file = wave.open(self.buffer, "wb")
+            self.file.setnchannels(1)
+            self.file.setsampwidth(2)
+            self.file.setframerate(samplerate)
+        else:
+            import soundfile as sf
+            self.file = sf.SoundFile(self.buffer, mode="w", samplerate=samplerate, channels=1,
+                                     format=container, subtype=subtype)
+
+    def write(self, samples):
+        self.raw_bytes += samples.size * 2
+        if self.format == "wav":
+            self.file.writeframes(samples.tobytes())
+        else:
+            self.file.write(samples)
+
+    def finish(self):
+        """
+        Close the stream and return the encoded bytes.
+        """
+        self.file.close()
+        return self.buffer.getvalue()
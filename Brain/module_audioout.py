@@ -0,0 +1,346 @@
+import os
+import time
+import threading
+import configparser
+import numpy as np
+import sounddevice as sd
+from datetime import datetime
+
+from module_tts import parse_wav_header
+from module_audiodsp import PolyphaseResampler, choose_device_samplerate
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+config = configparser.ConfigParser()
+config.read(os.path.join(BASE_DIR, 'config.ini'))
+
+prebuffer_ms = config.getint('AUDIO', 'prebuffer_ms', fallback=150)
+output_blocksize = config.getint('AUDIO', 'blocksize', fallback=512)
+output_device = config.get('AUDIO', 'output_device', fallback='') or None
+output_samplerate = config.getint('AUDIO', 'output_samplerate', fallback=0)
+
+# Format assumed for streams that arrive without a WAV header
+DEFAULT_SAMPLERATE = 22050
+DEFAULT_CHANNELS = 1
+
+
+class WavStreamParser:
+    """
+    Incrementally strips a WAV header from a byte stream and re-frames the remaining
+    bytes into whole int16 frames, whatever the HTTP chunk boundaries were.
+    Streams that do not start with RIFF are treated as raw PCM in the default format.
+    """
+
+    def __init__(self, default_samplerate=DEFAULT_SAMPLERATE, default_channels=DEFAULT_CHANNELS):
+        self.samplerate = default_samplerate
+        self.channels = default_channels
+        self.sampwidth = 2
+        self.header_done = False
+        self.pending = b""
+
+    def feed(self, chunk):
+        """
+        Add bytes and return the int16 samples that are now complete (or None).
+        """
+        self.pending += chunk
+        if not self.header_done:
+            if len(self.pending) < 4:
+                return None
+            if self.pending[:4] == b"RIFF":
+                header = parse_wav_header(self.pending)
+                if header is None:
+                    if len(self.pending) > 65536:
+                        raise ValueError("WAV header not found in the first 64 KB of the stream")
+                    return None
+                if header["sampwidth"] != 2:
+                    raise ValueError(f"Unsupported sample width: {header['sampwidth'] * 8} bit")
+                self.samplerate = header["samplerate"]
+                self.channels = header["channels"]
+                self.pending = self.pending[header["data_offset"]:]
+            self.header_done = True
+
+        frame_bytes = self.channels * self.sampwidth
+        usable = len(self.pending) - len(self.pending) % frame_bytes
+        if usable == 0:
+            return None
+        samples = np.frombuffer(self.pending[:usable], dtype=np.int16)
+        self.pending = self.pending[usable:]
+        return samples
+
+
+class SampleFifo:
+    """
+    Fixed-size int16 FIFO shared between the producer and the PortAudio callback.
+    """
+
+    def __init__(self, capacity):
+        self.buffer = np.zeros(capacity, dtype=np.int16)
+        self.capacity = capacity
+        self.read_pos = 0
+        self.write_pos = 0
+        self.cond = threading.Condition()
+
+    def __len__(self):
+        return self.write_pos - self.read_pos
+
+    def write(self, samples, stop_event):
+        """
+        Append samples, blocking while the FIFO is full. Returns False if stopped.
+        """
+        offset = 0
+        while offset < samples.size:
+            with self.cond:
+                space = self.capacity - len(self)
+                if space == 0:
+                    self.cond.wait(0.05)
+                    if stop_event.is_set():
+                        return False
+                    continue
+                n = min(space, samples.size - offset)
+                start = self.write_pos % self.capacity
+                first = min(n, self.capacity - start)
+                self.buffer[start:start + first] = samples[offset:offset + first]
+                self.buffer[:n - first] = samples[offset + first:offset + n]
+                self.write_pos += n
+                offset += n
+        return not stop_event.is_set()
+
+    def read_into(self, out):
+        """
+        Copy up to out.size samples into out and return how many were copied.
+        """
+        with self.cond:
+            n = min(len(self), out.size)
+            start = self.read_pos % self.capacity
+            first = min(n, self.capacity - start)
+            out[:first] = self.buffer[start:start + first]
+            out[first:n] = self.buffer[:n - first]
+            self.read_pos += n
+            self.cond.notify()
+            return n
+
+    def clear(self):
+        with self.cond:
+            self.read_pos = self.write_pos
+            self.cond.notify()
+
+
+class AudioPlayer:
+    """
+    Streaming player with a single long-lived output stream.
+
+    Incoming audio goes into a jitter buffer; playback of an utterance starts once
+    prebuffer_ms of audio is queued (or the stream ended), and after an underrun
+    the buffer refills to the same level before resuming. The output stream is only
+    reopened when the sample format changes. When the source rate differs from the
+    device's native rate, audio is converted with an explicit PolyphaseResampler
+    before it is queued instead of relying on PortAudio/ALSA.
+    """
+
+    def __init__(self, prebuffer_ms=prebuffer_ms, blocksize=output_blocksize, device=output_device, buffer_seconds=10,
+                 samplerate_override=output_samplerate):
+        self.prebuffer_ms = prebuffer_ms
+        self.blocksize = blocksize
+        self.device = device
+        self.buffer_seconds = buffer_seconds
+        self.samplerate_override = samplerate_override
+
+        self.stream = None
+        self.source_samplerate = None
+        self.samplerate = None  # rate the device runs at
+        self.channels = None
+        self.fifo = None
+        self.resampler = None
+
+        self.play_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.feeding = False
+        self.started = False
+        self.prebuffer_samples = 0
+        self.underruns = 0  # total since startup
+        self._utterance_underruns = 0
+        self.reference_listener = None  # called with every block sent to the device
+
+    def _device_samplerate(self, samplerate, channels):
+        def is_supported(rate):
+            try:
+                sd.check_output_settings(device=self.device, samplerate=rate, channels=channels, dtype='int16')
+                return True
+            except Exception:
+                return False
+        try:
+            native = sd.query_devices(self.device, 'output')['default_samplerate']
+        except Exception:
+            native = None
+        return choose_device_samplerate(samplerate, native, is_supported, override=self.samplerate_override)
+
+    def _ensure_stream(self, samplerate, channels):
+        if self.stream is not None and samplerate == self.source_samplerate and channels == self.channels:
+            return
+        device_rate = self._device_samplerate(samplerate, channels)
+        self.resampler = None
+        if device_rate != samplerate:
+            self.resampler = PolyphaseResampler(samplerate, device_rate, channels)
+        self.source_samplerate = samplerate
+        if self.stream is not None and device_rate == self.samplerate and channels == self.channels:
+            return
+        self.close()
+        self.fifo = SampleFifo(device_rate * channels * self.buffer_seconds)
+        self.stream = sd.OutputStream(
+            samplerate=device_rate,
+            channels=channels,
+            dtype='int16',
+            blocksize=self.blocksize,
+            device=self.device,
+            callback=self._callback,
+        )
+        self.samplerate = device_rate
+        self.channels = channels
+        self.stream.start()
+        resampling = f", resampling from {samplerate} Hz" if self.resampler is not None else ""
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LOAD: Audio output stream opened ({device_rate} Hz, {channels} ch{resampling}).")
+
+    def _callback(self, outdata, frames, time_info, status):
+        out = outdata.reshape(-1)
+        if not self.started:
+            out.fill(0)
+        else:
+            n = self.fifo.read_into(out)
+            if n < out.size:
+                out[n:] = 0
+                if self.feeding:
+                    # The network fell behind: count it and rebuild the jitter buffer
+                    self.underruns += 1
+                    self._utterance_underruns += 1
+                    self.started = False
+        if self.reference_listener is not None:
+            self.reference_listener(out)
+
+    def _begin(self, samplerate, channels, dsp=None):
+        self._ensure_stream(samplerate, channels)
+        if dsp is not None:
+            dsp.reset(samplerate, channels)
+        if self.resampler is not None:
+            self.resampler.reset()
+        self.fifo.clear()
+        self.prebuffer_samples = int(self.samplerate * channels * self.prebuffer_ms / 1000)
+        self._utterance_underruns = 0
+        self.started = False
+        self.feeding = True
+
+    def _write(self, samples):
+        if self.resampler is not None:
+            samples = self.resampler.process(samples)
+        ok = self.fifo.write(samples, self.stop_event)
+        if not self.started and len(self.fifo) >= self.prebuffer_samples:
+            self.started = True
+        return ok
+
+    def _finish(self, t_start, t_first):
+        if self.resampler is not None and not self.stop_event.is_set():
+            self.fifo.write(self.resampler.flush(), self.stop_event)
+        self.feeding = False
+        self.started = True
+        while len(self.fifo) > 0 and not self.stop_event.is_set():
+            time.sleep(0.005)
+        if not self.stop_event.is_set():
+            # Let the device play out what PortAudio already holds
+            time.sleep(self.stream.latency + self.blocksize / self.samplerate)
+        return {
+            "underruns": self._utterance_underruns,
+            "first_audio": None if t_first is None else t_first - t_start,
+            "duration": time.monotonic() - t_start,
+            "stopped": self.stop_event.is_set(),
+        }
+
+    def play_stream(self, byte_stream, default_samplerate=DEFAULT_SAMPLERATE, default_channels=DEFAULT_CHANNELS, dsp=None):
+        """
+        Play a stream of WAV (or raw int16) byte chunks and block until it has played out.
+        dsp, if given, is a streaming stage (reset/process/flush, e.g. LoudnessStage)
+        applied to each re-framed int16 block before it is queued.
+        """
+        with self.play_lock:
+            self.stop_event.clear()
+            parser = WavStreamParser(default_samplerate, default_channels)
+            t_start = time.monotonic()
+            t_first = None
+            begun = False
+            try:
+                for chunk in byte_stream:
+                    if self.stop_event.is_set():
+                        break
+                    if not chunk:
+                        continue
+                    samples = parser.feed(chunk)
+                    if samples is None:
+                        continue
+                    if not begun:
+                        self._begin(parser.samplerate, parser.channels, dsp)
+                        begun = True
+                        t_first = time.monotonic()
+                    if dsp is not None:
+                        samples = dsp.process(samples)
+                    if not self._write(samples):
+                        break
+                else:
+                    if begun and dsp is not None:
+                        self._write(dsp.flush())
+            finally:
+                if hasattr(byte_stream, "close"):
+                    byte_stream.close()
+            if not begun:
+                return None
+            stats = self._finish(t_start, t_first)
+        if stats["underruns"]:
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: Playback underruns: {stats['underruns']} (total {self.underruns})")
+        return stats
+
+    def play_pcm(self, samples, samplerate, channels=1, dsp=None):
+        """
+        Play an in-memory int16 buffer through the same output stream.
+        """
+        with self.play_lock:
+            self.stop_event.clear()
+            t_start = time.monotonic()
+            self._begin(samplerate, channels, dsp)
+            samples = np.asarray(samples, dtype=np.int16).reshape(-1)
+            if dsp is None:
+                self._write(samples)
+            else:
+                step = self.blocksize * channels
+                for i in range(0, samples.size, step):
+                    if not self._write(dsp.process(samples[i:i + step])):
+                        break
+                else:
+                    self._write(dsp.flush())
+            return self._finish(t_start, t_start)
+
+    def stop(self):
+        """
+        Stop the current utterance immediately (the output stream stays open).
+        """
+        self.stop_event.set()
+        self.started = False
+        if self.fifo is not None:
+            self.fifo.clear()
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+            self.samplerate = None
+
+
+player = None
+_player_lock = threading.Lock()
+
+def get_player():
+    """
+    Return the process-wide AudioPlayer, creating it on first use.
+    """
+    global player
+    with _player_lock:
+        if player is None:
+            player = AudioPlayer()
+        return player
@@ -0,0 +1,66 @@
+import time
+import threading
+import numpy as np
+from datetime import datetime
+
+from module_capture import open_reader
+
+FRAME_MS = 20
+MIN_SPEECH_FRAMES = 5  # never trigger on less than 100 ms of continuous speech
+
+
+class BargeInMonitor:
+    """
+    Watches the shared capture stream while TARS is thinking or talking and calls
+    on_barge_in(speech_pos, t_detect) once the user has been speaking for speech_ms:
+    that many consecutive 20 ms frames over the threshold (at least MIN_SPEECH_FRAMES),
+    so a single loud block (a click, or echo leaking past the echo gate) is ignored.
+
+    speech_pos is the capture ring position where the speech started, so the next
+    turn can be transcribed from the user's first word.
+    """
+
+    def __init__(self, on_barge_in, threshold_fn, speech_ms=200, samplerate=16000):
+        self.on_barge_in = on_barge_in
+        self.threshold_fn = threshold_fn
+        self.frame_samples = samplerate * FRAME_MS // 1000
+        self.frames_required = max(MIN_SPEECH_FRAMES, speech_ms // FRAME_MS)
+        self.speech_frames = 0
+        self.done = threading.Event()
+        self.triggered = False
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="BargeInMonitor", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.done.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1)
+
+    def observe(self, frame):
+        """
+        Count one captured frame; True once the run of loud frames is long enough.
+        """
+        rms = np.sqrt(np.mean(np.square(frame, dtype=np.float64)))
+        if rms > self.threshold_fn():
+            self.speech_frames += 1
+        else:
+            self.speech_frames = 0
+        return self.speech_frames >= self.frames_required
+
+    def _run(self):
+        reader = open_reader()
+        while not self.done.is_set():
+            data = reader.read(self.frame_samples, timeout=0.2, stop_event=self.done)
+            if data is None:
+                continue
+            if self.observe(data):
+                self.triggered = True
+                speech_pos = reader.pos - self.speech_frames * self.frame_samples
+                t_detect = time.monotonic()
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: Barge-in detected ({self.speech_frames * FRAME_MS} ms of speech).")
+                self.on_barge_in(speech_pos, t_detect)
+                return
@@ -0,0 +1,116 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests into small batches for a single model worker.
+
+    Callers block in submit(); a worker thread takes the first queued job, waits up
+    to max_wait_ms for more (or until max_batch jobs are collected) and calls
+    process_batch(items), which must return one result per item. A result that is an
+    Exception instance fails only its own job; an exception raised by process_batch
+    fails the whole batch.
+    """
+
+    def __init__(self, process_batch, max_batch=8, max_wait_ms=20, name="MicroBatcher"):
+        self.process_batch = process_batch
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+        # Counters for /stats
+        self.submitted = 0
+        self.batches = 0
+        self.batched_items = 0
+        self.max_depth = 0
+        self.wait_total = 0.0
+        self.busy_total = 0.0
+
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    @property
+    def depth(self):
+        """
+        Jobs waiting for a batch (not counting the batch being processed).
+        """
+        return self.jobs.qsize()
+
+    def submit_async(self, item):
+        future = Future()
+        with self.lock:
+            self.submitted += 1
+            self.jobs.put((item, future, time.monotonic()))
+            self.max_depth = max(self.max_depth, self.jobs.qsize())
+        return future
+
+    def submit(self, item, timeout=None):
+        """
+        Queue one item and block until its batch has been processed.
+        """
+        return self.submit_async(item).result(timeout=timeout)
+
+    def _collect(self):
+        try:
+            first = self.jobs.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.jobs.get(timeout=remaining) if remaining > 0 else self.jobs.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self.done.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            started = time.monotonic()
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.process_batch(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"{self.name}: {len(results)} results for {len(items)} items")
+            except Exception as e:
+                results = [e] * len(items)
+            finished = time.monotonic()
+
+            with self.lock:
+                self.batches += 1
+                self.batched_items += len(batch)
+                self.wait_total += sum(started - queued for _, _, queued in batch)
+                self.busy_total += finished - started
+            for (_, future, _), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "queue_depth": self.jobs.qsize(),
+                "max_queue_depth": self.max_depth,
+                "submitted": self.submitted,
+                "batches": self.batches,
+                "avg_batch_size": self.batched_items / self.batches if self.batches else 0.0,
+                "avg_queue_wait_ms": self.wait_total / self.batched_items * 1000 if self.batched_items else 0.0,
+                "avg_batch_ms": self.busy_total / self.batches * 1000 if self.batches else 0.0,
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+    def stop(self):
+        self.done.set()
+        self.thread.join(timeout=1)
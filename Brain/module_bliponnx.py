@@ -0,0 +1,228 @@
+"""
+BLIP captioning on ONNX Runtime.
+
+The PyTorch model is exported once into a vision encoder and a text decoder that
+takes and returns the self-attention key/value cache, so each generated token
+only runs the new position through the decoder. Weights are quantized to int8
+with onnxruntime's dynamic quantization. At runtime only onnxruntime, numpy and
+the tokenizer are needed, not torch.
+
+    python module_bliponnx.py [OUTPUT_DIR]    # export (needs torch + transformers)
+"""
+import os
+import sys
+import json
+import numpy as np
+from datetime import datetime
+
+BLIP_MODEL = "Salesforce/blip-image-captioning-base"
+META_FILE = "blip_onnx.json"
+
+
+def model_files(model_dir, precision):
+    suffix = "-int8" if precision == "int8" else ""
+    return os.path.join(model_dir, f"encoder{suffix}.onnx"), os.path.join(model_dir, f"decoder{suffix}.onnx")
+
+
+def is_exported(model_dir, precision):
+    return all(os.path.exists(path) for path in model_files(model_dir, precision) + (os.path.join(model_dir, META_FILE),))
+
+
+def export_blip_onnx(output_dir, quantize=True, opset=17):
+    """
+    Export BLIP to output_dir as encoder.onnx / decoder.onnx (plus -int8 variants),
+    the tokenizer and a small JSON file with the preprocessing and token settings.
+    """
+    import torch
+    from transformers import BlipProcessor, BlipForConditionalGeneration
+
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LOAD: Exporting {BLIP_MODEL} to ONNX in {output_dir}...")
+    os.makedirs(output_dir, exist_ok=True)
+    processor = BlipProcessor.from_pretrained(BLIP_MODEL)
+    model = BlipForConditionalGeneration.from_pretrained(BLIP_MODEL).eval()
+
+    text_config = model.config.text_config
+    layers = text_config.num_hidden_layers
+    heads = text_config.num_attention_heads
+    head_dim = text_config.hidden_size // heads
+    size = model.config.vision_config.image_size
+    image_processor = processor.image_processor
+
+    class Encoder(torch.nn.Module):
+        def __init__(self, vision_model):
+            super().__init__()
+            self.vision_model = vision_model
+
+        def forward(self, pixel_values):
+            return self.vision_model(pixel_values=pixel_values)[0]
+
+    class Decoder(torch.nn.Module):
+        def __init__(self, text_decoder):
+            super().__init__()
+            self.text_decoder = text_decoder
+
+        def forward(self, input_ids, attention_mask, image_embeds, *past):
+            past_key_values = tuple((past[2 * i], past[2 * i + 1]) for i in range(layers))
+            out = self.text_decoder(input_ids=input_ids, attention_mask=attention_mask,
+                                    encoder_hidden_states=image_embeds, past_key_values=past_key_values,
+                                    use_cache=True, return_dict=True)
+            cache = out.past_key_values
+            if hasattr(cache, "to_legacy_cache"):
+                cache = cache.to_legacy_cache()
+            return (out.logits[:, -1, :],) + tuple(t for layer in cache for t in layer[:2])
+
+    encoder_path, decoder_path = model_files(output_dir, "fp32")
+    pixel_values = torch.zeros(1, 3, size, size)
+    with torch.no_grad():
+        torch.onnx.export(Encoder(model.vision_model), (pixel_values,), encoder_path,
+                          input_names=["pixel_values"], output_names=["image_embeds"],
+                          dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+                          opset_version=opset)
+        image_embeds = model.vision_model(pixel_values=pixel_values)[0]
+
+        # Trace with one cached position so the past length stays a dynamic axis
+        past_names = [f"past_{kind}_{i}" for i in range(layers) for kind in ("key", "value")]
+        present_names = [name.replace("past", "present") for name in past_names]
+        past = tuple(torch.zeros(1, heads, 1, head_dim) for _ in past_names)
+        inputs = (torch.tensor([[text_config.bos_token_id]]), torch.ones(1, 2, dtype=torch.long), image_embeds) + past
+        dynamic_axes = {"input_ids": {1: "sequence"}, "attention_mask": {1: "total"},
+                        "image_embeds": {1: "patches"}, "logits": {}}
+        dynamic_axes.update({name: {2: "past"} for name in past_names})
+        dynamic_axes.update({name: {2: "total"} for name in present_names})
+        torch.onnx.export(Decoder(model.text_decoder), inputs, decoder_path,
+                          input_names=["input_ids", "attention_mask", "image_embeds"] + past_names,
+                          output_names=["logits"] + present_names,
+                          dynamic_axes=dynamic_axes, opset_version=opset)
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        for source, target in zip(model_files(output_dir, "fp32"), model_files(output_dir, "int8")):
+            quantize_dynamic(source, target, weight_type=QuantType.QInt8)
+
+    check_decoder(model, output_dir, "fp32")
+    if quantize:
+        check_decoder(model, output_dir, "int8")
+
+    processor.tokenizer.save_pretrained(output_dir)
+    meta = {
+        "image_size": size,
+        "image_mean": list(image_processor.image_mean),
+        "image_std": list(image_processor.image_std),
+        "bos_token_id": text_config.bos_token_id,
+        "eos_token_id": text_config.sep_token_id,
+        "layers": layers,
+        "heads": heads,
+        "head_dim": head_dim,
+    }
+    with open(os.path.join(output_dir, META_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LOAD: BLIP ONNX export complete.")
+
+
+def check_decoder(model, model_dir, precision, steps=2):
+    """
+    Run the exported encoder/decoder the way BlipOnnxCaptioner does (starting from an
+    empty key/value cache, which the decoder was not traced with) and compare the
+    logits of the first steps with the PyTorch model. fp32 must match closely; int8
+    only has to produce finite logits of the right shape. Raises ValueError otherwise.
+    """
+    import torch
+    import onnxruntime as ort
+
+    text_config = model.config.text_config
+    heads = text_config.num_attention_heads
+    head_dim = text_config.hidden_size // heads
+    size = model.config.vision_config.image_size
+    encoder_path, decoder_path = model_files(model_dir, precision)
+    encoder = ort.InferenceSession(encoder_path, providers=["CPUExecutionProvider"])
+    decoder = ort.InferenceSession(decoder_path, providers=["CPUExecutionProvider"])
+    present_names = [output.name for output in decoder.get_outputs()[1:]]
+
+    pixel_values = torch.randn(1, 3, size, size, generator=torch.Generator().manual_seed(0))
+    image_embeds = encoder.run(None, {"pixel_values": pixel_values.numpy()})[0]
+    empty = np.zeros((1, heads, 0, head_dim), dtype=np.float32)
+    past = {name.replace("present", "past"): empty for name in present_names}
+
+    with torch.no_grad():
+        torch_embeds = model.vision_model(pixel_values=pixel_values)[0]
+    tokens = [text_config.bos_token_id]
+    for step in range(steps):
+        outputs = decoder.run(None, {
+            "input_ids": np.array([[tokens[-1]]], dtype=np.int64),
+            "attention_mask": np.ones((1, len(tokens)), dtype=np.int64),
+            "image_embeds": image_embeds,
+            **past,
+        })
+        logits = outputs[0][0]
+        if logits.shape != (text_config.vocab_size,) or not np.isfinite(logits).all():
+            raise ValueError(f"{precision} decoder returned bad logits at step {step} (shape {logits.shape})")
+        if precision == "fp32":
+            with torch.no_grad():
+                expected = model.text_decoder(input_ids=torch.tensor([tokens]), encoder_hidden_states=torch_embeds,
+                                              return_dict=True).logits[0, -1].numpy()
+            error = float(np.abs(logits - expected).max())
+            if error > 1e-3 * max(1.0, float(np.abs(expected).max())):
+                raise ValueError(f"fp32 decoder differs from PyTorch at step {step} (max error {error:.2e})")
+        tokens.append(int(logits.argmax()))
+        past = {name.replace("present", "past"): value for name, value in zip(present_names, outputs[1:])}
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LOAD: {precision} decoder checked against an empty cache ({steps} steps).")
+
+
+class BlipOnnxCaptioner:
+    """
+    Greedy BLIP captioning with the exported encoder/decoder and a cached decoder loop.
+    """
+
+    def __init__(self, model_dir, precision="int8", threads=0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, META_FILE)) as f:
+            self.meta = json.load(f)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        encoder_path, decoder_path = model_files(model_dir, precision)
+        self.encoder = ort.InferenceSession(encoder_path, options, providers=["CPUExecutionProvider"])
+        self.decoder = ort.InferenceSession(decoder_path, options, providers=["CPUExecutionProvider"])
+        self.present_names = [output.name for output in self.decoder.get_outputs()[1:]]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.precision = precision
+
+        self.mean = np.asarray(self.meta["image_mean"], dtype=np.float32)
+        self.std = np.asarray(self.meta["image_std"], dtype=np.float32)
+
+    def preprocess(self, image):
+        """
+        Same as BlipImageProcessor: bicubic resize to image_size, scale to 0..1, normalize.
+        """
+        from PIL import Image
+        size = self.meta["image_size"]
+        pixels = np.asarray(image.convert("RGB").resize((size, size), Image.BICUBIC), dtype=np.float32) / 255.0
+        pixels = (pixels - self.mean) / self.std
+        return pixels.transpose(2, 0, 1)[None]
+
+    def caption(self, image, max_new_tokens=50):
+        image_embeds = self.encoder.run(None, {"pixel_values": self.preprocess(image)})[0]
+        empty = np.zeros((1, self.meta["heads"], 0, self.meta["head_dim"]), dtype=np.float32)
+        past = {name.replace("present", "past"): empty for name in self.present_names}
+
+        tokens = [self.meta["bos_token_id"]]
+        for _ in range(max_new_tokens):
+            outputs = self.decoder.run(None, {
+                "input_ids": np.array([[tokens[-1]]], dtype=np.int64),
+                "attention_mask": np.ones((1, len(tokens)), dtype=np.int64),
+                "image_embeds": image_embeds,
+                **past,
+            })
+            token = int(outputs[0][0].argmax())
+            if token == self.meta["eos_token_id"]:
+                break
+            tokens.append(token)
+            past = {name.replace("present", "past"): value for name, value in zip(self.present_names, outputs[1:])}
+        return self.tokenizer.decode(tokens, skip_special_tokens=True).strip()
+
+
+if __name__ == "__main__":
+    export_blip_onnx(sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "blip-onnx"))
@@ -0,0 +1,218 @@
+import os
+import time
+import threading
+import subprocess
+import configparser
+from collections import deque
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+config = configparser.ConfigParser()
+config.read(os.path.join(BASE_DIR, 'config.ini'))
+
+camera_source = config.get('VISION', 'camera_source', fallback='libcamera').strip() or 'libcamera'
+camera_width = config.getint('VISION', 'camera_width', fallback=640)
+camera_height = config.getint('VISION', 'camera_height', fallback=480)
+camera_fps = config.getfloat('VISION', 'camera_fps', fallback=5)
+camera_ring = config.getint('VISION', 'camera_ring', fallback=4)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+class FrameRing:
+    """
+    The last few encoded frames with their capture time. Writers append, readers
+    take the newest one without waiting unless no frame has arrived yet.
+    """
+
+    def __init__(self, capacity=camera_ring):
+        self.frames = deque(maxlen=capacity)
+        self.cond = threading.Condition()
+        self.count = 0
+
+    def push(self, frame):
+        with self.cond:
+            self.frames.append((time.monotonic(), frame))
+            self.count += 1
+            self.cond.notify_all()
+
+    def latest(self, timeout=None, max_age=None):
+        """
+        Return (timestamp, frame bytes) of the newest frame, waiting up to timeout for
+        one (younger than max_age seconds, if given). Returns None on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while True:
+                if self.frames:
+                    stamp, frame = self.frames[-1]
+                    if max_age is None or time.monotonic() - stamp <= max_age:
+                        return stamp, frame
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+
+
+class LibcameraSource:
+    """
+    Keeps libcamera-vid streaming MJPEG at low resolution and splits the stream
+    into JPEG frames, so sensor start-up and auto-exposure are paid once rather
+    than per picture. The process is restarted if it dies.
+    """
+
+    def __init__(self, ring, width=camera_width, height=camera_height, fps=camera_fps):
+        self.ring = ring
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.process = None
+        self.done = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="CameraCapture", daemon=True)
+        self.thread.start()
+        return f"libcamera-vid {self.width}x{self.height} @ {self.fps:g} fps"
+
+    def _run(self):
+        command = [
+            "libcamera-vid",
+            "--codec", "mjpeg",
+            "--timeout", "0",  # stream until stopped
+            "--nopreview",
+            "--width", str(self.width),
+            "--height", str(self.height),
+            "--framerate", str(self.fps),
+            "--output", "-",
+        ]
+        while not self.done.is_set():
+            try:
+                self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            except FileNotFoundError:
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ERROR: libcamera-vid not found, camera stream disabled")
+                return
+            self._read_frames(self.process.stdout)
+            self.process.wait()
+            if not self.done.is_set():
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ERROR: Camera stream exited ({self.process.returncode}), restarting")
+                self.done.wait(2)
+
+    def alive(self):
+        """
+        True while libcamera-vid is starting or running (False if it is missing,
+        has exited or is waiting to be restarted).
+        """
+        return (self.thread is not None and self.thread.is_alive()
+                and (self.process is None or self.process.poll() is None))
+
+    def _read_frames(self, stream):
+        buffer = b""
+        while not self.done.is_set():
+            chunk = stream.read1(65536) if hasattr(stream, "read1") else stream.read(65536)
+            if not chunk:
+                return
+            buffer += chunk
+            while True:
+                start = buffer.find(b"\xff\xd8")
+                if start < 0:
+                    buffer = b""
+                    break
+                end = buffer.find(b"\xff\xd9", start + 2)
+                if end < 0:
+                    buffer = buffer[start:]
+                    break
+                self.ring.push(buffer[start:end + 2])
+                buffer = buffer[end + 2:]
+
+    def stop(self):
+        self.done.set()
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+
+class DirectorySource:
+    """
+    Feeds image files (a single file or every image in a directory, in name order)
+    into the ring at fps, looping, for testing vision without a camera.
+    """
+
+    def __init__(self, ring, path, fps=camera_fps):
+        self.ring = ring
+        if os.path.isdir(path):
+            self.paths = sorted(os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            self.paths = [path]
+        if not self.paths:
+            raise ValueError(f"No images found in {path}")
+        self.fps = fps
+        self.done = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="CameraReplay", daemon=True)
+        self.thread.start()
+        return f"{len(self.paths)} image(s) from {os.path.dirname(self.paths[0]) or '.'} @ {self.fps:g} fps"
+
+    def _run(self):
+        index = 0
+        while not self.done.is_set():
+            with open(self.paths[index % len(self.paths)], "rb") as f:
+                self.ring.push(f.read())
+            index += 1
+            self.done.wait(1 / self.fps)
+
+    def alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def stop(self):
+        self.done.set()
+
+
+camera = None
+_camera_lock = threading.Lock()
+
+def start_camera():
+    """
+    Start the configured frame source ([VISION] camera_source: libcamera, or an
+    image file / directory) once and return its (ring, source).
+    """
+    global camera
+    with _camera_lock:
+        if camera is None:
+            ring = FrameRing()
+            if camera_source == "libcamera":
+                source = LibcameraSource(ring)
+            else:
+                source = DirectorySource(ring, os.path.join(BASE_DIR, camera_source))
+            description = source.start()
+            camera = (ring, source)
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LOAD: Camera started ({description}).")
+        return camera
+
+def latest_frame(timeout=3.0, max_age=None):
+    """
+    JPEG/PNG bytes of the newest frame no older than max_age seconds (default three
+    frame intervals), or None if the camera produced nothing in time. Returns None
+    at once if the frame source is not running, so callers can fall back to a still.
+    """
+    ring, source = start_camera()
+    if max_age is None:
+        max_age = 3 / source.fps
+    deadline = time.monotonic() + timeout
+    while source.alive():
+        remaining = deadline - time.monotonic()
+        frame = ring.latest(timeout=min(remaining, 0.1), max_age=max_age)
+        if frame is not None:
+            return frame[1]
+        if remaining <= 0.1:
+            return None
+    return None
+
+def stop_camera():
+    global camera
+    with _camera_lock:
+        if camera is not None:
+            camera[1].stop()
+            camera = None
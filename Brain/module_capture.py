@@ -0,0 +1,352 @@
+import os
+import sys
+import time
+import wave
+import threading
+import configparser
+import numpy as np
+from datetime import datetime
+from multiprocessing import shared_memory, resource_tracker
+
+from module_audiodsp import PolyphaseResampler, choose_device_samplerate
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+config = configparser.ConfigParser()
+config.read(os.path.join(BASE_DIR, 'config.ini'))
+
+input_source = config.get('STT', 'input_source', fallback='mic').strip() or 'mic'
+replay_speed = config.getfloat('STT', 'replay_speed', fallback=1.0)
+
+# Header layout of the shared ring: [write_pos (int64)] followed by int16 samples
+_HEADER_BYTES = 8
+
+
+class AudioRing:
+    """
+    Single-writer / multi-reader ring of int16 mono samples in shared memory.
+
+    The write position is an absolute sample counter stored in the shared header,
+    so readers in other processes only need the block name and capacity to attach.
+    """
+
+    def __init__(self, capacity, name=None):
+        self.capacity = int(capacity)
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=_HEADER_BYTES + self.capacity * 2)
+        elif sys.version_info >= (3, 13):
+            self.shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            # Attaching registers the block with this process's resource tracker, which
+            # would unlink it when a separately started reader process exits
+            self.shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.name = self.shm.name
+        self._pos = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf[:_HEADER_BYTES])
+        self._data = np.ndarray((self.capacity,), dtype=np.int16, buffer=self.shm.buf[_HEADER_BYTES:])
+        if self.owner:
+            self._pos[0] = 0
+            self._data[:] = 0
+
+    @property
+    def write_pos(self):
+        return int(self._pos[0])
+
+    def write(self, samples):
+        """
+        Append samples to the ring. Only the capture thread may call this.
+        """
+        samples = np.asarray(samples, dtype=np.int16).reshape(-1)
+        n = samples.size
+        if n == 0:
+            return
+        if n > self.capacity:
+            samples = samples[-self.capacity:]
+            self._pos[0] += n - self.capacity
+            n = self.capacity
+
+        pos = int(self._pos[0])
+        start = pos % self.capacity
+        first = min(n, self.capacity - start)
+        self._data[start:start + first] = samples[:first]
+        if first < n:
+            self._data[:n - first] = samples[first:]
+        # Publish the new position only after the samples are in place
+        self._pos[0] = pos + n
+
+    def read(self, pos, n):
+        """
+        Copy n samples starting at absolute position pos. Returns (samples, pos) where
+        pos may have been moved forward if the requested data was already overwritten.
+        """
+        oldest = self.write_pos - self.capacity
+        if pos < oldest:
+            pos = oldest
+        n = max(0, min(n, self.write_pos - pos))
+        out = np.empty(n, dtype=np.int16)
+        start = pos % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self._data[start:start + first]
+        if first < n:
+            out[first:] = self._data[:n - first]
+        return out, pos
+
+    def close(self):
+        # Drop the numpy views before releasing the mapping
+        self._pos = None
+        self._data = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingReader:
+    """
+    Independent read cursor over an AudioRing.
+    """
+
+    def __init__(self, ring, pos=None):
+        self.ring = ring
+        self.pos = ring.write_pos if pos is None else pos
+
+    def available(self):
+        return self.ring.write_pos - self.pos
+
+    def seek_to_now(self):
+        self.pos = self.ring.write_pos
+
+    def read(self, n, timeout=None, stop_event=None):
+        """
+        Block until n samples are available (or timeout / stop_event) and return them.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.available() < n:
+            if stop_event is not None and stop_event.is_set():
+                return None
+            if deadline is not None and time.monotonic() > deadline:
+                return None
+            time.sleep(0.01)
+        data, self.pos = self.ring.read(self.pos, n)
+        self.pos += data.size
+        return data
+
+
+# Shared capture stream
+SAMPLE_RATE = 16000
+RING_SECONDS = 30
+FRAME_MS = 20
+
+capture_ring = None
+capture_source = None
+capture_filter = None
+_capture_lock = threading.Lock()
+
+
+def _deliver(samples):
+    # Common tail of every capture source: optional filter, then the ring
+    if capture_filter is not None:
+        samples = capture_filter(samples)
+    capture_ring.write(samples)
+
+
+def set_capture_filter(filter_function):
+    """
+    Install a function applied to every captured block before it reaches the ring
+    (e.g. the echo gate). It runs in the audio callback, so it must be quick.
+    """
+    global capture_filter
+    capture_filter = filter_function
+
+
+class MicrophoneSource:
+    """
+    Live microphone input. If the device runs at a different native rate, it is
+    opened at that rate and converted to the ring rate in the callback.
+    """
+
+    def __init__(self, samplerate=SAMPLE_RATE):
+        self.samplerate = samplerate
+        self.stream = None
+        self.resampler = None
+
+    def _callback(self, indata, frames, time_info, status):
+        samples = indata[:, 0]
+        if self.resampler is not None:
+            samples = self.resampler.process(samples)
+        _deliver(samples)
+
+    def start(self):
+        import sounddevice as sd
+
+        def is_supported(rate):
+            try:
+                sd.check_input_settings(samplerate=rate, channels=1, dtype="int16")
+                return True
+            except Exception:
+                return False
+        try:
+            native = sd.query_devices(kind="input")["default_samplerate"]
+        except Exception:
+            native = None
+        device_rate = choose_device_samplerate(self.samplerate, native, is_supported)
+        self.resampler = PolyphaseResampler(device_rate, self.samplerate) if device_rate != self.samplerate else None
+
+        self.stream = sd.InputStream(
+            samplerate=device_rate,
+            channels=1,
+            dtype="int16",
+            blocksize=device_rate * FRAME_MS // 1000,
+            callback=self._callback,
+        )
+        self.stream.start()
+        resampling = f", resampling from {device_rate} Hz" if self.resampler is not None else ""
+        return f"microphone, {self.samplerate} Hz{resampling}"
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+
+def list_wav_files(path):
+    """
+    Return [path] for a file, or the sorted .wav files of a directory.
+    """
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(".wav"))
+    return [path]
+
+
+def load_wav(path, samplerate=SAMPLE_RATE):
+    """
+    Read a 16-bit WAV file as mono int16 at samplerate.
+    """
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit WAV files are supported")
+        channels = wav.getnchannels()
+        rate = wav.getframerate()
+        audio = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    if rate != samplerate:
+        resampler = PolyphaseResampler(rate, samplerate)
+        audio = np.concatenate((resampler.process(audio), resampler.flush()))
+    return audio
+
+
+class ReplaySource:
+    """
+    Replays WAV files through the capture path as if they were spoken into the mic,
+    at speed x real time, with gap_seconds of silence after each file. Once all
+    files are played it keeps delivering silence, like an idle microphone.
+
+    marks records the ring span of every file and time_of() maps a ring position
+    to the moment it was delivered, so benchmarks can time the recognizers.
+    """
+
+    def __init__(self, paths, samplerate=SAMPLE_RATE, speed=1.0, gap_seconds=1.0):
+        if speed <= 0:
+            raise ValueError("Replay speed must be positive")
+        self.paths = list(paths)
+        self.samplerate = samplerate
+        self.speed = speed
+        self.gap_seconds = gap_seconds
+        self.marks = []
+        self.finished = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.first_pos = 0
+        self.started_at = None
+
+    def start(self):
+        self.first_pos = capture_ring.write_pos
+        self.started_at = time.monotonic()
+        self.thread = threading.Thread(target=self._run, name="CaptureReplay", daemon=True)
+        self.thread.start()
+        return f"replay of {len(self.paths)} file(s) at {self.speed:g}x, {self.samplerate} Hz"
+
+    def time_of(self, pos):
+        return self.started_at + (pos - self.first_pos) / (self.samplerate * self.speed)
+
+    def _push(self, block):
+        delay = self.time_of(capture_ring.write_pos) - time.monotonic()
+        if delay > 0:
+            self.stopped.wait(delay)
+        _deliver(block)
+
+    def _run(self):
+        frame = self.samplerate * FRAME_MS // 1000
+        silence = np.zeros(frame, dtype=np.int16)
+        gap_frames = int(self.gap_seconds * 1000 / FRAME_MS)
+        for path in self.paths:
+            audio = load_wav(path, self.samplerate)
+            mark = {"path": path, "start": capture_ring.write_pos, "end": None}
+            self.marks.append(mark)
+            for i in range(0, audio.size, frame):
+                if self.stopped.is_set():
+                    return
+                self._push(audio[i:i + frame])
+            mark["end"] = capture_ring.write_pos
+            for _ in range(gap_frames):
+                if self.stopped.is_set():
+                    return
+                self._push(silence)
+        self.finished.set()
+        while not self.stopped.is_set():
+            self._push(silence)
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+
+
+def start_capture(samplerate=SAMPLE_RATE, source=None):
+    """
+    Start the capture source once and keep it streaming into the shared capture ring.
+    Safe to call repeatedly; only the first call opens the source.
+
+    source is a MicrophoneSource/ReplaySource, or None for [STT] input_source:
+    "mic", or a WAV file / directory to replay at [STT] replay_speed.
+    """
+    global capture_ring, capture_source
+
+    with _capture_lock:
+        if capture_source is not None:
+            return capture_ring
+
+        if source is None:
+            if input_source == "mic":
+                source = MicrophoneSource(samplerate)
+            else:
+                source = ReplaySource(list_wav_files(os.path.join(BASE_DIR, input_source)), samplerate, replay_speed)
+        capture_ring = AudioRing(samplerate * RING_SECONDS)
+        description = source.start()
+        capture_source = source
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LOAD: Capture started ({description}, ring {RING_SECONDS}s).")
+        return capture_ring
+
+
+def stop_capture():
+    """
+    Stop the capture source and release the shared ring.
+    """
+    global capture_ring, capture_source
+    with _capture_lock:
+        if capture_source is not None:
+            capture_source.stop()
+            capture_source = None
+        if capture_ring is not None:
+            capture_ring.close()
+            capture_ring = None
+
+
+def open_reader(pos=None):
+    """
+    Return a new reader on the shared capture ring, starting at pos (default: now).
+    """
+    ring = start_capture()
+    return RingReader(ring, pos)
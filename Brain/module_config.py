@@ -29,6 +29,8 @@ def load_config():
         "voiceonly": config.getboolean('TTS', 'voiceonly'),
         "emotions": config.getboolean('EMOTION', 'enabled'),
         "emotion_model": config['EMOTION']['emotion_model'],
+        "emotion_backend": config.get('EMOTION', 'backend', fallback='local').strip().lower(),
+        "emotion_server_url": config.get('EMOTION', 'server_url', fallback=''),
         "storepath": os.path.join(os.getcwd(), config['EMOTION']['storepath']),
         "llm_backend": config['LLM']['backend'],
         "base_url": config['LLM']['base_url'],
@@ -47,6 +49,9 @@ def load_config():
         "TOKEN": config['DISCORD']['TOKEN'],
         "channel_id": config['DISCORD']['channel_id'],
         "discordenabled": config['DISCORD']['enabled'],
+        "barge_in": config.getboolean('STT', 'barge_in', fallback=True),
+        "barge_in_margin": config.getfloat('STT', 'barge_in_margin', fallback=3.0),
+        "barge_in_ms": config.getint('STT', 'barge_in_ms', fallback=200),
     }
 
 def get_api_key(llm_backend):
@@ -2,6 +2,7 @@ import requests
 import joblib 
 from module_websearch import *
 from module_vision import *
+from module_toolcache import cached_tool
 from datetime import datetime
 
 #module_engine
@@ -60,12 +61,12 @@ def check_for_module(user_input):
 
         if predicted_class == "Weather":
             print(f"Weather MODULE")
-            weather_info = search_google(user_input)
+            weather_info = cached_tool("weather", user_input, search_weather)
             module_engine = f"*Using tool Web Search* use the following results from a realtime websearch for your response: {weather_info}"
 
         if predicted_class == "News":
             print(f"News MODULE")
-            result = get_google_news(user_input)
+            result = cached_tool("news", user_input, get_google_news)
             module_engine = f"*Using tool Web Search* Summarize the news from the following websearch results: {result}"
 
         if predicted_class == "Vision":
@@ -76,7 +77,7 @@ def check_for_module(user_input):
 
         if predicted_class == "Search":
             print(f"Search MODULE")
-            result = search_google(user_input)
+            result = cached_tool("search", user_input, search_any)
             module_engine = f"*Using tool Web Search* Use this answer from google to respond to the user: {result}"
             print(module_engine)
             
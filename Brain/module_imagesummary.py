@@ -1,11 +1,9 @@
 from PIL import Image
-from transformers import BlipProcessor, BlipForConditionalGeneration
 import base64
 from io import BytesIO
 
-# Initialize BLIP model and processor
-processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
+# BLIP is loaded on first use and shared with module_vision
+from module_models import blip_caption
 
 def filecaption(file):
     with open(file, "rb") as image_file:
@@ -17,9 +15,7 @@ def get_image_caption_from_base64(base64_str):
     img_bytes = base64.b64decode(base64_str)
     raw_image = Image.open(BytesIO(img_bytes)).convert('RGB')
 
-    inputs = processor(raw_image, return_tensors="pt")
-    outputs = model.generate(**inputs, max_new_tokens=100)
-    caption = processor.decode(outputs[0], skip_special_tokens=True)
+    caption = blip_caption(raw_image, max_new_tokens=100)
 
     return caption
 
@@ -0,0 +1,217 @@
+import queue
+import ctypes
+import ctypes.util
+import threading
+import subprocess
+import numpy as np
+
+# libespeak-ng constants (speak_lib.h)
+AUDIO_OUTPUT_SYNCHRONOUS = 2
+POS_CHARACTER = 1
+espeakCHARS_UTF8 = 1
+espeakRATE = 1
+espeakPITCH = 3
+
+_SYNTH_CALLBACK = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(ctypes.c_short), ctypes.c_int, ctypes.c_void_p)
+
+
+class Espeak:
+    """
+    In-process binding to libespeak-ng. Synthesis runs in synchronous mode and hands
+    PCM back through a callback in ~50 ms pieces, so audio is available long before
+    the whole utterance has been rendered.
+    """
+
+    def __init__(self, lib_path, voice, speed, pitch):
+        self.lib = ctypes.CDLL(lib_path)
+        self.lib.espeak_Initialize.restype = ctypes.c_int
+        self.lib.espeak_Synth.argtypes = [
+            ctypes.c_void_p, ctypes.c_size_t, ctypes.c_uint, ctypes.c_int, ctypes.c_uint,
+            ctypes.c_uint, ctypes.c_void_p, ctypes.c_void_p
+        ]
+        self.samplerate = self.lib.espeak_Initialize(AUDIO_OUTPUT_SYNCHRONOUS, 50, None, 0)
+        if self.samplerate <= 0:
+            raise RuntimeError("espeak_Initialize failed")
+        self.lib.espeak_SetVoiceByName(voice.encode("utf-8"))
+        self.lib.espeak_SetParameter(espeakRATE, speed, 0)
+        self.lib.espeak_SetParameter(espeakPITCH, pitch, 0)
+
+        # espeak-ng has a single global synthesizer
+        self.lock = threading.Lock()
+        self._sink = None
+        self._abort_event = None
+        self._callback = _SYNTH_CALLBACK(self._on_audio)  # keep a reference for the C side
+        self.lib.espeak_SetSynthCallback(self._callback)
+
+    def _on_audio(self, wav, numsamples, events):
+        if numsamples > 0 and self._sink is not None:
+            self._sink(np.ctypeslib.as_array(wav, shape=(numsamples,)).copy())
+        # Returning 1 tells espeak to stop synthesizing
+        return 1 if self._abort_event is not None and self._abort_event.is_set() else 0
+
+    def synth(self, text, sink, abort_event):
+        """
+        Synthesize text, calling sink(samples) for each block. Blocks until done or aborted.
+        """
+        data = text.encode("utf-8") + b"\0"
+        with self.lock:
+            self._sink = sink
+            self._abort_event = abort_event
+            try:
+                self.lib.espeak_Synth(data, len(data), 0, POS_CHARACTER, 0, espeakCHARS_UTF8, None, None)
+            finally:
+                self._sink = None
+                self._abort_event = None
+
+
+class VoiceEffects:
+    """
+    Streaming NumPy version of the sox chain `reverb N highpass LO lowpass HI`.
+
+    Reverb is a sparse multi-tap echo and the band-pass is a windowed-sinc FIR;
+    both keep their history between blocks so chunks join up seamlessly.
+    """
+
+    # Echo delays (ms) of the reverb taps, roughly mutually prime to avoid flutter
+    REVERB_DELAYS_MS = (29, 37, 43, 53, 67, 79, 97, 113)
+
+    def __init__(self, samplerate, reverb=30, highpass=500, lowpass=3000, gain_db=0.0, numtaps=101):
+        self.gain = np.float32(10 ** (gain_db / 20))
+
+        amount = reverb / 100.0
+        self.delays = [int(samplerate * ms / 1000) for ms in self.REVERB_DELAYS_MS]
+        self.tap_gains = [np.float32(0.6 * amount * 0.85 ** i) for i in range(len(self.delays))]
+        self.max_delay = max(self.delays)
+        self.reverb_history = np.zeros(self.max_delay, dtype=np.float32)
+
+        n = np.arange(numtaps) - (numtaps - 1) / 2
+        lp = lambda fc: 2 * fc / samplerate * np.sinc(2 * fc / samplerate * n)
+        taps = (lp(lowpass) - lp(highpass)) * np.hamming(numtaps)
+        # Unity gain in the middle of the pass band
+        center = np.sqrt(highpass * lowpass)
+        response = np.abs(np.sum(taps * np.exp(-2j * np.pi * center / samplerate * np.arange(numtaps))))
+        self.taps = (taps / response).astype(np.float32)
+        self.fir_history = np.zeros(numtaps - 1, dtype=np.float32)
+
+    def process(self, samples):
+        x = samples.astype(np.float32) * self.gain
+
+        buf = np.concatenate((self.reverb_history, x))
+        y = x.copy()
+        for delay, tap_gain in zip(self.delays, self.tap_gains):
+            start = self.max_delay - delay
+            y += tap_gain * buf[start:start + x.size]
+        self.reverb_history = buf[-self.max_delay:]
+
+        buf = np.concatenate((self.fir_history, y))
+        y = np.convolve(buf, self.taps, mode="valid")
+        self.fir_history = buf[-self.fir_history.size:]
+
+        return np.clip(y, -32768, 32767).astype(np.int16)
+
+    def flush(self):
+        """
+        Return the reverb/filter tail left after the last block.
+        """
+        return self.process(np.zeros(self.max_delay, dtype=np.int16))
+
+
+_espeak = None
+_espeak_lock = threading.Lock()
+
+def get_espeak(voice):
+    """
+    Load libespeak-ng once. Returns None if the library is not installed.
+    """
+    global _espeak
+    with _espeak_lock:
+        if _espeak is None:
+            lib_path = ctypes.util.find_library("espeak-ng")
+            if lib_path is None:
+                return None
+            _espeak = Espeak(lib_path, voice["voice"], voice["speed"], voice["pitch"])
+        return _espeak
+
+
+def _espeak_process_stream(text, voice):
+    """
+    Fallback when libespeak-ng cannot be loaded: stream espeak-ng's stdout. Arguments are
+    passed as a list, so the text never goes through a shell.
+    """
+    from module_tts import parse_wav_header
+
+    process = subprocess.Popen(
+        ["espeak-ng", "-s", str(voice["speed"]), "-p", str(voice["pitch"]), "-v", voice["voice"], "--stdout", text],
+        stdout=subprocess.PIPE
+    )
+    try:
+        head = b""
+        header = None
+        while header is None:
+            data = process.stdout.read(256)
+            if not data:
+                return
+            head += data
+            header = parse_wav_header(head)
+        yield header["samplerate"]
+        pending = head[header["data_offset"]:]
+        while True:
+            data = process.stdout.read(2048)
+            if not data:
+                break
+            pending += data
+            usable = len(pending) - len(pending) % 2
+            if usable:
+                yield np.frombuffer(pending[:usable], dtype=np.int16)
+                pending = pending[usable:]
+    finally:
+        process.kill()
+        process.wait()
+
+
+def local_tts_stream(text, voice, effects):
+    """
+    Yield a WAV header followed by effect-processed PCM chunks for text, as the xtts
+    stream does. Closing the generator aborts synthesis.
+    """
+    from module_tts import make_wav_header
+
+    espeak = get_espeak(voice)
+    if espeak is None:
+        source = _espeak_process_stream(text, voice)
+        samplerate = next(source, None)
+        if samplerate is None:
+            return
+        fx = VoiceEffects(samplerate, **effects)
+        yield make_wav_header(samplerate)
+        try:
+            for samples in source:
+                yield fx.process(samples).tobytes()
+            yield fx.flush().tobytes()
+        finally:
+            source.close()
+        return
+
+    blocks = queue.Queue()
+    abort = threading.Event()
+    done = object()
+
+    def run():
+        try:
+            espeak.synth(text, blocks.put, abort)
+        finally:
+            blocks.put(done)
+
+    fx = VoiceEffects(espeak.samplerate, **effects)
+    thread = threading.Thread(target=run, name="LocalTTS", daemon=True)
+    thread.start()
+    yield make_wav_header(espeak.samplerate)
+    try:
+        while True:
+            samples = blocks.get()
+            if samples is done:
+                break
+            yield fx.process(samples).tobytes()
+        yield fx.flush().tobytes()
+    finally:
+        abort.set()
@@ -24,6 +24,13 @@ from module_memory import *
 from module_engine import *
 from module_tts import *
 from module_imagesummary import *
+from module_ttscache import get_prerendered, cached_tts_stream
+from module_audioout import get_player
+from module_audiodsp import get_loudness_stage, EchoGate, echo_gate_enabled
+from module_capture import set_capture_filter
+from module_bargein import BargeInMonitor
+from module_modelclient import classify_emotion_remote
+import module_stt
 from module_config import *
 
 config = load_config()
@@ -45,6 +52,8 @@ voiceonly = config['voiceonly']
 # EMOTION Section
 emotions = config['emotions']
 emotion_model = config['emotion_model']
+emotion_backend = config['emotion_backend']
+emotion_server_url = config['emotion_server_url']
 storepath = os.path.join(BASE_DIR, config['storepath'])
 
 # LLM Section
@@ -69,6 +78,11 @@ TOKEN = config['TOKEN']
 channel_id = config['channel_id']
 discordenabled = config['discordenabled']
 
+# Barge-in Section
+barge_in = config['barge_in']
+barge_in_margin = config['barge_in_margin']
+barge_in_ms = config['barge_in_ms']
+
 # Global Variables (if needed)
 global_source_image = None
 global_result_image = None
@@ -80,47 +94,52 @@ module_engine = None
 start_time = time.time() #calc time
 stop_event = threading.Event()
 executor = concurrent.futures.ProcessPoolExecutor(max_workers=4)
-
-import numpy as np
-import sounddevice as sd
-
-import numpy as np
-import sounddevice as sd
-
-def play_audio_stream(tts_stream, samplerate=22050, channels=1, gain=1.0, normalize=False):
+turn_cancelled = threading.Event() # set when the user talks over TARS
+barge_in_pos = None # capture position where the interrupting speech started
+generating = False
+emotion_classifier = None # local emotion pipeline, loaded on first use
+
+# Mute the mic while it only hears TARS's own voice (the wake acknowledgement
+# overlaps command capture, and replies overlap barge-in detection)
+echo_gate = None
+if echo_gate_enabled:
+    echo_gate = EchoGate()
+    get_player().reference_listener = echo_gate.push_reference
+    set_capture_filter(echo_gate.process)
+
+# Without the echo gate TARS hears itself as speech and would interrupt itself
+if barge_in and echo_gate is None:
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: Barge-in disabled (needs [AUDIO] echo_gate = True)")
+    barge_in = False
+
+# ...and would transcribe its own wake acknowledgement as the command
+if module_stt.overlap_ack and echo_gate is None:
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: Overlapped wake acknowledgement disabled (needs [AUDIO] echo_gate = True)")
+    module_stt.overlap_ack = False
+
+def play_audio_stream(tts_stream, samplerate=22050, channels=1, gain=None, normalize=None):
     """
     Play the audio stream through speakers using SoundDevice with volume/gain adjustment.
     
     Parameters:
-    - tts_stream: Stream of audio data in chunks.
-    - samplerate: The sample rate of the audio data.
-    - channels: The number of audio channels (e.g., 1 for mono, 2 for stereo).
-    - gain: A multiplier for adjusting the volume. Default is 1.0 (no change).
-    - normalize: Whether to normalize the audio to use the full dynamic range.
+    - tts_stream: Stream of audio data in chunks (WAV, or raw int16 PCM).
+    - samplerate: The sample rate to assume if the stream has no WAV header.
+    - channels: The number of channels to assume if the stream has no WAV header.
+    - gain: A multiplier for adjusting the volume. Default (None) uses [AUDIO] gain.
+    - normalize: Whether to run the AGC/limiter stage. Default (None) uses [AUDIO] normalize.
     """
     try:
-        with sd.OutputStream(samplerate=samplerate, channels=channels, dtype='int16') as stream:
-            for chunk in tts_stream:
-                if chunk:
-                    # Convert bytes to int16 using numpy
-                    audio_data = np.frombuffer(chunk, dtype='int16')
-                    
-                    # Normalize the audio (if enabled)
-                    if normalize:
-                        max_value = np.max(np.abs(audio_data))
-                        if max_value > 0:
-                            audio_data = audio_data / max_value * 32767
-                    
-                    # Apply gain adjustment
-                    audio_data = np.clip(audio_data * gain, -32768, 32767).astype('int16')
-
-                    # Write the adjusted audio data to the stream
-                    stream.write(audio_data)
-                else:
-                    print("Received empty chunk.")
-            
-            # Trigger the transcription process after playback
-            transcribe_command()  # go back to listening for voice (non wake word)
+        get_player().play_stream(tts_stream, samplerate, channels, dsp=get_loudness_stage(gain, normalize))
+    except Exception as e:
+        print(f"Error during audio playback: {e}")
+
+
+def play_pcm(audio_data, samplerate):
+    """
+    Play an in-memory int16 buffer (e.g. a pre-rendered phrase) and wait for it to finish.
+    """
+    try:
+        get_player().play_pcm(audio_data, samplerate, dsp=get_loudness_stage())
     except Exception as e:
         print(f"Error during audio playback: {e}")
 
@@ -394,10 +413,21 @@ def chat_completions_with_character(messages, mode, character):
     response = requests.post(url, headers=headers, data=json.dumps(data))
     return response.json()
 
-def process_completion(text):
+def process_completion(text, cancel_event=None):
+    '''
+    Run the completion in the executor. Returns None if cancel_event is set first.
+    '''
+    global generating
     # Use the executor directly without 'with' statement
     future = executor.submit(get_completion, text, "True")
-    botres = future.result()
+    generating = True
+    try:
+        while cancel_event is not None and not future.done():
+            if cancel_event.wait(0.05):
+                return None
+        botres = future.result()
+    finally:
+        generating = False
     reply = llm_process(text, botres)
     return reply
 
@@ -440,25 +470,67 @@ def handle_stt_message(message):
             os.system('shutdown /s /t 0')
             return  # Exit function after issuing shutdown command
         # Process the message using process_completion
-        global start_time, latest_text_to_read
+        global start_time, latest_text_to_read, barge_in_pos
         start_time = time.time()  # Record the start time for tracking
-        reply = process_completion(message_dict['text'])  # Process the message
-        latest_text_to_read = reply  # Store the reply for later use
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] TARS: {reply}")
-        # Stream TTS audio to speakers
-        #print("Fetching TTS audio...")
-        tts_stream = get_tts_stream(reply, ttsurl, ttsclone)  # Send reply text to TTS
-        # Play the audio stream
-        #print("Playing TTS audio...")
-        play_audio_stream(tts_stream)
+        turn_cancelled.clear()
+        barge_in_pos = None
+        monitor = None
+        if barge_in:
+            monitor = BargeInMonitor(on_barge_in, lambda: module_stt.silence_threshold * barge_in_margin, barge_in_ms).start()
+        try:
+            reply = process_completion(message_dict['text'], turn_cancelled)  # Process the message
+            if not turn_cancelled.is_set():
+                latest_text_to_read = reply  # Store the reply for later use
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] TARS: {reply}")
+                # Stream TTS audio to speakers
+                #print("Fetching TTS audio...")
+                tts_stream = cached_tts_stream(reply)  # Send reply text to TTS (or replay it from the cache)
+                # Play the audio stream
+                #print("Playing TTS audio...")
+                play_audio_stream(tts_stream)
+        finally:
+            if monitor is not None:
+                monitor.stop()
+
+        # Go back to listening for voice (non wake word), starting from the user's
+        # first word if they interrupted
+        transcribe_command(barge_in_pos if turn_cancelled.is_set() else None)
 
     except json.JSONDecodeError:
         print("Invalid JSON format. Could not process user message.")
     except Exception as e:
         print(f"Error processing message: {e}")
 
+def on_barge_in(speech_pos, t_detect):
+    """
+    Called by the barge-in monitor when the user talks over TARS: silence playback,
+    abort the TTS request and the LLM generation, and hand the turn back to the user.
+    """
+    global barge_in_pos
+    barge_in_pos = speech_pos
+    turn_cancelled.set()
+
+    player = get_player()
+    player.stop()
+    cancel_tts()
+    latency = time.monotonic() - t_detect
+    if player.stream is not None:
+        latency += player.stream.latency  # audio already handed to the device
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: Barge-in: interrupt-to-silence {latency * 1000:.0f} ms")
+
+    # Only ooba exposes a stop endpoint; other backends finish in the background
+    if generating and llm_backend == "ooba":
+        try:
+            stop_generation()
+        except Exception as e:
+            print(f"Error stopping generation: {e}")
+
 def wake_word_tts(data):
-    tts_stream = get_tts_stream(data, ttsurl, ttsclone)
+    prerendered = get_prerendered(data)
+    if prerendered is not None:
+        play_pcm(*prerendered)
+        return
+    tts_stream = cached_tts_stream(data)
     play_audio_stream(tts_stream)
 
 #THREADS
@@ -493,17 +565,27 @@ def llm_process(userinput, botresponse):
     return botresponse
 
 #MISC
+def get_emotion_classifier():
+    """
+    Load the local emotion pipeline once and reuse it for every response.
+    """
+    global emotion_classifier
+    if emotion_classifier is None:
+        from transformers import pipeline
+        emotion_classifier = pipeline(task="text-classification", model=emotion_model, top_k=None)
+    return emotion_classifier
+
 def set_emotion(text_to_read):
-    from transformers import pipeline
-    
     sizecheck = token_count(text_to_read)
     if 'length' in sizecheck:
         value_to_convert = sizecheck['length']
     
     if isinstance(value_to_convert, (int, float)):
         if value_to_convert <= 511:
-            classifier = pipeline(task="text-classification", model="SamLowe/roberta-base-go_emotions", top_k=None)
-            model_outputs = classifier(text_to_read)
+            if emotion_backend == 'server':
+                model_outputs = classify_emotion_remote([text_to_read], emotion_server_url)
+            else:
+                model_outputs = get_emotion_classifier()(text_to_read)
             emotion = max(model_outputs[0], key=lambda x: x['score'])['label']
             
             print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Emotion {emotion}")
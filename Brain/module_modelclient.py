@@ -0,0 +1,33 @@
+import requests
+import numpy as np
+
+# One pooled session for all calls to app-server.py
+session = requests.Session()
+
+
+def _post(server_url, route, payload, timeout):
+    response = session.post(f"{server_url.rstrip('/')}/{route}", json=payload, timeout=timeout)
+    if response.status_code != 200:
+        raise RuntimeError(f"{route} failed ({response.status_code}): {response.text[:200]}")
+    return response.json()
+
+
+def embed_remote(texts, server_url, timeout=10):
+    """
+    Sentence embeddings from the server's /embed endpoint, as a float32 array shaped
+    like SentenceTransformer.encode output.
+    """
+    single = isinstance(texts, str)
+    data = _post(server_url, "embed", {"texts": [texts] if single else list(texts)}, timeout)
+    embeddings = np.asarray(data["embeddings"], dtype=np.float32)
+    return embeddings[0] if single else embeddings
+
+
+def classify_emotion_remote(texts, server_url, timeout=10):
+    """
+    Emotion scores from the server's /emotion endpoint: one list of
+    {"label", "score"} dicts per text, like a top_k=None text-classification pipeline.
+    """
+    single = isinstance(texts, str)
+    data = _post(server_url, "emotion", {"texts": [texts] if single else list(texts)}, timeout)
+    return data["emotions"]
@@ -0,0 +1,178 @@
+import os
+import gc
+import time
+import threading
+import configparser
+from contextlib import contextmanager
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+config = configparser.ConfigParser()
+config.read(os.path.join(BASE_DIR, 'config.ini'))
+
+BLIP_MODEL = "Salesforce/blip-image-captioning-base"
+blip_precision = config.get('VISION', 'blip_precision', fallback='auto').strip().lower()
+blip_idle_unload = config.getfloat('VISION', 'blip_idle_unload', fallback=600)
+blip_backend = config.get('VISION', 'blip_backend', fallback='torch').strip().lower()
+blip_onnx_dir = os.path.join(BASE_DIR, config.get('VISION', 'blip_onnx_dir', fallback='blip-onnx'))
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of heavy models.
+
+    Each model is registered with a loader(precision) and loaded on first use, once,
+    no matter how many modules ask for it. Models not used for their idle_unload
+    seconds (0 = never) are dropped by a background thread to give the RAM back;
+    the next use loads them again. Use the use() context manager around inference
+    so a model is never unloaded while it is running.
+    """
+
+    def __init__(self, check_seconds=30):
+        self.specs = {}
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.check_seconds = check_seconds
+        self.janitor = None
+
+    def register(self, name, loader, precision="auto", idle_unload=0):
+        self.specs[name] = {"loader": loader, "precision": precision, "idle_unload": idle_unload,
+                            "lock": threading.Lock()}
+
+    def _load(self, name):
+        spec = self.specs[name]
+        with spec["lock"]:
+            entry = self.entries.get(name)
+            if entry is not None:
+                return entry
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LOAD: Loading {name} ({spec['precision']})...")
+            t0 = time.monotonic()
+            model = spec["loader"](spec["precision"])
+            entry = {"model": model, "last_used": time.monotonic(), "in_use": 0, "load_seconds": time.monotonic() - t0}
+            with self.lock:
+                self.entries[name] = entry
+                if spec["idle_unload"] > 0 and self.janitor is None:
+                    self.janitor = threading.Thread(target=self._unload_idle, name="ModelJanitor", daemon=True)
+                    self.janitor.start()
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LOAD: {name} loaded in {entry['load_seconds']:.1f}s")
+            return entry
+
+    def get(self, name):
+        """
+        Return the loaded model object, loading it if needed.
+        """
+        entry = self._load(name)
+        entry["last_used"] = time.monotonic()
+        return entry["model"]
+
+    @contextmanager
+    def use(self, name):
+        entry = self._load(name)
+        with self.lock:
+            entry["in_use"] += 1
+        try:
+            yield entry["model"]
+        finally:
+            with self.lock:
+                entry["in_use"] -= 1
+                entry["last_used"] = time.monotonic()
+
+    def unload(self, name):
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None or entry["in_use"]:
+                return False
+            del self.entries[name]
+        del entry
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: Unloaded idle model {name}")
+        return True
+
+    def _unload_idle(self):
+        while True:
+            time.sleep(self.check_seconds)
+            now = time.monotonic()
+            with self.lock:
+                idle = [name for name, entry in self.entries.items()
+                        if self.specs[name]["idle_unload"] > 0 and not entry["in_use"]
+                        and now - entry["last_used"] > self.specs[name]["idle_unload"]]
+            for name in idle:
+                self.unload(name)
+
+    def loaded(self):
+        with self.lock:
+            return sorted(self.entries)
+
+
+models = ModelRegistry()
+
+
+#BLIP
+def load_blip(precision):
+    """
+    Load the BLIP captioning model. precision: auto (int8 on CPU, fp16 on CUDA),
+    int8 (dynamic quantization, CPU only), fp16, bf16 or fp32.
+    """
+    import torch
+    from transformers import BlipProcessor, BlipForConditionalGeneration
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    if precision == "auto":
+        precision = "fp16" if device.type == "cuda" else "int8"
+    dtypes = {"fp16": torch.float16, "bf16": torch.bfloat16}
+
+    processor = BlipProcessor.from_pretrained(BLIP_MODEL)
+    model = BlipForConditionalGeneration.from_pretrained(BLIP_MODEL, torch_dtype=dtypes.get(precision, torch.float32))
+    model.to(device)
+    model.eval()
+    if precision == "int8" and device.type == "cpu":
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return processor, model, device
+
+
+def load_blip_onnx(precision):
+    """
+    Load the ONNX Runtime BLIP captioner (exported on first use). precision: auto or
+    int8 (int8-quantized weights) or fp32.
+    """
+    from module_bliponnx import BlipOnnxCaptioner, export_blip_onnx, is_exported
+
+    precision = "fp32" if precision == "fp32" else "int8"
+    if not is_exported(blip_onnx_dir, precision):
+        export_blip_onnx(blip_onnx_dir, quantize=precision == "int8")
+    return BlipOnnxCaptioner(blip_onnx_dir, precision)
+
+
+models.register("blip", load_blip_onnx if blip_backend == "onnx" else load_blip, blip_precision, blip_idle_unload)
+
+
+def caption_with(loaded, image, max_new_tokens=50, num_beams=1):
+    """
+    Caption a PIL image with a model returned by load_blip or load_blip_onnx.
+    The ONNX captioner decodes greedily, so num_beams only applies to PyTorch.
+    """
+    if not isinstance(loaded, tuple):
+        return loaded.caption(image, max_new_tokens=max_new_tokens)
+
+    import torch
+    processor, model, device = loaded
+    inputs = processor(image.convert("RGB"), return_tensors="pt").to(device)
+    inputs["pixel_values"] = inputs["pixel_values"].to(model.dtype)
+    with torch.inference_mode():
+        outputs = model.generate(**inputs, max_new_tokens=max_new_tokens, num_beams=num_beams)
+    return processor.decode(outputs[0], skip_special_tokens=True)
+
+
+def blip_caption(image, max_new_tokens=50, num_beams=1):
+    """
+    Caption a PIL image with the shared on-device BLIP model.
+    """
+    with models.use("blip") as loaded:
+        return caption_with(loaded, image, max_new_tokens, num_beams)
@@ -0,0 +1,92 @@
+import time
+import threading
+import numpy as np
+from datetime import datetime
+
+from module_capture import open_reader
+
+FRAME_MS = 20
+FRAMES_PER_READ = 10
+
+
+class NoiseFloorTracker:
+    """
+    Tracks the background noise level on the shared capture stream.
+
+    While idle (waiting for the wake word) the RMS of every 20 ms frame goes into a
+    window of the last window_seconds; the noise floor is the given low percentile
+    of that window, so speech and bumps do not drag it up. on_update(threshold) is
+    called with floor * margin (at least minimum) whenever it is recomputed.
+    Muted frames (exact silence from the echo gate or a replay source) are ignored.
+    """
+
+    def __init__(self, on_update, percentile=20, margin=1.5, minimum=10, window_seconds=10,
+                 update_seconds=0.5, samplerate=16000):
+        self.on_update = on_update
+        self.percentile = percentile
+        self.margin = margin
+        self.minimum = minimum
+        self.update_seconds = update_seconds
+        self.frame_samples = samplerate * FRAME_MS // 1000
+        self.history = np.zeros(int(window_seconds * 1000 / FRAME_MS))
+        self.filled = 0
+        self.index = 0
+        self.min_frames = 500 // FRAME_MS  # half a second before the first estimate
+        self.noise_floor = None
+        self.threshold = None
+        self.reported = None
+        self.idle = threading.Event()
+        self.done = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.idle.set()
+        self.thread = threading.Thread(target=self._run, name="NoiseFloorTracker", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.done.set()
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+
+    def set_idle(self, idle):
+        """
+        Only idle audio is used; TARS talking or the user giving a command is not noise.
+        """
+        if idle:
+            self.idle.set()
+        else:
+            self.idle.clear()
+
+    def _add(self, rms):
+        for value in rms:
+            self.history[self.index] = value
+            self.index = (self.index + 1) % self.history.size
+        self.filled = min(self.history.size, self.filled + rms.size)
+
+    def _run(self):
+        reader = open_reader()
+        last_update = 0.0
+        while not self.done.is_set():
+            data = reader.read(self.frame_samples * FRAMES_PER_READ, timeout=0.5, stop_event=self.done)
+            if data is None or not self.idle.is_set():
+                continue
+            frames = data.reshape(-1, self.frame_samples).astype(np.float64)
+            rms = np.sqrt(np.mean(frames * frames, axis=1))
+            self._add(rms[rms > 0])
+
+            now = time.monotonic()
+            if self.filled < self.min_frames or now - last_update < self.update_seconds:
+                continue
+            last_update = now
+            self.noise_floor = float(np.percentile(self.history[:self.filled], self.percentile))
+            self.threshold = max(self.minimum, self.noise_floor * self.margin)
+            self.on_update(self.threshold)
+
+            if self.reported is None:
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LOAD: Silence threshold set to: {self.threshold:.2f}")
+                self.reported = self.threshold
+            elif abs(self.threshold - self.reported) > 0.25 * self.reported:
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: Background noise changed, silence threshold now {self.threshold:.2f}")
+                self.reported = self.threshold
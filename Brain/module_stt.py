@@ -1,18 +1,19 @@
 import os
 import random
-import sounddevice as sd
 from vosk import Model, KaldiRecognizer
-from pocketsphinx import LiveSpeech
-from threading import Event
+from threading import Event, Thread
 import requests
 from datetime import datetime
-from io import BytesIO
-import wave
+import time
 import configparser
 import sys
 import numpy as np
 import json
 
+from module_capture import start_capture, open_reader
+from module_noisefloor import NoiseFloorTracker
+from module_audioencode import UtteranceEncoder, local_formats
+from module_sttworker import STTWorker, create_wake_decoder, wait_for_wake, transcribe_vosk
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 # Set the working directory to the base directory
@@ -25,13 +26,22 @@ config.read('config.ini')
 
 use_server_stt = config.getboolean("STT", "use_server")
 server_url = config["STT"]["server_url"]
+use_worker_process = config.getboolean("STT", "worker_process", fallback=True)
+overlap_ack = config.getboolean("STT", "overlap_ack", fallback=True)
+UPLOAD_FORMAT = config.get("STT", "upload_format", fallback="wav").strip().lower()
+upload_format = None  # negotiated with the server on first use
+NOISE_PERCENTILE = config.getfloat("STT", "noise_percentile", fallback=20)
+NOISE_MARGIN = config.getfloat("STT", "noise_margin", fallback=1.5)
+NOISE_WINDOW_SECONDS = config.getfloat("STT", "noise_window", fallback=10)
 
 vosk_model = None
+VOSK_MODEL_PATH = None
 if not use_server_stt:
     VOSK_MODEL_PATH = os.path.join(BASE_DIR, "vosk-model-small-en-us-0.15")
     if not os.path.exists(VOSK_MODEL_PATH):
         raise FileNotFoundError("Vosk model not found. Download from: https://alphacephei.com/vosk/models")
-    vosk_model = Model(VOSK_MODEL_PATH)
+    if not use_worker_process:
+        vosk_model = Model(VOSK_MODEL_PATH)
 
 # List of TARS-style responses
 tars_responses = [
@@ -49,13 +59,45 @@ tars_responses = [
 
 # Constants
 WAKE_PHRASE = "hey tar"
+KWS_THRESHOLD = 1e-20
 SAMPLE_RATE = 16000
+MAX_COMMAND_SAMPLES = 50 * 4000  # Limit maximum recording duration (~12.5 seconds)
 
 
 # Global running flag and callback
 running = False
 message_callback = None
 wakeword_callback = None
+stop_listening = Event()
+
+# Recognizers: either a dedicated worker process or in-process decoders
+stt_worker = None
+wake_decoder = None
+wake_pos = None  # capture position where the last wake phrase ended
+
+# Background noise: silence_threshold follows the tracked noise floor
+MIN_SILENCE_THRESHOLD = 10
+silence_threshold = 300  # used until the first estimate is in
+noise_tracker = None
+
+def start_recognizer():
+    """
+    Start the shared capture stream and, if enabled, the dedicated STT process.
+    """
+    global stt_worker
+    ring = start_capture(SAMPLE_RATE)
+    if use_worker_process and stt_worker is None:
+        stt_worker = STTWorker(ring, VOSK_MODEL_PATH, WAKE_PHRASE, KWS_THRESHOLD, SAMPLE_RATE)
+        stt_worker.start()
+
+def stop_recognizer():
+    """
+    Shut down the STT process (if running).
+    """
+    global stt_worker
+    if stt_worker is not None:
+        stt_worker.stop()
+        stt_worker = None
 
 def set_wakewordtts_callback(callback_function):
     """
@@ -71,54 +113,70 @@ def detect_wake_word():
     current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"[{current_time}] TARS: Idle...")
 
-    speech = LiveSpeech(lm=False, keyphrase=WAKE_PHRASE, kws_threshold=1e-20)
-    for phrase in speech:
-        #print(f"Detected phrase: {phrase.hypothesis()}")
-        if WAKE_PHRASE in phrase.hypothesis().lower():
-            response = random.choice(tars_responses)
-            print(f"[{current_time}] TARS: {response}")
-            if wakeword_callback:
+    global wake_decoder, wake_pos
+    start_recognizer()
+    if noise_tracker is not None:
+        noise_tracker.set_idle(True)
+    if stt_worker is not None:
+        detected = stt_worker.detect_wake_word(stop_listening)
+    else:
+        if wake_decoder is None:
+            wake_decoder = create_wake_decoder(WAKE_PHRASE, KWS_THRESHOLD)
+        detected = wait_for_wake(open_reader(), wake_decoder, WAKE_PHRASE, stop_listening)
+
+    if noise_tracker is not None:
+        noise_tracker.set_idle(False)
+    if detected is not None:
+        wake_pos = detected
+        response = random.choice(tars_responses)
+        print(f"[{current_time}] TARS: {response}")
+        if wakeword_callback:
+            if overlap_ack:
+                # Acknowledge while the command is already being captured
+                Thread(target=wakeword_callback, args=(response,), name="WakeAck", daemon=True).start()
+            else:
                 wakeword_callback(response)
-            return True
+                wake_pos = None
+        return True
+    return False
 
-def transcribe_command():
+def transcribe_command(start_pos=None):
     """
     Transcribes a command using either the local Vosk model or the server.
+    start_pos is a capture ring position to start from (default: now), e.g. where
+    the user started speaking over TARS.
     """
     print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: Listening...")
     try:
         if use_server_stt:
-            return transcribe_with_server()
+            return transcribe_with_server(start_pos)
         else:
-            return transcribe_with_vosk()
+            return transcribe_with_vosk(start_pos)
     except Exception as e:
         print(f"[ERROR] Transcription failed: {e}")
 
 
-def transcribe_with_vosk():
+def transcribe_with_vosk(start_pos=None):
     """
     Transcribes audio locally using Vosk.
     """
     recognizer = None
     try:
-        recognizer = KaldiRecognizer(vosk_model, SAMPLE_RATE)
-        #print("KaldiRecognizer initialized successfully.")
-
-        with sd.InputStream(samplerate=SAMPLE_RATE, channels=1, dtype="int16") as stream:
-            max_duration_frames = 50  # Limit maximum recording duration (~12.5 seconds)
-            total_frames = 0
-
-            while total_frames < max_duration_frames:  # Prevent infinite loops
-                data, _ = stream.read(4000)
-                if recognizer.AcceptWaveform(data.tobytes()):
-                    result = recognizer.Result()
-                    #print(f"[DEBUG] Recognized: {result}")
-                    if message_callback:
-                        message_callback(result)
-                    return result
-                total_frames += 1
-            print("[ERROR] No valid transcription within duration limit.")
-            return None
+        start_recognizer()
+        if stt_worker is not None:
+            result = stt_worker.transcribe(MAX_COMMAND_SAMPLES, start_pos=start_pos, stop_event=stop_listening)
+        else:
+            recognizer = KaldiRecognizer(vosk_model, SAMPLE_RATE)
+            #print("KaldiRecognizer initialized successfully.")
+            result = transcribe_vosk(open_reader(start_pos), recognizer, MAX_COMMAND_SAMPLES, stop_listening)
+
+        if result:
+            #print(f"[DEBUG] Recognized: {result}")
+            if message_callback:
+                message_callback(result)
+            return result
+        print("[ERROR] No valid transcription within duration limit.")
+        return None
 
     except Exception as e:
         print(f"[ERROR] Error during local transcription: {e}")
@@ -127,43 +185,63 @@ def transcribe_with_vosk():
             del recognizer
 
 
-def measure_background_noise():
-    """
-    Measure the background noise level for 2-3 seconds and set the silence threshold.
-    """
+def _set_silence_threshold(value):
     global silence_threshold
-    silence_margin = 1.2  # 20% margin above background noise
-
-   
-    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LOAD: Measuring background noise...")
-    
-    background_rms_values = []
-
-    with sd.InputStream(samplerate=SAMPLE_RATE, channels=1, dtype="int16") as stream:
-        for _ in range(20):  # Collect ~2 seconds of audio (20 frames * 4000 samples)
-            data, _ = stream.read(4000)
-            if data.size == 0 or not np.isfinite(data).all():
-                rms = 0  # Assign zero RMS for invalid or empty data
-            else:
-                rms = np.sqrt(np.mean(np.square(data)))
-            background_rms_values.append(rms)
+    silence_threshold = value
 
-    background_noise = np.mean(background_rms_values)
-    silence_threshold = background_noise * silence_margin  # Add margin to background noise
-    if silence_threshold < 10:
-        silence_threshold = 10
+def start_noise_tracking():
+    """
+    Start estimating the background noise on the capture stream. Returns immediately;
+    silence_threshold keeps its default until the first estimate is in and is then
+    kept up to date whenever TARS is idle.
+    """
+    global noise_tracker
+    if noise_tracker is None:
+        noise_tracker = NoiseFloorTracker(
+            _set_silence_threshold,
+            percentile=NOISE_PERCENTILE,
+            margin=NOISE_MARGIN,
+            minimum=MIN_SILENCE_THRESHOLD,
+            window_seconds=NOISE_WINDOW_SECONDS,
+            samplerate=SAMPLE_RATE,
+        ).start()
+    return noise_tracker
+
+def negotiate_upload_format():
+    """
+    Pick the upload format once: [STT] upload_format if both this machine and the
+    server (GET /capabilities) support it, otherwise WAV.
+    """
+    global upload_format
+    if upload_format is not None:
+        return upload_format
+    if UPLOAD_FORMAT == "wav":
+        upload_format = "wav"
+        return upload_format
+    try:
+        capabilities_url = server_url.rsplit("/", 1)[0] + "/capabilities"
+        server_formats = requests.get(capabilities_url, timeout=3).json().get("upload_formats", ["wav"])
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"[ERROR] Could not negotiate the upload format, sending WAV: {e}")
+        return "wav"  # ask again next time
+
+    if UPLOAD_FORMAT not in server_formats:
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LOAD: STT server cannot decode {UPLOAD_FORMAT}, sending WAV")
+        upload_format = "wav"
+    elif UPLOAD_FORMAT not in local_formats():
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LOAD: soundfile/libsndfile cannot encode {UPLOAD_FORMAT} here, sending WAV")
+        upload_format = "wav"
     else:
-        pass
-    #print(f"LOAD: Measured background noise: {background_noise:.2f}")
-    #print(f"LOAD: Silence threshold set to: {silence_threshold:.2f}")
-    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LOAD: Silence threshold set to: {silence_threshold:.2f}")
+        upload_format = UPLOAD_FORMAT
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LOAD: Uploading speech as {upload_format}")
+    return upload_format
 
-def transcribe_with_server():
+def transcribe_with_server(start_pos=None):
     """
     Transcribes audio by sending it to a server for processing.
     """
     try:
-        audio_buffer = BytesIO()
+        encoder = UtteranceEncoder(negotiate_upload_format(), SAMPLE_RATE)
         silent_frames = 0
         max_silent_frames = 2  # ~1.25 seconds of silence
         detected_speech = False
@@ -171,48 +249,49 @@ def transcribe_with_server():
         min_speech_duration = 4  # Require at least 4 consecutive frames of speech
 
         print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: Starting audio recording...")
-        with sd.InputStream(samplerate=SAMPLE_RATE, channels=1, dtype="int16") as stream:
-            with wave.open(audio_buffer, "wb") as wf:
-                wf.setnchannels(1)
-                wf.setsampwidth(2)
-                wf.setframerate(SAMPLE_RATE)
-
-                speech_frames = 0  # Track consecutive speech frames
-                max_duration_frames = 50  # Limit maximum recording duration (~12.5 seconds)
-                total_frames = 0
-
-                while total_frames < max_duration_frames:  # Prevent infinite loops
-                    data, _ = stream.read(4000)
-                    wf.writeframes(data.tobytes())
-
-                    # Calculate RMS (Root Mean Square) energy of the audio data
-                    rms = np.sqrt(np.mean(np.square(data)))
-
-                    if rms > silence_threshold:  # Voice detected
-                        if not detected_speech:
-                            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: Speech detected.")
-                        detected_speech = True
-                        speech_frames += 1
-                        silent_frames = 0  # Reset silent frames
-                    elif detected_speech:  # Silence detected after speech
-                        silent_frames += 1
-                        if silent_frames > max_silent_frames:
-                            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: Silence detected.")
-                            break
-
-                    total_frames += 1
+        reader = open_reader(start_pos)
+
+        speech_frames = 0  # Track consecutive speech frames
+        max_duration_frames = 50  # Limit maximum recording duration (~12.5 seconds)
+        total_frames = 0
+
+        while total_frames < max_duration_frames:  # Prevent infinite loops
+            data = reader.read(4000, timeout=2.0, stop_event=stop_listening)
+            if data is None:
+                break
+            encoder.write(data)  # Encoded while the user is still talking
+
+            # Calculate RMS (Root Mean Square) energy of the audio data
+            rms = np.sqrt(np.mean(np.square(data, dtype=np.float64)))
+
+            if rms > silence_threshold:  # Voice detected
+                if not detected_speech:
+                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: Speech detected.")
+                detected_speech = True
+                speech_frames += 1
+                silent_frames = 0  # Reset silent frames
+            elif detected_speech:  # Silence detected after speech
+                silent_frames += 1
+                if silent_frames > max_silent_frames:
+                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: Silence detected.")
+                    break
+
+            total_frames += 1
 
         # Ensure the audio buffer is not empty
-        audio_buffer.seek(0)
-        buffer_size = audio_buffer.getbuffer().nbytes
-        if buffer_size == 0:
+        audio_bytes = encoder.finish()
+        if encoder.raw_bytes == 0:
             print("[ERROR] Audio buffer is empty. No audio recorded.")
             return None
 
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: Sent {buffer_size} bytes of audio")
-        files = {"audio": ("audio.wav", audio_buffer, "audio/wav")}
-
+        files = {"audio": (encoder.filename, audio_bytes, encoder.mimetype)}
+        t_upload = time.monotonic()
         response = requests.post(server_url, files=files, timeout=10)
+        round_trip_ms = (time.monotonic() - t_upload) * 1000
+        server_ms = float(response.headers.get("X-Process-Time-Ms", 0))
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: Sent {len(audio_bytes)} bytes of {encoder.format} audio "
+              f"({encoder.raw_bytes / max(1, len(audio_bytes)):.1f}x smaller than PCM), upload ~{round_trip_ms - server_ms:.0f} ms "
+              f"(round trip {round_trip_ms:.0f} ms, server {server_ms:.0f} ms)")
 
         # Handle server response
         if response.status_code == 200:
@@ -266,17 +345,22 @@ def start_stt(stop_event: Event = None):
     """
     Start the voice assistant. Listens for wake word and transcribes commands.
     """
-    global running
+    global running, stop_listening
     running = True
+    if stop_event is not None:
+        stop_listening = stop_event
+    else:
+        stop_listening.clear()
 
     try:
+        start_recognizer()
         while running:
             if stop_event and stop_event.is_set():
                 print("Stopping STT...")
                 break
 
             if detect_wake_word():
-                transcribe_command()
+                transcribe_command(wake_pos)
     except KeyboardInterrupt:
         print("\nSTT interrupted by user.")
     except Exception as e:
@@ -291,6 +375,8 @@ def stop_stt():
     """
     global running
     running = False
+    stop_listening.set()
+    stop_recognizer()
     print("Voice assistant stopped.")
 
 
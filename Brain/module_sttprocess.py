@@ -0,0 +1,116 @@
+"""
+Entry point of the speech recognition process started by STTWorker.
+
+It runs in a fresh interpreter rather than a fork of the assistant, so it inherits
+no PortAudio state, threads or held locks, and it never imports app.py. It only
+loads numpy, the shared capture ring, Pocketsphinx and Vosk.
+
+Commands arrive as JSON lines on stdin: {"id", "cmd": "wake"|"command", ...},
+{"cmd": "cancel", "id"} and {"cmd": "stop"}. Results leave as JSON lines
+{"id", "kind", "payload"} on the original stdout; stdout itself is pointed at
+stderr so native library logging cannot corrupt the protocol.
+"""
+import os
+import sys
+import json
+import queue
+import threading
+
+
+def main():
+    protocol = os.fdopen(os.dup(1), "w", buffering=1)
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    send_lock = threading.Lock()
+
+    def send(request_id, kind, payload=None):
+        with send_lock:
+            protocol.write(json.dumps({"id": request_id, "kind": kind, "payload": payload}) + "\n")
+
+    args = json.loads(sys.argv[1])
+    from module_capture import AudioRing, RingReader
+    from module_sttworker import create_wake_decoder, wait_for_wake, transcribe_vosk
+
+    commands = queue.Queue()
+    shutdown = threading.Event()
+    state_lock = threading.Lock()
+    current = {"id": None, "cancel": threading.Event()}
+    cancelled = set()
+
+    def read_commands():
+        for line in sys.stdin:
+            message = json.loads(line)
+            if message["cmd"] == "cancel":
+                with state_lock:
+                    cancelled.add(message["id"])
+                    if current["id"] == message["id"]:
+                        current["cancel"].set()
+            elif message["cmd"] == "stop":
+                break
+            else:
+                commands.put(message)
+        # stop command, or the parent went away
+        shutdown.set()
+        with state_lock:
+            current["cancel"].set()
+
+    ring = AudioRing(args["ring_capacity"], name=args["ring_name"])
+    reader = RingReader(ring)
+    try:
+        decoder = create_wake_decoder(args["wake_phrase"], args["kws_threshold"])
+        vosk_model = None
+        if args["model_path"]:
+            from vosk import Model, KaldiRecognizer
+            vosk_model = Model(args["model_path"])
+    except Exception as e:
+        send(0, "error", str(e))
+        ring.close()
+        return
+    threading.Thread(target=read_commands, name="STTCommands", daemon=True).start()
+    send(0, "ready")
+
+    try:
+        while not shutdown.is_set():
+            try:
+                command = commands.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            request_id = command["id"]
+            with state_lock:
+                if request_id in cancelled:
+                    cancelled.discard(request_id)
+                    continue
+                current["id"] = request_id
+                current["cancel"] = cancel = threading.Event()
+
+            try:
+                if command["cmd"] == "wake":
+                    reader.seek_to_now()
+                    result = ("wake", wait_for_wake(reader, decoder, args["wake_phrase"], cancel))
+                elif command["cmd"] == "command":
+                    if command["start_pos"] is None:
+                        reader.seek_to_now()
+                    else:
+                        reader.pos = command["start_pos"]
+                    if vosk_model is None:
+                        result = ("error", "Vosk model not loaded in STT worker")
+                    else:
+                        recognizer = KaldiRecognizer(vosk_model, args["sample_rate"])
+                        result = ("text", transcribe_vosk(reader, recognizer, command["max_samples"], cancel))
+                else:
+                    result = ("error", f"Unknown command {command['cmd']}")
+            except Exception as e:
+                result = ("error", str(e))
+
+            with state_lock:
+                current["id"] = None
+                abandoned = cancel.is_set()
+                cancelled.discard(request_id)
+            if not abandoned:
+                send(request_id, *result)
+    finally:
+        ring.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import time
+import queue
+import threading
+import subprocess
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Frame sizes used when pulling audio off the capture ring
+WAKE_FRAME_SAMPLES = 1024
+COMMAND_FRAME_SAMPLES = 4000
+
+
+#DECODING LOOPS (shared by the worker process and the in-process fallback)
+def create_wake_decoder(wake_phrase, kws_threshold=1e-20):
+    """
+    Create a Pocketsphinx keyphrase decoder that is fed from the capture ring.
+    """
+    from pocketsphinx import Decoder
+    return Decoder(lm=None, keyphrase=wake_phrase, kws_threshold=kws_threshold)
+
+
+def wait_for_wake(reader, decoder, wake_phrase, stop_event=None):
+    """
+    Feed audio from reader into the keyphrase decoder until the wake phrase is heard.
+    Returns the capture ring position at detection, or None if stop_event was set.
+    """
+    decoder.start_utt()
+    try:
+        while stop_event is None or not stop_event.is_set():
+            data = reader.read(WAKE_FRAME_SAMPLES, timeout=0.5, stop_event=stop_event)
+            if data is None:
+                continue
+            decoder.process_raw(data.tobytes(), False, False)
+            hyp = decoder.hyp()
+            if hyp is not None and wake_phrase in hyp.hypstr.lower():
+                return reader.pos
+        return None
+    finally:
+        decoder.end_utt()
+
+
+def transcribe_vosk(reader, recognizer, max_samples, stop_event=None):
+    """
+    Feed audio from reader into a Vosk recognizer until it finalizes an utterance.
+    Returns the Vosk JSON result string, or None if nothing was recognized in time.
+    """
+    total = 0
+    while total < max_samples:
+        data = reader.read(COMMAND_FRAME_SAMPLES, timeout=2.0, stop_event=stop_event)
+        if data is None:
+            return None
+        total += data.size
+        if recognizer.AcceptWaveform(data.tobytes()):
+            return recognizer.Result()
+    return None
+
+
+#WORKER PROCESS
+class STTWorker:
+    """
+    Handle to the dedicated speech recognition process (module_sttprocess.py).
+
+    The process is a fresh interpreter, not a fork: forking after PortAudio and the
+    capture thread have started can deadlock the child on inherited locks, and
+    multiprocessing's spawn would re-run app.py's module-level startup. Every
+    request carries an id; a request abandoned through stop_event is cancelled in
+    the worker, and any late result for it is dropped instead of being returned to
+    the next call.
+    """
+
+    def __init__(self, ring, model_path, wake_phrase, kws_threshold=1e-20, sample_rate=16000):
+        self.args = {
+            "ring_name": ring.name,
+            "ring_capacity": ring.capacity,
+            "model_path": model_path,
+            "wake_phrase": wake_phrase,
+            "kws_threshold": kws_threshold,
+            "sample_rate": sample_rate,
+        }
+        self.process = None
+        self.results = queue.Queue()
+        self.next_id = 0
+        self.send_lock = threading.Lock()
+
+    def start(self, timeout=60):
+        """
+        Start the process and wait until its models are loaded.
+        """
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(BASE_DIR, "module_sttprocess.py"), json.dumps(self.args)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1, cwd=BASE_DIR,
+        )
+        threading.Thread(target=self._read_results, name="STTResults", daemon=True).start()
+        kind, payload = self._wait(0, timeout=timeout)
+        if kind != "ready":
+            self.stop()
+            raise RuntimeError(f"STT worker failed to start: {payload}")
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LOAD: STT worker running (pid {self.process.pid}).")
+
+    def _read_results(self):
+        for line in self.process.stdout:
+            self.results.put(json.loads(line))
+        self.results.put({"id": None, "kind": "exit", "payload": None})
+
+    def _send(self, message):
+        with self.send_lock:
+            try:
+                self.process.stdin.write(json.dumps(message) + "\n")
+                self.process.stdin.flush()
+            except (BrokenPipeError, ValueError, OSError):
+                pass  # worker already gone; _wait reports it
+
+    def _request(self, cmd, stop_event=None, **fields):
+        self.next_id += 1
+        request_id = self.next_id
+        self._send({"id": request_id, "cmd": cmd, **fields})
+        kind, payload = self._wait(request_id, stop_event=stop_event)
+        if kind is None:
+            self._send({"cmd": "cancel", "id": request_id})
+        return kind, payload
+
+    def detect_wake_word(self, stop_event=None):
+        """
+        Block until the wake phrase is heard. Returns the ring position at detection or None.
+        """
+        kind, payload = self._request("wake", stop_event)
+        return payload if kind == "wake" else None
+
+    def transcribe(self, max_samples, start_pos=None, stop_event=None):
+        kind, payload = self._request("command", stop_event, start_pos=start_pos, max_samples=max_samples)
+        if kind == "error":
+            raise RuntimeError(payload)
+        return payload
+
+    def _wait(self, request_id, stop_event=None, timeout=None):
+        """
+        Wait for the result of request_id. Returns (None, None) if stop_event was set.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                return None, None
+            try:
+                message = self.results.get(timeout=0.5)
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return "error", "timed out"
+                continue
+            if message["kind"] == "exit":
+                return "error", "STT worker exited"
+            if message["id"] == request_id:
+                return message["kind"], message["payload"]
+            # Late result of an abandoned request: drop it
+
+    def stop(self):
+        if self.process is None:
+            return
+        self._send({"cmd": "stop"})
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.terminate()
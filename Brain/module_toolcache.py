@@ -0,0 +1,151 @@
+import os
+import re
+import json
+import time
+import threading
+import configparser
+from collections import OrderedDict
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+config = configparser.ConfigParser()
+config.read(os.path.join(BASE_DIR, 'config.ini'))
+
+toolcache_enabled = config.getboolean('TOOLCACHE', 'enabled', fallback=True)
+toolcache_path = os.path.join(BASE_DIR, config.get('TOOLCACHE', 'path', fallback='toolcache.json'))
+toolcache_max_entries = config.getint('TOOLCACHE', 'max_entries', fallback=256)
+TOOL_TTLS = {
+    "weather": config.getfloat('TOOLCACHE', 'ttl_weather', fallback=600),
+    "news": config.getfloat('TOOLCACHE', 'ttl_news', fallback=1800),
+    "search": config.getfloat('TOOLCACHE', 'ttl_search', fallback=3600),
+}
+
+
+def normalize_query(query):
+    """
+    Lowercase, drop punctuation and collapse whitespace, so trivially different
+    phrasings of the same question share an entry.
+    """
+    query = re.sub(r"['\u2019]", '', query.lower())  # what's -> whats
+    return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', ' ', query)).strip()
+
+
+def _is_empty(value):
+    return not value or (isinstance(value, tuple) and not value[0])
+
+
+class ToolCache:
+    """
+    Results of slow tools (web search, weather, news) keyed by tool and normalized
+    query. Each tool has its own TTL (0 = never cached); the least recently used
+    entries are dropped beyond max_entries. The cache is saved to a JSON file after
+    every change and reloaded on start, so answers survive a restart.
+    """
+
+    def __init__(self, path=toolcache_path, ttls=None, max_entries=toolcache_max_entries):
+        self.path = path
+        self.ttls = dict(TOOL_TTLS if ttls is None else ttls)
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # "tool|query" -> (stored_at, value)
+        self.lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ERROR: Could not read tool cache {self.path}: {e}")
+            return
+        now = time.time()
+        for key, stored_at, value in saved:
+            ttl = self.ttls.get(key.split('|', 1)[0], 0)
+            if now - stored_at <= ttl:
+                # Tool results are strings or (text, links) tuples; JSON turns tuples into lists
+                self.entries[key] = (stored_at, tuple(value) if isinstance(value, list) else value)
+
+    def _save(self):
+        if not self.path:
+            return
+        temp_path = self.path + '.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump([[key, stored_at, value] for key, (stored_at, value) in self.entries.items()], f)
+            os.replace(temp_path, self.path)
+        except (OSError, TypeError) as e:
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ERROR: Could not save tool cache {self.path}: {e}")
+
+    def get(self, tool, query):
+        """
+        Return the cached result, or None if missing or older than the tool's TTL.
+        """
+        key = f"{tool}|{normalize_query(query)}"
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry[0] <= self.ttls.get(tool, 0):
+                self.entries.move_to_end(key)
+                self.hits[tool] = self.hits.get(tool, 0) + 1
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+            self.misses[tool] = self.misses.get(tool, 0) + 1
+            return None
+
+    def put(self, tool, query, value):
+        if self.ttls.get(tool, 0) <= 0 or _is_empty(value):
+            return
+        with self.lock:
+            key = f"{tool}|{normalize_query(query)}"
+            self.entries[key] = (time.time(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self._save()
+
+    def cached(self, tool, query, compute):
+        """
+        Return the cached result for (tool, query) or compute(query) and cache it.
+        Empty results are not cached.
+        """
+        value = self.get(tool, query)
+        if value is not None:
+            stats = self.stats()[tool]
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] TOOL: Cached {tool} result (hit rate {stats['hit_rate']:.0%} of {stats['hits'] + stats['misses']})")
+            return value
+        value = compute(query)
+        self.put(tool, query, value)
+        return value
+
+    def stats(self):
+        """
+        Hits, misses and hit rate per tool.
+        """
+        with self.lock:
+            result = {}
+            for tool in set(self.ttls) | set(self.hits) | set(self.misses):
+                hits, misses = self.hits.get(tool, 0), self.misses.get(tool, 0)
+                result[tool] = {"hits": hits, "misses": misses,
+                                "hit_rate": hits / (hits + misses) if hits + misses else 0.0}
+            return result
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self._save()
+
+
+tool_cache = ToolCache()
+
+
+def cached_tool(tool, query, compute):
+    """
+    compute(query) through the shared tool cache (or directly if it is disabled).
+    """
+    if not toolcache_enabled:
+        return compute(query)
+    return tool_cache.cached(tool, query, compute)
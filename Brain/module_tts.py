@@ -2,6 +2,12 @@ import time
 import requests
 import configparser
 import os 
+import json
+import struct
+import hashlib
+import threading
+
+from module_localtts import local_tts_stream
 
 config = configparser.ConfigParser()
 config.read('config.ini')
@@ -12,32 +18,193 @@ ttsclone = config['TTS']['ttsclone']
 ttsurl = config['TTS']['ttsurl']
 voiceonly = config.getboolean('TTS', 'voiceonly')
 
+# Settings pushed to the XTTS server at startup (see app.py)
+XTTS_SETTINGS = {
+    "stream_chunk_size": 100,
+    "temperature": 0.7,
+    "speed": 1.1,
+    "length_penalty": 1.0,
+    "repetition_penalty": 1.2,
+    "top_p": 0.9,
+    "top_k": 40,
+    "enable_text_splitting": True
+}
+
+# espeak-ng voice and effect chain used by the local option
+LOCAL_VOICE = {"speed": 140, "pitch": 50, "voice": "en-us+m3"}
+LOCAL_EFFECTS = {"gain_db": 0.0, "reverb": 30, "highpass": 500, "lowpass": 3000}
+
 start_time = time.time()
 
+# TTS streams currently being read (for cancel_tts)
+active_streams = set()
+active_streams_lock = threading.Lock()
+
+class TTSStream:
+    """
+    Iterator over the WAV bytes of one TTS request.
+
+    complete becomes True only once the backend has delivered the whole render: not
+    after an error, not after cancel() and not if the server's Content-Length was not
+    reached. Each request tracks this itself, so concurrent streams (the wake
+    acknowledgement and a reply) never see each other's status.
+    """
+
+    def __init__(self, text_to_read, ttsurl, ttsclone, chunk_size=1024):
+        self.text_to_read = text_to_read
+        self.ttsurl = ttsurl
+        self.ttsclone = ttsclone
+        self.chunk_size = chunk_size
+        self.complete = False
+        self.cancelled = threading.Event()
+        self.response = None
+        self.chunks = self._generate()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.chunks)
+
+    def close(self):
+        self.chunks.close()
+
+    def cancel(self):
+        """
+        Abort the request from another thread.
+        """
+        self.cancelled.set()
+        response = self.response
+        if response is not None:
+            response.close()
+
+    def _generate(self):
+        with active_streams_lock:
+            active_streams.add(self)
+        try:
+            if charvoice and ttsoption == "local":
+                source = local_tts_stream(self.text_to_read, LOCAL_VOICE, LOCAL_EFFECTS)
+                try:
+                    for chunk in source:
+                        if self.cancelled.is_set():
+                            return
+                        yield chunk
+                finally:
+                    source.close()
+
+            elif charvoice and ttsoption == "xttsv2":
+                full_url = f"{self.ttsurl}/tts_stream"
+                params = {
+                    'text': self.text_to_read,
+                    'speaker_wav': self.ttsclone,
+                    'language': "en"
+                }
+                headers = {'accept': 'audio/x-wav'}
+
+                response = requests.get(full_url, params=params, headers=headers, stream=True)
+                self.response = response
+                try:
+                    response.raise_for_status()
+                    expected = response.headers.get('Content-Length')
+                    received = 0
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        received += len(chunk)
+                        yield chunk
+                    if expected is not None and received != int(expected):
+                        raise IOError(f"stream ended after {received} of {expected} bytes")
+                finally:
+                    self.response = None
+                    response.close()
+
+            # A response closed by cancel() can end like a normal EOF
+            self.complete = not self.cancelled.is_set()
+
+        except Exception as e:
+            if not self.cancelled.is_set():
+                print(f"Text-to-speech generation failed: {e}")
+        finally:
+            with active_streams_lock:
+                active_streams.discard(self)
+
 def get_tts_stream(text_to_read, ttsurl, ttsclone):
-    try:
-        chunk_size = 1024
-
-        if charvoice and ttsoption == "local":
-            command = f'espeak-ng -s 140 -p 50 -v en-us+m3 "{text_to_read}" --stdout | sox -t wav - -c 1 -t wav - gain 0.0 reverb 30 highpass 500 lowpass 3000 | aplay'
-            os.system(command)
-
-        elif charvoice and ttsoption == "xttsv2":
-            full_url = f"{ttsurl}/tts_stream"
-            params = {
-                'text': text_to_read,
-                'speaker_wav': ttsclone,
-                'language': "en"
-            }
-            headers = {'accept': 'audio/x-wav'}
-
-            response = requests.get(full_url, params=params, headers=headers, stream=True)
-            response.raise_for_status()
-            for chunk in response.iter_content(chunk_size=chunk_size):
-                yield chunk
-
-    except Exception as e:
-        print(f"Text-to-speech generation failed: {e}")
+    return TTSStream(text_to_read, ttsurl, ttsclone)
+
+def cancel_tts():
+    """
+    Abort the TTS requests that are currently streaming, if any.
+    """
+    with active_streams_lock:
+        streams = list(active_streams)
+    for stream in streams:
+        stream.cancel()
+
+def tts_settings_key():
+    """
+    Short hash identifying the current voice and TTS settings. Audio rendered under
+    one key is never reused once the voice or backend settings change.
+    """
+    if ttsoption == "local":
+        settings = {"ttsoption": ttsoption, "voice": LOCAL_VOICE, "effects": LOCAL_EFFECTS}
+    else:
+        settings = {"ttsoption": ttsoption, "ttsclone": ttsclone, "xtts": XTTS_SETTINGS}
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def make_wav_header(samplerate, channels=1, sampwidth=2, data_size=None):
+    """
+    Build a 44-byte PCM WAV header. With data_size=None the sizes are set to the
+    streaming placeholder 0xFFFFFFFF, as streaming TTS servers do.
+    """
+    riff_size = 0xFFFFFFFF if data_size is None else 36 + data_size
+    data_size = 0xFFFFFFFF if data_size is None else data_size
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", riff_size, b"WAVE",
+        b"fmt ", 16, 1, channels, samplerate, samplerate * channels * sampwidth, channels * sampwidth, sampwidth * 8,
+        b"data", data_size
+    )
+
+def parse_wav_header(data):
+    """
+    Parse a RIFF/WAVE header. Returns a dict with samplerate, channels, sampwidth,
+    data_offset and data_size (None for the streaming placeholders 0 and 0xFFFFFFFF), or None if data
+    does not (yet) contain a complete header.
+    """
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        chunk_size = struct.unpack("<I", data[pos + 4:pos + 8])[0]
+        if chunk_id == b"fmt ":
+            if pos + 24 > len(data):
+                return None
+            _, channels, samplerate, _, _, bits = struct.unpack("<HHIIHH", data[pos + 8:pos + 24])
+            fmt = {"samplerate": samplerate, "channels": channels, "sampwidth": bits // 8}
+        elif chunk_id == b"data":
+            if fmt is None:
+                return None
+            fmt["data_offset"] = pos + 8
+            fmt["data_size"] = None if chunk_size in (0, 0xFFFFFFFF) else chunk_size
+            return fmt
+        pos += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+def synthesize_pcm(text_to_read):
+    """
+    Synthesize text completely and return (pcm_bytes, samplerate) of mono int16 audio.
+    """
+    stream = get_tts_stream(text_to_read, ttsurl, ttsclone)
+    data = b"".join(stream)
+    if not stream.complete:
+        raise ValueError("TTS stream did not complete")
+    header = parse_wav_header(data)
+    if header is None:
+        raise ValueError("TTS backend did not return WAV audio")
+    pcm = data[header["data_offset"]:]
+    if header["data_size"] is not None:
+        pcm = pcm[:header["data_size"]]  # drop chunks after the audio (LIST, id3)
+    return pcm[:len(pcm) - len(pcm) % 2], header["samplerate"]
 
 def talking(switch, start_time, talkinghead_base_url):
     switchep = f"{switch}_talking"
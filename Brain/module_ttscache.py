@@ -0,0 +1,266 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+import configparser
+import numpy as np
+from collections import OrderedDict
+from datetime import datetime
+
+from module_tts import get_tts_stream, synthesize_pcm, tts_settings_key, make_wav_header, parse_wav_header, ttsurl, ttsclone
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PRERENDER_DIR = os.path.join(BASE_DIR, "TTS", "prerendered")
+CACHE_DIR = os.path.join(BASE_DIR, "TTS", "cache")
+
+config = configparser.ConfigParser()
+config.read(os.path.join(BASE_DIR, 'config.ini'))
+
+cache_enabled = config.getboolean('TTS', 'cache_enabled', fallback=True)
+cache_mb = config.getfloat('TTS', 'cache_mb', fallback=64)
+
+
+def _phrase_id(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+class PhraseCache:
+    """
+    Pre-rendered audio for fixed phrases (wake word acknowledgements). Only pass
+    phrases that never change: anything rendered from a template (e.g. {{time}})
+    would be stored anew on every start.
+
+    Each phrase is synthesized once per voice/TTS settings and stored as raw int16 PCM
+    under TTS/prerendered/<settings key>/, with sample rates kept in index.json.
+    Everything is held in memory so playback can start immediately.
+    """
+
+    def __init__(self, settings_key, root=PRERENDER_DIR):
+        self.root = root
+        self.directory = os.path.join(root, settings_key)
+        self.index_path = os.path.join(self.directory, "index.json")
+        self.index = {}
+        self.audio = {}
+
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r") as f:
+                self.index = json.load(f)
+
+    def prerender(self, phrases):
+        """
+        Render any phrases missing from disk, then load all of them into memory.
+        """
+        rendered = 0
+        for text in phrases:
+            if not text or text in self.audio:
+                continue
+            entry = self.index.get(text)
+            path = os.path.join(self.directory, entry["file"]) if entry else None
+
+            if entry is None or not os.path.exists(path):
+                try:
+                    pcm, samplerate = synthesize_pcm(text)
+                except Exception as e:
+                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ERROR: Could not pre-render '{text}': {e}")
+                    continue
+                entry = {"file": f"{_phrase_id(text)}.pcm", "samplerate": samplerate}
+                path = os.path.join(self.directory, entry["file"])
+                with open(path, "wb") as f:
+                    f.write(pcm)
+                self.index[text] = entry
+                rendered += 1
+
+            self.audio[text] = (np.fromfile(path, dtype=np.int16), entry["samplerate"])
+
+        removed = self.prune(phrases)
+        if rendered or removed:
+            with open(self.index_path, "w") as f:
+                json.dump(self.index, f, indent=2)
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LOAD: {len(self.audio)} phrases ready for instant playback ({rendered} newly rendered, {removed} removed).")
+
+    def prune(self, phrases):
+        """
+        Delete rendered phrases that are no longer in the phrase set, stray files, and
+        the directories of other (old) voice settings. Returns the number of phrases removed.
+        """
+        keep = set(phrases)
+        stale = [text for text in self.index if text not in keep]
+        for text in stale:
+            del self.index[text]
+        wanted = {entry["file"] for entry in self.index.values()} | {os.path.basename(self.index_path)}
+        for name in os.listdir(self.directory):
+            if name not in wanted:
+                os.remove(os.path.join(self.directory, name))
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if path != self.directory and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+        return len(stale)
+
+    def get(self, text):
+        """
+        Return (samples, samplerate) for a pre-rendered phrase, or None.
+        """
+        return self.audio.get(text)
+
+
+phrase_cache = None
+
+def load_phrase_cache(phrases):
+    """
+    Build the global phrase cache for the current voice settings.
+    """
+    global phrase_cache
+    phrase_cache = PhraseCache(tts_settings_key())
+    phrase_cache.prerender(phrases)
+    return phrase_cache
+
+def get_prerendered(text):
+    if phrase_cache is None:
+        return None
+    return phrase_cache.get(text)
+
+
+class TTSCache:
+    """
+    Content-addressed cache of synthesized speech.
+
+    Entries are keyed by hash(text, voice/TTS settings) and stored on disk as raw int16
+    PCM named <key>.<samplerate>.pcm. File mtimes record recency, so least recently
+    used entries are evicted first once the cache grows past max_bytes.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=int(cache_mb * 1024 * 1024)):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (path, samplerate, size), oldest first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for name in os.listdir(self.directory):
+            parts = name.split(".")
+            if len(parts) == 3 and parts[2] == "pcm" and parts[1].isdigit():
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, parts[0], path, int(parts[1]), stat.st_size))
+        for _, key, path, samplerate, size in sorted(files):
+            self.entries[key] = (path, samplerate, size)
+            self.total_bytes += size
+
+    @staticmethod
+    def make_key(text):
+        return hashlib.sha1(f"{tts_settings_key()}\n{text}".encode("utf-8")).hexdigest()
+
+    def get(self, text):
+        """
+        Return (pcm_bytes, samplerate) for text, or None on a miss.
+        """
+        key = self.make_key(text)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            path, samplerate, _ = entry
+            try:
+                with open(path, "rb") as f:
+                    pcm = f.read()
+                os.utime(path)
+            except OSError:
+                self._drop(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return pcm, samplerate
+
+    def put(self, text, pcm, samplerate):
+        if len(pcm) == 0 or len(pcm) > self.max_bytes:
+            return
+        key = self.make_key(text)
+        path = os.path.join(self.directory, f"{key}.{samplerate}.pcm")
+        with self.lock:
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(pcm)
+            os.replace(tmp_path, path)
+            if key in self.entries:
+                self._drop(key, remove_file=False)
+            self.entries[key] = (path, samplerate, len(pcm))
+            self.total_bytes += len(pcm)
+            self._evict()
+
+    def _drop(self, key, remove_file=True):
+        path, _, size = self.entries.pop(key)
+        self.total_bytes -= size
+        if remove_file:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            self._drop(next(iter(self.entries)))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+        }
+
+
+tts_cache = TTSCache() if cache_enabled else None
+
+def cached_tts_stream(text_to_read, chunk_size=1024):
+    """
+    Drop-in replacement for get_tts_stream. Hits are served from disk as a WAV stream
+    without touching the network; misses stream from the backend and are stored once
+    the stream completes.
+    """
+    if tts_cache is None:
+        yield from get_tts_stream(text_to_read, ttsurl, ttsclone)
+        return
+
+    cached = tts_cache.get(text_to_read)
+    stats = tts_cache.stats()
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: TTS cache {'hit' if cached else 'miss'} (hit rate {stats['hit_rate']:.0%}, {stats['entries']} entries, {stats['bytes'] / 1048576:.1f} MB)")
+
+    if cached is not None:
+        pcm, samplerate = cached
+        yield make_wav_header(samplerate, data_size=len(pcm))
+        for i in range(0, len(pcm), chunk_size):
+            yield pcm[i:i + chunk_size]
+        return
+
+    received = bytearray()
+    backend = get_tts_stream(text_to_read, ttsurl, ttsclone)
+    try:
+        for chunk in backend:
+            received += chunk
+            yield chunk
+    finally:
+        backend.close()
+
+    # Abandoned streams never get here; failed, cancelled or truncated ones are not cached
+    if not backend.complete:
+        return
+    header = parse_wav_header(bytes(received[:4096]))
+    if header is None:
+        return
+    pcm = bytes(received[header["data_offset"]:])
+    if header["data_size"] is not None:
+        if len(pcm) < header["data_size"]:
+            return
+        pcm = pcm[:header["data_size"]]  # drop chunks after the audio (LIST, id3)
+    tts_cache.put(text_to_read, pcm[:len(pcm) - len(pcm) % 2], header["samplerate"])
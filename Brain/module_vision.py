@@ -1,11 +1,15 @@
+import time
+import threading
 import subprocess
 import traceback
 from PIL import Image
-from transformers import BlipProcessor, BlipForConditionalGeneration
 from io import BytesIO
 import requests
-import torch
 import configparser
+from datetime import datetime
+
+from module_models import blip_caption
+from module_camera import latest_frame
 
 # Load configuration
 config = configparser.ConfigParser()
@@ -14,32 +18,85 @@ config.read('config.ini')
 # Vision configuration
 server_hosted = config['VISION']['server_hosted']
 vision_base_url = config['VISION']['base_url']
+upload_size = config.getint('VISION', 'upload_size', fallback=384)
+upload_quality = config.getint('VISION', 'upload_quality', fallback=85)
+caption_cache_enabled = config.getboolean('VISION', 'caption_cache', fallback=True)
+caption_cache_distance = config.getint('VISION', 'caption_cache_distance', fallback=6)
+caption_cache_ttl = config.getfloat('VISION', 'caption_cache_ttl', fallback=30)
 
-# Device configuration
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-# BLIP model initialization (only for on-device)
-processor = None
-model = None
+def dhash(image: Image.Image, size: int = 8) -> int:
+    """
+    64-bit difference hash: downscale to (size+1)x size grey and record whether each
+    pixel is brighter than its right neighbour. Small lighting/noise changes flip few bits.
+    """
+    image.draft("L", (size * 8, size * 8))  # let the JPEG decoder downscale for us
+    pixels = image.convert("L").resize((size + 1, size), Image.BILINEAR).tobytes()
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
 
 
-def initialize_blip_model():
+class CaptionCache:
     """
-    Initialize the BLIP model and processor for on-device vision processing.
+    Captions of recently seen frames keyed by perceptual hash. A frame whose hash is
+    within max_distance bits of a cached one taken less than ttl seconds ago reuses
+    its caption instead of running the captioning model again.
     """
-    global processor, model
-    if processor is None or model is None:
-        print("Initializing BLIP model and processor...")
-        processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-        model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
-        model.to(device)
-        model = torch.quantization.quantize_dynamic(
-            model, {torch.nn.Linear}, dtype=torch.qint8
-        )
-        print("BLIP model and processor initialized.")
 
+    def __init__(self, max_distance=caption_cache_distance, ttl=caption_cache_ttl, capacity=32):
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.capacity = capacity
+        self.entries = []  # (hash, caption, time), newest last
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key):
+        now = time.monotonic()
+        with self.lock:
+            self.entries = [entry for entry in self.entries if now - entry[2] <= self.ttl]
+            best = min(self.entries, key=lambda entry: bin(entry[0] ^ key).count("1"), default=None)
+            if best is not None and bin(best[0] ^ key).count("1") <= self.max_distance:
+                self.hits += 1
+                return best[1]
+            self.misses += 1
+            return None
+
+    def store(self, key, caption):
+        with self.lock:
+            self.entries.append((key, caption, time.monotonic()))
+            del self.entries[:-self.capacity]
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0, "entries": len(self.entries)}
+
+
+caption_cache = CaptionCache()
+
+# Pooled connection to the vision server
+session = requests.Session()
 
 def capture_image() -> BytesIO:
+    """
+    Return the newest frame from the always-on camera stream as a BytesIO object,
+    falling back to a one-off libcamera-still capture if the stream has no frame.
+    """
+    frame = latest_frame()
+    if frame is not None:
+        return BytesIO(frame)
+    return capture_still()
+
+
+def capture_still() -> BytesIO:
     """
     Capture an image using libcamera-still and return it as a BytesIO object.
     """
@@ -66,13 +123,33 @@ def capture_image() -> BytesIO:
         raise e
 
 
+def prepare_upload(image_bytes: BytesIO, size: int = upload_size, quality: int = upload_quality):
+    """
+    Resize a captured image to the captioning model's input size (BLIP uses size x size,
+    bicubic) and re-encode it as JPEG at the given quality. Returns (BytesIO, stats);
+    size 0 uploads the capture unchanged.
+    """
+    raw = image_bytes.getvalue()
+    if size <= 0:
+        return BytesIO(raw), {"raw_bytes": len(raw), "bytes": len(raw), "encode_ms": 0.0}
+    t0 = time.perf_counter()
+    image = Image.open(BytesIO(raw))
+    image.draft("RGB", (size, size))  # decode large JPEGs at a reduced scale
+    image = image.convert("RGB").resize((size, size), Image.BICUBIC)
+    out = BytesIO()
+    image.save(out, "JPEG", quality=quality)
+    out.seek(0)
+    return out, {"raw_bytes": len(raw), "bytes": out.getbuffer().nbytes,
+                 "encode_ms": (time.perf_counter() - t0) * 1000}
+
+
 def send_image_to_server(image_bytes: BytesIO) -> str:
     """
     Send an image to the server for captioning and return the generated caption.
     """
     try:
         files = {'image': ('image.jpg', image_bytes, 'image/jpeg')}
-        response = requests.post(f"{vision_base_url}/caption", files=files)
+        response = session.post(f"{vision_base_url}/caption", files=files)
 
         if response.status_code == 200:
             return response.json().get("caption", "No caption returned")
@@ -89,21 +166,38 @@ def describe_camera_view() -> str:
     Capture an image and process it either on-device or by sending it to the server.
     """
     try:
+        t0 = time.perf_counter()
         # Capture the image
         image_bytes = capture_image()
 
+        # Same scene as a recent request: reuse its caption
+        key = None
+        if caption_cache_enabled:
+            key = dhash(Image.open(image_bytes))
+            image_bytes.seek(0)
+            caption = caption_cache.lookup(key)
+            if caption is not None:
+                stats = caption_cache.stats()
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: Caption cache hit (hit rate {stats['hit_rate']:.0%} of {stats['hits'] + stats['misses']})")
+                return caption
+
         if server_hosted == 'True':
             # Use server-hosted vision processing
-            return send_image_to_server(image_bytes)
+            upload, stats = prepare_upload(image_bytes)
+            t_send = time.perf_counter()
+            caption = send_image_to_server(upload)
+            t_done = time.perf_counter()
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: Caption upload {stats['bytes'] / 1024:.0f} KB "
+                  f"(from {stats['raw_bytes'] / 1024:.0f} KB), encode {stats['encode_ms']:.0f} ms, "
+                  f"server {(t_done - t_send) * 1000:.0f} ms, total {(t_done - t0) * 1000:.0f} ms")
         else:
-            # Use on-device BLIP model for captioning
-            initialize_blip_model()
+            # Use the shared on-device BLIP model (loaded on first use)
             image = Image.open(image_bytes)
-            inputs = processor(image, return_tensors="pt").to(device)
+            caption = blip_caption(image, max_new_tokens=50, num_beams=5)
 
-            outputs = model.generate(**inputs, max_new_tokens=50, num_beams=5)
-            caption = processor.decode(outputs[0], skip_special_tokens=True)
-            return caption
+        if key is not None:
+            caption_cache.store(key, caption)
+        return caption
     except Exception as e:
         print("Error during image processing:", traceback.format_exc())
         return f"Error: {e}"
@@ -6,8 +6,40 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import atexit
 import os
-from contextlib import contextmanager
+import re
 import sys
+import time
+import threading
+import functools
+import configparser
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from urllib.parse import quote_plus
+import requests
+
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+# Browser pool configuration
+driver_pool_size = config.getint('WEBSEARCH', 'driver_pool_size', fallback=1)
+driver_max_pages = config.getint('WEBSEARCH', 'driver_max_pages', fallback=50)
+driver_max_rss_mb = config.getfloat('WEBSEARCH', 'driver_max_rss_mb', fallback=600)
+driver_idle_timeout = config.getfloat('WEBSEARCH', 'driver_idle_timeout', fallback=300)
+search_backend = config.get('WEBSEARCH', 'search_backend', fallback='http').strip().lower()
+http_timeout = config.getfloat('WEBSEARCH', 'http_timeout', fallback=5)
+search_engines = [name.strip() for name in config.get('WEBSEARCH', 'search_engines', fallback='google, duckduckgo, news').split(',') if name.strip()]
+search_deadlines = {name.strip(): float(seconds) for name, seconds in
+                    (item.split(':') for item in config.get('WEBSEARCH', 'search_deadlines', fallback='google:5, duckduckgo:6, news:6').split(',') if ':' in item)}
+browser_deadline = config.getfloat('WEBSEARCH', 'browser_deadline', fallback=25)
+
+GOOGLE_URL = "https://google.com/search?hl=en&q="
+GOOGLE_SELECTORS = [
+    ('.wDYxhc', "Answer box"),
+    ('.hgKElc', "Knowledge panel"),
+    ('.r025kc.lVm3ye', "Page snippets"),
+    ('.yDYNvb.lyLwlc', None),  # Old selectors (for compatibility)
+]
 
 # Silence logs to suppress unnecessary outputs
 @contextmanager
@@ -33,7 +65,137 @@ def initialize_driver():
     service = ChromeService(executable_path="/usr/bin/chromedriver")  # Explicitly specify the chromedriver path
     return webdriver.Chrome(service=service, options=options)
 
-def get_from_selector(selector: str):
+def process_tree_rss_mb(pid: int) -> float:
+    """Resident memory of a process and all its descendants (chromedriver + Chromium), from /proc."""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    page_kb = os.sysconf('SC_PAGE_SIZE') / 1024
+    total_kb = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f'/proc/{current}/statm') as f:
+                total_kb += int(f.read().split()[1]) * page_kb
+        except (OSError, IndexError, ValueError):
+            pass
+        stack.extend(children.get(current, []))
+    return total_kb / 1024
+
+
+class DriverPool:
+    """
+    Headless Chromium drivers started on first use instead of at import.
+
+    A driver is recycled (quit, then recreated on the next search) after max_pages
+    page loads or once its process tree uses more than max_rss_mb, and every driver
+    is shut down after idle_timeout seconds without a search. At most size drivers
+    exist at once; further callers wait for one to be released.
+    """
+
+    def __init__(self, size=driver_pool_size, max_pages=driver_max_pages,
+                 max_rss_mb=driver_max_rss_mb, idle_timeout=driver_idle_timeout):
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.idle_timeout = idle_timeout
+        self.idle = []  # (driver, pages, last_used)
+        self.created = 0
+        self.cond = threading.Condition()
+        self.janitor = None
+
+    def _acquire(self, cancel=None):
+        with self.cond:
+            while not self.idle and self.created >= self.size:
+                if cancel is not None and cancel.is_set():
+                    return None
+                self.cond.wait(0.1 if cancel is not None else None)
+            if self.idle:
+                return self.idle.pop()[:2]
+            self.created += 1
+        try:
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] LOAD: Starting headless browser...")
+            return initialize_driver(), 0
+        except Exception:
+            with self.cond:
+                self.created -= 1
+                self.cond.notify()
+            raise
+
+    def _retire(self, driver, reason):
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: Closing headless browser ({reason})")
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        with self.cond:
+            self.created -= 1
+            self.cond.notify()
+
+    def _release(self, driver, pages, failed):
+        reason = None
+        if failed:
+            reason = "error"
+        elif self.max_pages and pages >= self.max_pages:
+            reason = f"{pages} pages"
+        elif self.max_rss_mb:
+            rss = process_tree_rss_mb(driver.service.process.pid)
+            if rss > self.max_rss_mb:
+                reason = f"{rss:.0f} MB"
+        if reason:
+            self._retire(driver, reason)
+            return
+        with self.cond:
+            self.idle.append((driver, pages, time.monotonic()))
+            self.cond.notify()
+            if self.idle_timeout > 0 and self.janitor is None:
+                self.janitor = threading.Thread(target=self._close_idle, name="BrowserJanitor", daemon=True)
+                self.janitor.start()
+
+    @contextmanager
+    def driver(self, cancel=None):
+        """Borrow a driver for one page load (None if cancel is set while waiting for one)."""
+        acquired = self._acquire(cancel)
+        if acquired is None:
+            yield None
+            return
+        driver, pages = acquired
+        failed = True
+        try:
+            yield driver
+            failed = False
+        finally:
+            self._release(driver, pages + 1, failed)
+
+    def _close_idle(self):
+        while True:
+            time.sleep(min(30, self.idle_timeout))
+            now = time.monotonic()
+            with self.cond:
+                expired = [entry for entry in self.idle if now - entry[2] > self.idle_timeout]
+                self.idle = [entry for entry in self.idle if entry not in expired]
+            for driver, _, _ in expired:
+                self._retire(driver, "idle")
+
+    def close(self):
+        with self.cond:
+            idle, self.idle = self.idle, []
+        for driver, _, _ in idle:
+            self._retire(driver, "shutdown")
+
+
+driver_pool = DriverPool()
+
+def get_from_selector(driver, selector: str):
     result = ''
     for el in driver.find_elements(By.CSS_SELECTOR, selector):
         if el and el.text:
@@ -41,52 +203,116 @@ def get_from_selector(selector: str):
     return result
 
 def quit_driver():
-    """Quit the WebDriver when the script ends."""
-    if driver:
-        driver.quit()
+    """Quit the pooled WebDrivers when the script ends."""
+    driver_pool.close()
+
+
+# HTTP backend: fetch the result page without a browser and read the same selectors with lxml
+http_session = requests.Session()
+http_session.headers.update({
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept-Language": "en-GB,en;q=0.9",
+})
+
+def fetch_page(url: str):
+    """Fetch and parse a page over the pooled HTTP session."""
+    import lxml.html
+    response = http_session.get(url, timeout=http_timeout)
+    response.raise_for_status()
+    return lxml.html.fromstring(response.content, base_url=response.url)
+
+def element_text(el) -> str:
+    """Visible-ish text of an lxml element: its text nodes, whitespace collapsed."""
+    return re.sub(r'\s+', ' ', ' '.join(el.itertext())).strip()
+
+def select_text(doc, selector: str) -> str:
+    """Text of every element matching the selector, one per line (like get_from_selector)."""
+    result = ''
+    for el in doc.cssselect(selector):
+        text = element_text(el)
+        if text:
+            result += text + '\n'
+    return result
+
+def select_links(doc, selector: str) -> list[str]:
+    doc.make_links_absolute()
+    return [el.get('href') for el in doc.cssselect(selector) if el.get('href') and element_text(el)]
 
+def search_query_http(url: str, query: str, content_selector: str, link_selector: str = None) -> (str, list[str]):
+    """search_query without a browser. Returns ('', []) if the page could not be fetched."""
+    try:
+        doc = fetch_page(url + quote_plus(query))
+    except Exception as e:
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ERROR: HTTP search failed: {e}")
+        return '', []
+    content = select_text(doc, content_selector).strip()
+    links = select_links(doc, link_selector) if link_selector else []
+    return content, links
 
-def search_query(url: str, query: str, content_selector: str, link_selector: str = None) -> (str, list[str]):
+
+def search_query(url: str, query: str, content_selector: str, link_selector: str = None,
+                 http_url: str = None, http_selector: str = None, cancel: threading.Event = None,
+                 on_browser=None) -> (str, list[str]):
     """
     Perform a search on a specified URL and extract content and links.
 
+    With search_backend = http the page is fetched without a browser first; the
+    browser is only used if that finds nothing.
+
     Args:
         url (str): Base search URL.
         query (str): Search query.
         content_selector (str): CSS selector for text content.
         link_selector (str): CSS selector for links (optional).
+        http_url (str): Base URL for the HTTP backend, if the page needs a no-JS variant (optional).
+        http_selector (str): Content selector on that page (optional).
+        cancel (threading.Event): Once set, skip the browser fallback (optional).
+        on_browser (callable): Called before falling back to the browser (optional).
 
     Returns:
         tuple: Extracted text content and links.
     """
-    driver.get(url + query)
-    wait_for_element('res')  # Default wait for page to load
+    if search_backend == 'http':
+        content, links = search_query_http(http_url or url, query, http_selector or content_selector, link_selector)
+        if content or (cancel and cancel.is_set()):
+            return content, links
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: HTTP search found nothing, falling back to browser")
+
+    if cancel and cancel.is_set():
+        return '', []
+    if on_browser:
+        on_browser()
+    with driver_pool.driver(cancel) as driver:
+        if driver is None or (cancel and cancel.is_set()):
+            return '', []
+        driver.get(url + query)
+        wait_for_element(driver, 'res')  # Default wait for page to load
 
-    content = extract_text(content_selector)
-    links = extract_links(link_selector) if link_selector else []
+        content = extract_text(driver, content_selector)
+        links = extract_links(driver, link_selector) if link_selector else []
     return content, links
 
-def save_debug():
+def save_debug(driver):
     with open("module_engine/debug.html", "w", encoding='utf-8') as f:
         f.write(driver.page_source)
 
-def wait_for_id(id: str, delay: int = 5):
+def wait_for_id(driver, id: str, delay: int = 5):
     try:
         WebDriverWait(driver, delay).until(EC.presence_of_element_located((By.ID, id)))
     except:
         print(f"Element with id {id} not found, proceeding without.")
 
-def extract_text(selector: str) -> str:
+def extract_text(driver, selector: str) -> str:
     """Extract text from elements matching the CSS selector."""
     return '\n'.join(el.text for el in driver.find_elements(By.CSS_SELECTOR, selector) if el and el.text).strip()
 
 
-def extract_links(selector: str) -> list[str]:
+def extract_links(driver, selector: str) -> list[str]:
     """Extract links from elements matching the CSS selector."""
     return [el.get_attribute('href') for el in driver.find_elements(By.CSS_SELECTOR, selector) if el and el.text]
 
 
-def wait_for_element(element_id: str, delay: int = 10):
+def wait_for_element(driver, element_id: str, delay: int = 10):
     """Wait for an element with a specific ID to be present."""
     try:
         WebDriverWait(driver, delay).until(EC.presence_of_element_located((By.ID, element_id)))
@@ -95,57 +321,135 @@ def wait_for_element(element_id: str, delay: int = 10):
 
 
 # Specific search functions
-def search_google2(query: str) -> str:
-    print(f"Searching Google for: {query}")
-    return search_query(
-        "https://google.com/search?hl=en&q=",
-        query,
-        ".wDYxhc"  # Featured snippets
-    )
-
-
-def search_google(query: str) -> (str, list[str]):
-    global driver
+def search_google(query: str, cancel: threading.Event = None, on_browser=None) -> (str, list[str]):
     print(f"Searching Google for {query}...")
-    driver.get("https://google.com/search?hl=en&q=" + query)
-    wait_for_id('res')
-    save_debug()
     text = ''
-    # Answer box
-    text += get_from_selector('.wDYxhc')
-    print(f"Answer box: {text}")
-    # Knowledge panel
-    text += get_from_selector('.hgKElc')
-    print(f"Knowledge panel: {text}")
-    # Page snippets
-    text += get_from_selector('.r025kc.lVm3ye')
-    print(f"Page snippets: {text}")
-    # Old selectors (for compatibility)
-    text += get_from_selector('.yDYNvb.lyLwlc')
+    if search_backend == 'http':
+        try:
+            doc = fetch_page(GOOGLE_URL + quote_plus(query))
+            for selector, label in GOOGLE_SELECTORS:
+                text += select_text(doc, selector)
+                if label:
+                    print(f"{label}: {text}")
+        except Exception as e:
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ERROR: HTTP search failed: {e}")
+        if not text:
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: HTTP search found nothing, falling back to browser")
+
+    if not text and not (cancel and cancel.is_set()):
+        if on_browser:
+            on_browser()
+        with driver_pool.driver(cancel) as driver:
+            if driver is None or (cancel and cancel.is_set()):
+                return text
+            driver.get(GOOGLE_URL + query)
+            wait_for_id(driver, 'res')
+            save_debug(driver)
+            for selector, label in GOOGLE_SELECTORS:
+                text += get_from_selector(driver, selector)
+                if label:
+                    print(f"{label}: {text}")
     # Links
     #links = get_links_from_selector('.yuRUbf a')
     print("Found: " + text)
     return (text)
 
-def search_duckduckgo(query: str) -> str:
+def search_duckduckgo(query: str, cancel: threading.Event = None, on_browser=None) -> str:
     print(f"Searching DuckDuckGo for: {query}")
     return search_query(
         "https://duckduckgo.com/?kp=-2&kl=wt-wt&q=",
         query,
-        '[data-result="snippet"]'
+        '[data-result="snippet"]',
+        # duckduckgo.com renders results with JavaScript; its HTML endpoint does not
+        http_url="https://html.duckduckgo.com/html/?kp=-2&kl=wt-wt&q=",
+        http_selector='.result__snippet',
+        cancel=cancel,
+        on_browser=on_browser
     )
 
 
-def get_google_news(query: str) -> str:
+def get_google_news(query: str, cancel: threading.Event = None, on_browser=None) -> str:
     """Fetch news content from Google News."""
     print(f"Fetching Google News for: {query}")
     return search_query(
         "https://google.com/search?hl=en&gl=us&tbm=nws&q=",
         query,
-        ".dURPMd"
+        ".dURPMd",
+        cancel=cancel,
+        on_browser=on_browser
     )
 
 
-# Initialize and register cleanup
-driver = initialize_driver()
+# Engines for search_any: name -> function(query, cancel, on_browser) returning the answer text
+SEARCH_ENGINES = {
+    "google": lambda query, cancel, on_browser: search_google(query, cancel, on_browser),
+    "duckduckgo": lambda query, cancel, on_browser: search_duckduckgo(query, cancel, on_browser)[0],
+    "news": lambda query, cancel, on_browser: get_google_news(query, cancel, on_browser)[0],
+}
+search_executor = ThreadPoolExecutor(max_workers=2 * len(SEARCH_ENGINES), thread_name_prefix="Search")
+
+def search_any(query: str, engines: list[str] = None) -> str:
+    """
+    Query several engines at once and return the first non-empty answer.
+
+    Each engine has search_deadlines[name] seconds, extended to browser_deadline
+    once it falls back to the browser (so browser start-up and page load do not
+    count against the HTTP budget). An engine past its deadline is cancelled while
+    other engines are still working, freeing the browser for them; the last engine
+    still running is always waited for rather than answering nothing. Once an
+    answer is in, the other engines are cancelled: queued ones never start, running
+    ones skip their browser fallback or stop waiting for a browser. Returns '' only
+    if every engine came back empty.
+    """
+    engines = [name for name in (engines or search_engines) if name in SEARCH_ENGINES]
+    start = time.monotonic()
+    cancels = {name: threading.Event() for name in engines}
+    deadlines = {name: start + search_deadlines.get(name, http_timeout) for name in engines}
+
+    def on_browser(name):
+        deadlines[name] = max(deadlines[name], time.monotonic() + browser_deadline)
+
+    futures = {search_executor.submit(SEARCH_ENGINES[name], query, cancels[name], functools.partial(on_browser, name)): name
+               for name in engines}
+    pending = set(futures)
+    try:
+        while pending:
+            now = time.monotonic()
+            late = [f for f in pending if deadlines[futures[f]] <= now]
+            if len(late) < len(pending):
+                for future in late:
+                    pending.discard(future)
+                    cancels[futures[future]].set()
+                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: {futures[future]} missed its deadline")
+                timeout = min(deadlines[futures[f]] for f in pending) - now
+            else:
+                timeout = None  # only late engines left: wait for the first of them to finish
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                try:
+                    text = future.result()
+                except Exception as e:
+                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ERROR: {futures[future]} search failed: {e}")
+                    continue
+                if text and text.strip():
+                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] STAT: Answer from {futures[future]} in {(time.monotonic() - start) * 1000:.0f} ms")
+                    return text
+        return ''
+    finally:
+        for future, name in futures.items():
+            cancels[name].set()
+            future.cancel()
+
+
+def search_weather(query: str) -> str:
+    """
+    Weather comes from Google's weather answer box, so Google is asked alone first
+    (a faster news or DuckDuckGo snippet would win a race); DuckDuckGo only if
+    Google has nothing.
+    """
+    return search_any(query, ["google"]) or search_any(query, ["duckduckgo"])
+
+
+# Browsers are started on the first search; register cleanup
 atexit.register(quit_driver)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules read config.ini and import each other relative to Brain/
+BRAIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(BRAIN_DIR)
+sys.path.insert(0, BRAIN_DIR)
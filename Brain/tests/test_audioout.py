@@ -0,0 +1,84 @@
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sounddevice")
+from module_audioout import WavStreamParser, SampleFifo
+from module_tts import make_wav_header
+
+SAMPLES = np.arange(-50, 50, dtype=np.int16)
+
+
+def feed_all(parser, data, sizes):
+    out, pos, i = [], 0, 0
+    while pos < len(data):
+        size = sizes[i % len(sizes)]
+        samples = parser.feed(data[pos:pos + size])
+        if samples is not None:
+            out.extend(samples.tolist())
+        pos += size
+        i += 1
+    return out
+
+
+@pytest.mark.parametrize("sizes", [[1], [3], [7, 1, 44, 2], [1000]])
+def test_parser_reframes_any_chunking(sizes):
+    parser = WavStreamParser()
+    assert feed_all(parser, make_wav_header(24000) + SAMPLES.tobytes(), sizes) == SAMPLES.tolist()
+    assert parser.samplerate == 24000 and parser.pending == b""
+
+
+def test_parser_keeps_whole_stereo_frames():
+    parser = WavStreamParser()
+    samples = parser.feed(make_wav_header(16000, channels=2) + SAMPLES[:5].tobytes())
+    assert samples.tolist() == SAMPLES[:4].tolist() and parser.channels == 2
+    assert parser.feed(SAMPLES[5:7].tobytes()).tolist() == SAMPLES[4:6].tolist()
+
+
+def test_parser_treats_headerless_streams_as_raw_pcm():
+    parser = WavStreamParser(default_samplerate=8000)
+    assert feed_all(parser, SAMPLES.tobytes(), [5]) == SAMPLES.tolist()
+    assert parser.samplerate == 8000
+
+
+def test_parser_rejects_8_bit_audio():
+    with pytest.raises(ValueError):
+        WavStreamParser().feed(make_wav_header(16000, sampwidth=1) + b"\0" * 4)
+
+
+def test_fifo_wraps_around():
+    fifo = SampleFifo(8)
+    stop = threading.Event()
+    out = np.zeros(8, dtype=np.int16)
+    received = []
+    for block in range(6):
+        assert fifo.write(np.arange(block * 5, block * 5 + 5, dtype=np.int16), stop)
+        n = fifo.read_into(out)
+        received.extend(out[:n].tolist())
+    assert received == list(range(30)) and len(fifo) == 0
+
+
+def test_fifo_write_blocks_until_read_and_stops():
+    fifo = SampleFifo(4)
+    stop = threading.Event()
+    samples = np.arange(10, dtype=np.int16)
+    received = []
+
+    def consume():
+        out = np.zeros(3, dtype=np.int16)
+        while len(received) < 10:
+            n = fifo.read_into(out)
+            received.extend(out[:n].tolist())
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    assert fifo.write(samples, stop)
+    consumer.join(2)
+    assert received == samples.tolist()
+
+    assert fifo.write(np.arange(4, dtype=np.int16), stop)
+    threading.Timer(0.05, stop.set).start()
+    assert fifo.write(np.arange(4, dtype=np.int16), stop) is False
+    fifo.clear()
+    assert len(fifo) == 0
@@ -0,0 +1,83 @@
+import threading
+
+import numpy as np
+
+from module_capture import AudioRing, RingReader
+
+
+def test_write_wraps_around_and_reads_back_in_order():
+    ring = AudioRing(10)
+    try:
+        ring.write(np.arange(7))
+        ring.write(np.arange(7, 14))  # wraps: samples 10..13 land at the start
+        assert ring.write_pos == 14
+        data, pos = ring.read(6, 8)
+        assert pos == 6 and data.tolist() == list(range(6, 14))
+    finally:
+        ring.close()
+
+
+def test_read_of_overwritten_data_skips_to_oldest():
+    ring = AudioRing(10)
+    try:
+        ring.write(np.arange(25))
+        data, pos = ring.read(3, 4)
+        assert pos == 15 and data.tolist() == [15, 16, 17, 18]
+        # never past the write position
+        data, pos = ring.read(22, 100)
+        assert data.tolist() == [22, 23, 24]
+    finally:
+        ring.close()
+
+
+def test_write_larger_than_capacity_keeps_the_newest_samples():
+    ring = AudioRing(8)
+    try:
+        ring.write(np.arange(3))
+        ring.write(np.arange(100, 120))
+        assert ring.write_pos == 23
+        data, pos = ring.read(0, 8)
+        assert pos == 15 and data.tolist() == list(range(112, 120))
+    finally:
+        ring.close()
+
+
+def test_reader_follows_writes_across_the_boundary():
+    ring = AudioRing(16)
+    reader = RingReader(ring)
+    try:
+        received = []
+        for block in range(10):
+            ring.write(np.full(5, block))
+            received.extend(reader.read(5, timeout=0).tolist())
+        assert received == [block for block in range(10) for _ in range(5)]
+        assert reader.available() == 0
+    finally:
+        ring.close()
+
+
+def test_reader_waits_for_data_and_honours_timeout_and_stop():
+    ring = AudioRing(16)
+    reader = RingReader(ring)
+    try:
+        assert reader.read(4, timeout=0.05) is None
+        stop = threading.Event()
+        stop.set()
+        assert reader.read(4, stop_event=stop) is None
+
+        threading.Timer(0.05, ring.write, args=(np.arange(4),)).start()
+        assert reader.read(4, timeout=2).tolist() == [0, 1, 2, 3]
+    finally:
+        ring.close()
+
+
+def test_attached_ring_sees_the_owners_writes():
+    ring = AudioRing(12)
+    attached = AudioRing(12, name=ring.name)
+    try:
+        ring.write(np.arange(20))
+        assert attached.write_pos == 20
+        assert attached.read(14, 6)[0].tolist() == list(range(14, 20))
+    finally:
+        attached.close()
+        ring.close()
@@ -0,0 +1,29 @@
+import numpy as np
+
+from module_bargein import BargeInMonitor, MIN_SPEECH_FRAMES
+
+FRAME = 320
+LOUD = np.full(FRAME, 3000, dtype=np.int16)
+QUIET = np.zeros(FRAME, dtype=np.int16)
+
+
+def monitor(speech_ms):
+    return BargeInMonitor(lambda pos, t: None, lambda: 1000, speech_ms)
+
+
+def test_requires_consecutive_loud_frames():
+    m = monitor(200)
+    assert m.frames_required == 10
+    for _ in range(9):
+        assert not m.observe(LOUD)
+    assert not m.observe(QUIET)  # a gap restarts the run
+    for _ in range(9):
+        assert not m.observe(LOUD)
+    assert m.observe(LOUD)
+
+
+def test_single_block_never_triggers():
+    m = monitor(0)
+    assert m.frames_required == MIN_SPEECH_FRAMES
+    assert not m.observe(LOUD)
+    assert not m.observe(QUIET)
@@ -0,0 +1,81 @@
+import time
+import threading
+
+import pytest
+
+from module_batcher import MicroBatcher
+
+
+class Recorder:
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        return [item * 2 for item in items]
+
+
+def test_flushes_as_soon_as_the_batch_is_full():
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, max_batch=3, max_wait_ms=5000)
+    try:
+        t0 = time.monotonic()
+        futures = [batcher.submit_async(i) for i in range(3)]
+        assert [future.result(timeout=2) for future in futures] == [0, 2, 4]
+        assert time.monotonic() - t0 < 1
+        assert recorder.batches == [[0, 1, 2]]
+    finally:
+        batcher.stop()
+
+
+def test_flushes_a_partial_batch_after_max_wait():
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, max_batch=8, max_wait_ms=100)
+    try:
+        t0 = time.monotonic()
+        futures = [batcher.submit_async(i) for i in range(2)]
+        assert [future.result(timeout=2) for future in futures] == [0, 2]
+        assert 0.09 <= time.monotonic() - t0 < 1
+        assert recorder.batches == [[0, 1]]
+    finally:
+        batcher.stop()
+
+
+def test_requests_arriving_while_busy_form_the_next_batch():
+    release = threading.Event()
+    batches = []
+
+    def process(items):
+        batches.append(list(items))
+        release.wait(2)
+        return items
+
+    batcher = MicroBatcher(process, max_batch=4, max_wait_ms=20)
+    try:
+        first = batcher.submit_async("a")
+        time.sleep(0.1)
+        rest = [batcher.submit_async(item) for item in "bcdef"]
+        release.set()
+        assert [future.result(timeout=2) for future in [first] + rest] == list("abcdef")
+        assert batches == [["a"], ["b", "c", "d", "e"], ["f"]]
+        assert batcher.stats()["batches"] == 3
+    finally:
+        batcher.stop()
+
+
+def test_exceptions_fail_only_their_job_or_the_whole_batch():
+    def process(items):
+        if "boom" in items:
+            raise RuntimeError("batch failed")
+        return [ValueError(item) if item == "bad" else item for item in items]
+
+    batcher = MicroBatcher(process, max_batch=2, max_wait_ms=1000)
+    try:
+        good, bad = batcher.submit_async("good"), batcher.submit_async("bad")
+        assert good.result(timeout=2) == "good"
+        with pytest.raises(ValueError):
+            bad.result(timeout=2)
+        with pytest.raises(RuntimeError):
+            batcher.submit("boom", timeout=2)
+    finally:
+        batcher.stop()
@@ -0,0 +1,43 @@
+import time
+
+import module_camera
+from module_camera import FrameRing, LibcameraSource, DirectorySource
+
+
+def use_source(monkeypatch, source_class, *args, **kwargs):
+    ring = FrameRing()
+    source = source_class(ring, *args, **kwargs)
+    source.start()
+    monkeypatch.setattr(module_camera, "camera", (ring, source))
+    return ring, source
+
+
+def test_latest_frame_returns_at_once_without_libcamera(monkeypatch):
+    monkeypatch.setenv("PATH", "")
+    _, source = use_source(monkeypatch, LibcameraSource)
+    source.thread.join(1)
+    t0 = time.monotonic()
+    assert module_camera.latest_frame(timeout=3.0) is None
+    assert time.monotonic() - t0 < 0.5
+
+
+def test_latest_frame_returns_at_once_after_source_stops(monkeypatch, tmp_path):
+    (tmp_path / "a.jpg").write_bytes(b"frame")
+    ring, source = use_source(monkeypatch, DirectorySource, str(tmp_path), fps=20)
+    try:
+        assert module_camera.latest_frame(timeout=1.0) == b"frame"
+        source.stop()
+        source.thread.join(1)
+        # the source has stopped: no waiting, even though an old frame is still in the ring
+        assert ring.latest(timeout=0) is not None
+        assert module_camera.latest_frame(timeout=1.0) is None
+    finally:
+        source.stop()
+
+
+def test_ring_max_age():
+    ring = FrameRing()
+    ring.push(b"old")
+    time.sleep(0.05)
+    assert ring.latest(timeout=0, max_age=0.01) is None
+    assert ring.latest(timeout=0, max_age=1.0)[1] == b"old"
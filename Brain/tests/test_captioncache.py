@@ -0,0 +1,48 @@
+import pytest
+
+pytest.importorskip("PIL")
+from PIL import Image, ImageDraw
+
+import module_vision
+from module_vision import CaptionCache, dhash
+
+
+def scene(shift=0, brightness=0):
+    image = Image.new("L", (320, 240), 90 + brightness)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((40 + shift, 60, 140 + shift, 200), fill=220 + brightness // 2)
+    draw.ellipse((200, 30, 300, 130), fill=20 + brightness)
+    return image
+
+
+def distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+def test_dhash_is_stable_under_small_changes():
+    assert distance(dhash(scene()), dhash(scene(brightness=15))) <= 4
+    assert distance(dhash(scene()), dhash(scene(shift=2))) <= 6
+
+
+def test_dhash_separates_different_scenes():
+    other = scene().transpose(Image.FLIP_LEFT_RIGHT)
+    assert distance(dhash(scene()), dhash(other)) > 12
+
+
+def test_lookup_within_distance():
+    cache = CaptionCache(max_distance=6, ttl=30)
+    cache.store(0b1111, "a desk")
+    assert cache.lookup(0b1111_000000) is None  # 10 bits apart
+    assert cache.lookup(0b0111) == "a desk"     # 1 bit apart
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_entries_expire_and_capacity_is_bounded(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(module_vision.time, "monotonic", lambda: now[0])
+    cache = CaptionCache(max_distance=0, ttl=30, capacity=2)
+    for key in (1, 2, 3):
+        cache.store(key, f"scene {key}")
+    assert cache.lookup(1) is None and cache.lookup(3) == "scene 3"
+    now[0] += 31
+    assert cache.lookup(3) is None and cache.stats()["entries"] == 0
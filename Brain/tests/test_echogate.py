@@ -0,0 +1,62 @@
+import math
+import numpy as np
+
+from module_audiodsp import EchoGate
+
+SAMPLERATE = 16000
+BLOCK = 320  # 20 ms
+
+
+def run(gate, coupling, delay=0.1, seconds=6, user_from=None, user_level=3000):
+    """
+    Feed the gate a syllable-modulated reference and a mic signal holding a delayed,
+    scaled copy of it (plus the user's voice from user_from seconds). Returns the
+    mute decisions for echo-only blocks and for blocks with the user talking.
+    """
+    rng = np.random.default_rng(0)
+    lag = round(delay * SAMPLERATE / BLOCK)
+    references, echo_muted, user_muted = [], [], []
+    for i in range(int(seconds * SAMPLERATE / BLOCK)):
+        t = i * BLOCK / SAMPLERATE
+        envelope = 0.2 + 0.8 * abs(math.sin(2 * math.pi * 3 * t))
+        reference = (rng.standard_normal(BLOCK) * 6000 * envelope).astype(np.int16)
+        references.append(reference)
+        gate.push_reference(reference, now=t)
+
+        mic = rng.standard_normal(BLOCK) * 20
+        if i >= lag:
+            mic += references[i - lag] * coupling
+        talking = user_from is not None and t >= user_from
+        if talking:
+            mic += rng.standard_normal(BLOCK) * user_level
+        muted = not gate.process(mic.astype(np.int16), now=t + BLOCK / SAMPLERATE).any()
+        if t >= 1.0:  # after the coupling estimate has settled
+            (user_muted if talking else echo_muted).append(muted)
+    return echo_muted, user_muted
+
+
+def test_delayed_scaled_reference_is_gated():
+    for coupling in (0.02, 0.1, 0.4):
+        gate = EchoGate(delay_ms=100, margin=2.5)
+        echo_muted, _ = run(gate, coupling)
+        assert all(echo_muted), coupling
+        assert abs(gate.coupling - coupling) < 0.2 * coupling
+
+
+def test_gate_tolerates_delay_mismatch():
+    gate = EchoGate(delay_ms=150, margin=2.5)
+    echo_muted, _ = run(gate, 0.1, delay=0.08)
+    assert all(echo_muted)
+
+
+def test_user_talking_over_echo_passes():
+    gate = EchoGate(delay_ms=100, margin=2.5)
+    echo_muted, user_muted = run(gate, 0.1, user_from=3.0)
+    assert all(echo_muted)
+    assert not any(user_muted)
+
+
+def test_no_reference_passes_everything():
+    gate = EchoGate(delay_ms=100)
+    block = np.full(BLOCK, 500, dtype=np.int16)
+    assert gate.process(block, now=10.0) is block
@@ -0,0 +1,52 @@
+import numpy as np
+
+from module_audiodsp import LoudnessStage, _db_to_int16
+
+SAMPLERATE = 22050
+
+
+def run(stage, signal, block=512):
+    stage.reset(SAMPLERATE)
+    out = [stage.process(signal[i:i + block]).copy() for i in range(0, signal.size, block)]
+    out.append(stage.flush().copy())
+    return np.concatenate(out)
+
+
+def sine(amplitude, seconds=1.0, freq=440):
+    t = np.arange(int(SAMPLERATE * seconds)) / SAMPLERATE
+    return (amplitude * np.sin(2 * np.pi * freq * t)).astype(np.int16)
+
+
+def test_limiter_holds_the_ceiling_with_gain():
+    ceiling = _db_to_int16(-1.0)
+    stage = LoudnessStage(gain=4.0, normalize=False, ceiling_dbfs=-1.0)
+    signal = np.concatenate([sine(2000, 0.3), sine(30000, 0.5), sine(500, 0.3)])
+    out = run(stage, signal)
+    assert np.abs(out.astype(np.int32)).max() <= ceiling + 1
+    # the loud part is limited, not clipped: it still reaches close to the ceiling
+    assert np.abs(out.astype(np.int32)).max() > 0.9 * ceiling
+
+
+def test_limiter_catches_a_sudden_peak_through_the_lookahead():
+    ceiling = _db_to_int16(-1.0)
+    signal = np.zeros(SAMPLERATE // 2, dtype=np.int16)
+    signal[5000] = 32767
+    out = run(LoudnessStage(gain=1.0, normalize=False, ceiling_dbfs=-1.0), signal, block=256)
+    assert np.abs(out.astype(np.int32)).max() <= ceiling + 1
+
+
+def test_quiet_audio_passes_unchanged_apart_from_the_delay():
+    stage = LoudnessStage(gain=1.0, normalize=False, ceiling_dbfs=-1.0, lookahead_ms=5.0)
+    signal = sine(3000, 0.2)
+    out = run(stage, signal)
+    delay = stage.lookahead
+    assert out.size == signal.size + delay
+    assert np.abs(out[delay:].astype(np.int32) - signal).max() <= 1
+
+
+def test_agc_brings_quiet_speech_towards_the_target():
+    stage = LoudnessStage(gain=1.0, normalize=True, target_dbfs=-18.0, max_gain_db=12.0)
+    out = run(stage, sine(3000, 2.0))  # -24 dBFS RMS, within the 12 dB of gain available
+    tail = out[-SAMPLERATE // 2:].astype(np.float64)
+    rms = np.sqrt(np.mean(tail ** 2))
+    assert abs(20 * np.log10(rms / 32767) + 18.0) < 2.0
@@ -0,0 +1,61 @@
+import time
+import threading
+
+import numpy as np
+
+import module_noisefloor
+from module_capture import AudioRing, RingReader
+from module_noisefloor import NoiseFloorTracker
+
+FRAME = 320  # 20 ms at 16 kHz
+
+
+def frames(rms_values, rng):
+    return np.concatenate([rng.standard_normal(FRAME) * rms for rms in rms_values]).astype(np.int16)
+
+
+def track(monkeypatch, audio, expected_frames, **kwargs):
+    ring = AudioRing(16000 * 10)
+    monkeypatch.setattr(module_noisefloor, "open_reader", lambda pos=None: RingReader(ring, 0))
+    updates = []
+    updated = threading.Event()
+
+    def on_update(threshold):
+        updates.append(threshold)
+        updated.set()
+
+    tracker = NoiseFloorTracker(on_update, update_seconds=0, **kwargs)
+    ring.write(audio)
+    tracker.start()
+    try:
+        assert updated.wait(2)
+        deadline = time.monotonic() + 2
+        while tracker.filled < expected_frames and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return tracker
+    finally:
+        tracker.stop()
+        ring.close()
+
+
+def test_floor_ignores_speech_bursts(monkeypatch):
+    rng = np.random.default_rng(0)
+    levels = [100] * 60 + [3000] * 20 + [100] * 20  # 30% of the window is loud
+    tracker = track(monkeypatch, frames(levels, rng), len(levels), percentile=20, margin=1.5)
+    assert 80 < tracker.noise_floor < 120
+    assert tracker.threshold == tracker.noise_floor * 1.5
+
+
+def test_muted_frames_are_ignored_and_minimum_applies(monkeypatch):
+    rng = np.random.default_rng(0)
+    audio = np.concatenate([np.zeros(FRAME * 50, dtype=np.int16), frames([2] * 50, rng)])
+    tracker = track(monkeypatch, audio, 50, minimum=10)
+    assert tracker.filled == 50
+    assert tracker.threshold == 10
+
+
+def test_history_window_wraps_around():
+    tracker = NoiseFloorTracker(lambda threshold: None, window_seconds=0.1)  # 5 frames
+    tracker._add(np.arange(1, 8, dtype=float))
+    assert tracker.filled == 5
+    assert sorted(tracker.history.tolist()) == [3, 4, 5, 6, 7]
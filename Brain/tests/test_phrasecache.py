@@ -0,0 +1,40 @@
+import json
+
+import numpy as np
+
+import module_ttscache
+from module_ttscache import PhraseCache
+
+
+def fake_synthesize(monkeypatch, calls):
+    def synthesize_pcm(text):
+        calls.append(text)
+        return np.full(10, len(text), dtype=np.int16).tobytes(), 22050
+    monkeypatch.setattr(module_ttscache, "synthesize_pcm", synthesize_pcm)
+
+
+def test_prerender_renders_once_and_reloads(monkeypatch, tmp_path):
+    calls = []
+    fake_synthesize(monkeypatch, calls)
+    PhraseCache("voice", root=str(tmp_path)).prerender(["Yes?", "Listening."])
+    cache = PhraseCache("voice", root=str(tmp_path))
+    cache.prerender(["Yes?", "Listening."])
+    assert calls == ["Yes?", "Listening."]
+    samples, samplerate = cache.get("Yes?")
+    assert samplerate == 22050 and samples.tolist() == [4] * 10
+
+
+def test_prerender_prunes_old_phrases_and_settings(monkeypatch, tmp_path):
+    fake_synthesize(monkeypatch, [])
+    PhraseCache("old-voice", root=str(tmp_path)).prerender(["Yes?"])
+    PhraseCache("voice", root=str(tmp_path)).prerender(["Yes?", "It is 10:41."])
+    (tmp_path / "voice" / "stray.pcm").write_bytes(b"\0\0")
+
+    cache = PhraseCache("voice", root=str(tmp_path))
+    cache.prerender(["Yes?"])
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["voice"]
+    index = json.loads((tmp_path / "voice" / "index.json").read_text())
+    assert list(index) == ["Yes?"]
+    assert sorted(p.name for p in (tmp_path / "voice").iterdir()) == sorted(["index.json", index["Yes?"]["file"]])
+    assert cache.get("It is 10:41.") is None
@@ -0,0 +1,105 @@
+import time
+import threading
+
+import pytest
+
+pytest.importorskip("selenium")
+import module_websearch
+from module_websearch import DriverPool, search_any
+
+
+def engine(result, delay=0.0, seen=None, browser_after=None):
+    def run(query, cancel, on_browser):
+        if browser_after is not None:
+            cancel.wait(browser_after)
+            on_browser()
+        if delay:
+            cancel.wait(delay)
+        if seen is not None:
+            seen.append(cancel.is_set())
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return run
+
+
+@pytest.fixture
+def engines(monkeypatch):
+    registry = {}
+    deadlines = {}
+    monkeypatch.setattr(module_websearch, "SEARCH_ENGINES", registry)
+    monkeypatch.setattr(module_websearch, "search_deadlines", deadlines)
+    monkeypatch.setattr(module_websearch, "browser_deadline", 1.0)
+    return registry, deadlines
+
+
+def test_first_non_empty_answer_wins(engines):
+    registry, deadlines = engines
+    registry.update(fast_empty=engine(""), blank=engine("   ", 0.02), slow=engine("answer", 0.1), slower=engine("late", 0.5))
+    deadlines.update(fast_empty=1, blank=1, slow=1, slower=1)
+    t0 = time.monotonic()
+    assert search_any("q", list(registry)) == "answer"
+    assert time.monotonic() - t0 < 0.4
+
+
+def test_failing_engine_is_skipped(engines):
+    registry, deadlines = engines
+    registry.update(broken=engine(RuntimeError("blocked")), working=engine("answer", 0.05))
+    deadlines.update(broken=1, working=1)
+    assert search_any("q", ["broken", "working"]) == "answer"
+
+
+def test_late_engine_is_cancelled_while_others_are_searching(engines):
+    registry, deadlines = engines
+    seen = []
+    registry.update(slow=engine("too late", 1.0, seen), steady=engine("answer", 0.3))
+    deadlines.update(slow=0.1, steady=1)
+    assert search_any("q", ["slow", "steady"]) == "answer"
+    deadline = time.monotonic() + 1
+    while not seen and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert seen == [True]  # cancelled at its deadline, before the answer came in
+
+
+def test_last_engine_is_waited_for_past_its_deadline(engines):
+    registry, deadlines = engines
+    registry.update(empty=engine(""), slow=engine("answer", 0.3))
+    deadlines.update(empty=1, slow=0.1)
+    assert search_any("q", ["empty", "slow"]) == "answer"
+
+
+def test_browser_fallback_extends_the_deadline(engines):
+    registry, deadlines = engines
+    registry.update(browser=engine("from browser", 0.3, browser_after=0.05), http=engine("from http", 0.5))
+    deadlines.update(browser=0.1, http=2)
+    assert search_any("q", ["browser", "http"]) == "from browser"
+
+
+def test_losers_are_cancelled(engines):
+    registry, deadlines = engines
+    seen = []
+    registry.update(fast=engine("answer"), slow=engine("late", 2.0, seen))
+    deadlines.update(fast=3, slow=3)
+    assert search_any("q", ["fast", "slow"]) == "answer"
+    deadline = time.monotonic() + 1
+    while not seen and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert seen == [True]
+
+
+def test_unknown_engines_and_no_answers(engines):
+    registry, deadlines = engines
+    registry.update(empty=engine(""))
+    assert search_any("q", ["empty", "missing"]) == ""
+
+
+def test_waiting_for_a_busy_driver_stops_when_cancelled():
+    pool = DriverPool(size=1, idle_timeout=0)
+    pool.created = 1  # the only driver is in use
+    cancel = threading.Event()
+    threading.Timer(0.1, cancel.set).start()
+    t0 = time.monotonic()
+    with pool.driver(cancel) as driver:
+        assert driver is None
+    assert time.monotonic() - t0 < 1
+    assert pool.created == 1
@@ -0,0 +1,82 @@
+import threading
+import time
+import numpy as np
+import pytest
+
+from module_capture import AudioRing
+from module_sttworker import STTWorker
+
+FAKE_POCKETSPHINX = '''
+class _Hyp:
+    hypstr = "hey tar"
+
+class Decoder:
+    def __init__(self, **kwargs):
+        self.frames = 0
+    def start_utt(self):
+        self.frames = 0
+    def end_utt(self):
+        pass
+    def process_raw(self, data, no_search, full_utt):
+        self.frames += 1
+    def hyp(self):
+        return _Hyp() if self.frames >= 3 else None
+'''
+
+FAKE_VOSK = '''
+import json
+
+class Model:
+    def __init__(self, path):
+        print("native libraries may log to stdout")
+
+class KaldiRecognizer:
+    def __init__(self, model, rate):
+        self.blocks = 0
+    def AcceptWaveform(self, data):
+        self.blocks += 1
+        return self.blocks >= 2
+    def Result(self):
+        return json.dumps({"text": "hello"})
+'''
+
+
+@pytest.fixture
+def worker(tmp_path, monkeypatch):
+    (tmp_path / "pocketsphinx.py").write_text(FAKE_POCKETSPHINX)
+    (tmp_path / "vosk.py").write_text(FAKE_VOSK)
+    monkeypatch.setenv("PYTHONPATH", str(tmp_path))
+    ring = AudioRing(16000 * 5)
+    worker = STTWorker(ring, "model", "hey tar")
+    worker.start(timeout=30)
+    yield ring, worker
+    worker.stop()
+    ring.close()
+
+
+def feed(ring, stop):
+    while not stop.is_set():
+        ring.write(np.zeros(1600, dtype=np.int16))
+        time.sleep(0.01)
+
+
+def test_abandoned_request_does_not_leak_into_next_call(worker):
+    ring, stt = worker
+    stop_listening = threading.Event()
+    threading.Timer(0.3, stop_listening.set).start()
+    assert stt.detect_wake_word(stop_listening) is None  # no audio yet: abandoned
+
+    feeding = threading.Event()
+    threading.Thread(target=feed, args=(ring, feeding), daemon=True).start()
+    try:
+        assert stt.transcribe(40000) == '{"text": "hello"}'
+        assert isinstance(stt.detect_wake_word(), int)
+    finally:
+        feeding.set()
+
+
+def test_ring_survives_worker_exit(worker):
+    ring, stt = worker
+    stt.stop()
+    ring.write(np.ones(10, dtype=np.int16))  # still mapped and not unlinked by the child
+    assert ring.write_pos == 10
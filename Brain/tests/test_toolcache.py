@@ -0,0 +1,69 @@
+import json
+
+import module_toolcache
+from module_toolcache import ToolCache, normalize_query
+
+
+def test_normalize_query():
+    assert normalize_query("  What's the WEATHER in Paris?! ") == "whats the weather in paris"
+    assert normalize_query("What’s the weather, in   Paris") == normalize_query("whats the weather in paris")
+    assert normalize_query("weather in paris") != normalize_query("weather in rome")
+
+
+def test_key_is_per_tool(tmp_path):
+    cache = ToolCache(str(tmp_path / "cache.json"), ttls={"weather": 600, "search": 600})
+    cache.put("weather", "Paris?", "sunny")
+    assert cache.get("weather", "paris") == "sunny"
+    assert cache.get("search", "paris") is None
+
+
+def test_ttl_expiry(monkeypatch, tmp_path):
+    now = [1000.0]
+    monkeypatch.setattr(module_toolcache.time, "time", lambda: now[0])
+    cache = ToolCache(str(tmp_path / "cache.json"), ttls={"weather": 600, "news": 0})
+    cache.put("weather", "paris", "sunny")
+    cache.put("news", "paris", "headlines")  # TTL 0: never cached
+    now[0] += 600
+    assert cache.get("weather", "paris") == "sunny"
+    now[0] += 1
+    assert cache.get("weather", "paris") is None
+    assert cache.get("news", "paris") is None
+    assert cache.stats()["weather"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_reload_drops_expired_entries_and_restores_tuples(monkeypatch, tmp_path):
+    path = str(tmp_path / "cache.json")
+    now = [1000.0]
+    monkeypatch.setattr(module_toolcache.time, "time", lambda: now[0])
+    cache = ToolCache(path, ttls={"weather": 600, "search": 3600})
+    cache.put("weather", "paris", "sunny")
+    cache.put("search", "who", ("answer", ["https://example.com"]))
+    now[0] += 601
+    reloaded = ToolCache(path, ttls={"weather": 600, "search": 3600})
+    assert list(reloaded.entries) == ["search|who"]
+    assert reloaded.get("search", "who") == ("answer", ["https://example.com"])
+
+
+def test_cached_computes_once_and_skips_empty_results(tmp_path):
+    cache = ToolCache(str(tmp_path / "cache.json"), ttls={"search": 600})
+    calls = []
+
+    def compute(query):
+        calls.append(query)
+        return "" if query == "nothing" else query.upper()
+
+    assert cache.cached("search", "Hello", compute) == "HELLO"
+    assert cache.cached("search", "hello!", compute) == "HELLO"
+    cache.cached("search", "nothing", compute)
+    cache.cached("search", "nothing", compute)
+    assert calls == ["Hello", "nothing", "nothing"]
+
+
+def test_least_recently_used_entries_are_dropped(tmp_path):
+    path = tmp_path / "cache.json"
+    cache = ToolCache(str(path), ttls={"search": 600}, max_entries=2)
+    cache.put("search", "a", "1")
+    cache.put("search", "b", "2")
+    cache.get("search", "a")
+    cache.put("search", "c", "3")
+    assert [key for key, _, _ in json.loads(path.read_text())] == ["search|a", "search|c"]
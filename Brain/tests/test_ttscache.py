@@ -0,0 +1,41 @@
+import os
+
+import module_ttscache
+from module_ttscache import TTSCache
+
+
+def test_put_get_and_reload(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=1000)
+    assert cache.get("hello") is None
+    cache.put("hello", b"\1\0" * 10, 22050)
+    assert cache.get("hello") == (b"\1\0" * 10, 22050)
+
+    reloaded = TTSCache(str(tmp_path), max_bytes=1000)
+    assert reloaded.get("hello") == (b"\1\0" * 10, 22050)
+    assert reloaded.stats()["bytes"] == 20
+
+
+def test_key_depends_on_voice_settings(monkeypatch, tmp_path):
+    cache = TTSCache(str(tmp_path))
+    cache.put("hello", b"\1\0", 22050)
+    monkeypatch.setattr(module_ttscache, "tts_settings_key", lambda: "other-voice")
+    assert cache.get("hello") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=30)
+    cache.put("a", b"\0" * 10, 16000)
+    cache.put("b", b"\0" * 10, 16000)
+    cache.get("a")
+    cache.put("c", b"\0" * 20, 16000)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["bytes"] == 30
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_empty_and_oversized_audio_is_not_cached(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=10)
+    cache.put("empty", b"", 16000)
+    cache.put("big", b"\0" * 12, 16000)
+    assert cache.stats()["entries"] == 0 and os.listdir(tmp_path) == []
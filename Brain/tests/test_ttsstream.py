@@ -0,0 +1,86 @@
+import pytest
+
+import module_tts
+import module_ttscache
+from module_tts import make_wav_header
+
+HEADER = make_wav_header(22050)
+PCM = b"\x01\x00" * 100
+
+
+class FakeResponse:
+    """Streams chunks and, like requests after close() from another thread, ends with a clean EOF."""
+
+    def __init__(self, chunks, length=None):
+        self.chunks = chunks
+        self.closed = False
+        self.headers = {} if length is None else {"Content-Length": str(length)}
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for chunk in self.chunks:
+            if self.closed:
+                return
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def backend(monkeypatch, tmp_path):
+    responses = []
+    monkeypatch.setattr(module_tts, "charvoice", True)
+    monkeypatch.setattr(module_tts, "ttsoption", "xttsv2")
+    monkeypatch.setattr(module_tts.requests, "get", lambda *args, **kwargs: responses.pop(0))
+    monkeypatch.setattr(module_ttscache, "tts_cache", module_ttscache.TTSCache(str(tmp_path)))
+    return responses
+
+
+def test_complete_stream_is_cached(backend):
+    backend.append(FakeResponse([HEADER, PCM]))
+    assert b"".join(module_ttscache.cached_tts_stream("done")) == HEADER + PCM
+    assert module_ttscache.tts_cache.get("done") == (PCM, 22050)
+
+
+def test_cancelled_stream_with_clean_eof_is_not_cached(backend):
+    backend.append(FakeResponse([HEADER] + [PCM] * 10))
+    for i, _ in enumerate(module_ttscache.cached_tts_stream("cut off")):
+        if i == 2:
+            module_tts.cancel_tts()
+    assert module_ttscache.tts_cache.get("cut off") is None
+
+
+def test_truncated_stream_is_not_cached(backend):
+    backend.append(FakeResponse([HEADER, PCM], length=len(HEADER) + 4 * len(PCM)))
+    list(module_ttscache.cached_tts_stream("short"))
+    assert module_ttscache.tts_cache.get("short") is None
+
+
+def test_streams_track_completion_separately(backend):
+    backend += [FakeResponse([HEADER, PCM]), FakeResponse([HEADER, PCM])]
+    ack = module_tts.get_tts_stream("ack", "url", "clone")
+    reply = module_tts.get_tts_stream("reply", "url", "clone")
+    next(ack)
+    next(reply)
+    ack.cancel()
+    list(ack)
+    list(reply)
+    assert not ack.complete
+    assert reply.complete
+    assert not module_tts.active_streams
+
+
+def test_synthesize_pcm_stops_at_the_data_chunk(backend):
+    trailer = b"LIST" + (8).to_bytes(4, "little") + b"INFOabcd"
+    backend.append(FakeResponse([make_wav_header(22050, data_size=len(PCM)), PCM, trailer]))
+    assert module_tts.synthesize_pcm("tagged") == (PCM, 22050)
+
+
+def test_chunks_after_the_audio_are_not_cached(backend):
+    trailer = b"LIST" + (8).to_bytes(4, "little") + b"INFOabcd"
+    backend.append(FakeResponse([make_wav_header(22050, data_size=len(PCM)), PCM, trailer]))
+    list(module_ttscache.cached_tts_stream("tagged"))
+    assert module_ttscache.tts_cache.get("tagged") == (PCM, 22050)
@@ -0,0 +1,54 @@
+import struct
+
+import pytest
+
+from module_tts import make_wav_header, parse_wav_header
+
+
+def chunk(chunk_id, payload):
+    return chunk_id + struct.pack("<I", len(payload)) + payload + (b"\0" if len(payload) % 2 else b"")
+
+
+def fmt_payload(samplerate=24000, channels=1, bits=16, extra=b""):
+    block = channels * bits // 8
+    return struct.pack("<HHIIHH", 1, channels, samplerate, samplerate * block, block, bits) + extra
+
+
+def riff(*chunks):
+    body = b"WAVE" + b"".join(chunks)
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def test_round_trip():
+    header = parse_wav_header(make_wav_header(22050, channels=2, data_size=400))
+    assert header == {"samplerate": 22050, "channels": 2, "sampwidth": 2, "data_offset": 44, "data_size": 400}
+
+
+def test_streaming_placeholder_has_no_data_size():
+    assert parse_wav_header(make_wav_header(16000))["data_size"] is None
+    assert parse_wav_header(make_wav_header(16000, data_size=0))["data_size"] is None
+
+
+def test_odd_sized_chunk_before_fmt_is_padded():
+    data = riff(chunk(b"LIST", b"INFOabc"), chunk(b"fmt ", fmt_payload()), chunk(b"data", b"\1\0\2\0"))
+    header = parse_wav_header(data)
+    assert header["samplerate"] == 24000
+    assert data[header["data_offset"]:header["data_offset"] + 4] == b"\1\0\2\0"
+
+
+def test_extended_fmt_chunk_and_fact_chunk():
+    data = riff(chunk(b"fmt ", fmt_payload(channels=2, extra=b"\0\0")), chunk(b"fact", b"\4\0\0\0"), chunk(b"data", b"\0" * 8))
+    header = parse_wav_header(data)
+    assert (header["channels"], header["data_offset"], header["data_size"]) == (2, 12 + 26 + 12 + 8, 8)
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"RIFF\0\0\0\0WAV",
+    b"RIFX\0\0\0\0WAVE",
+    make_wav_header(16000)[:30],                                 # fmt chunk cut short
+    make_wav_header(16000)[:40],                                 # data chunk header cut short
+    riff(chunk(b"data", b"\0\0"), chunk(b"fmt ", fmt_payload())),  # data before fmt
+])
+def test_incomplete_or_invalid_headers(data):
+    assert parse_wav_header(data) is None